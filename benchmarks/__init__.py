@@ -0,0 +1 @@
+"""花火シミュレーションと描画のベンチマーク（ウィンドウを表示せずに実行）"""
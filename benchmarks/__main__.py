@@ -0,0 +1,81 @@
+"""ベンチマークの実行
+
+使い方:
+    python -m benchmarks --output benchmarks/baseline.json
+    python -m benchmarks --compare benchmarks/baseline.json
+    python -m benchmarks --replay break.fwrec
+"""
+import argparse
+import json
+import platform
+import sys
+import time
+
+from benchmarks.workloads import WORKLOADS, Workload, compare, run_workload
+from fireworks.fireworks import ENGINES, RENDERERS
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="花火タイマーのベンチマーク")
+    parser.add_argument('--engine', choices=ENGINES, default='objects')
+    parser.add_argument('--renderer', choices=RENDERERS, default='items')
+    parser.add_argument('--workload', action='append', choices=sorted(WORKLOADS),
+                        help="実行するワークロード（複数指定可、省略時は全て）")
+    parser.add_argument('--replay', action='append', metavar='PATH',
+                        help="記録した休憩（--record で作成）をワークロードとして再生（複数指定可）")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--no-batch', dest='batch', action='store_false',
+                        help="キャンバスの操作を Tcl のスクリプトにまとめず1つずつ送る")
+    parser.add_argument('--output', help="結果を書き出すJSONファイル")
+    parser.add_argument('--compare', help="比較するベースラインのJSONファイル")
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help="悪化とみなす割合（既定: 0.25 = 25%%）")
+    args = parser.parse_args(argv)
+
+    results = {
+        'meta': {
+            'engine': args.engine,
+            'renderer': args.renderer,
+            'seed': args.seed,
+            'batch': args.batch,
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        },
+        'workloads': {},
+    }
+    print(f"{'workload':<14} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} "
+          f"{'particles/s':>12} {'ops/frame':>10} {'calls/frame':>11} {'ops/s':>9} "
+          f"{'upload px/frame':>15}")
+    workloads = [WORKLOADS[name] for name in args.workload or ([] if args.replay else WORKLOADS)]
+    workloads += [Workload.from_recording(path) for path in args.replay or ()]
+    for workload in workloads:
+        name = workload.name
+        result = run_workload(workload, args.engine, args.renderer, args.seed, args.batch)
+        results['workloads'][name] = result
+        frame_ms = result['frame_ms']
+        print(f"{name:<14} {frame_ms['p50']:>8.2f} {frame_ms['p95']:>8.2f} "
+              f"{frame_ms['p99']:>8.2f} {result['particles_per_sec']:>12} "
+              f"{result['canvas_ops_per_frame']['mean']:>10} "
+              f"{result['tcl_calls_per_frame']['mean']:>11} {result['canvas_ops_per_sec']:>9} "
+              f"{result['upload_px_per_frame']['mean']:>15}")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(baseline, results, args.tolerance)
+        if regressions:
+            print("\n性能の悪化を検出しました:")
+            for line in regressions:
+                print(f"- {line}")
+            return 1
+        print("\nベースラインからの悪化はありません。")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
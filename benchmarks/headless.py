@@ -0,0 +1,201 @@
+"""ウィンドウを表示せずに CanvasAnimationApp.animate を動かすための部品
+
+Tk のウィジェットを作らず、キャンバスの代わりに呼び出し回数を数える
+RecordingCanvas を使う。アニメーションループ自体は本物の animate を実行する。
+"""
+import tkinter as tk
+from collections import Counter
+
+from fireworks.fireworks import (CanvasAnimationApp, ENGINE_OBJECTS, RENDERER_ITEMS,
+                                 RENDERER_RASTER, RENDERER_SPRITES, create_renderer)
+
+
+_TAG_COMMANDS = {'raise': 'tag_raise', 'lower': 'tag_lower'}  # Tcl のコマンド -> メソッド名
+
+
+class _RecordingTcl:
+    """RecordingCanvas に送られた Tcl のスクリプトを数える"""
+
+    def __init__(self, canvas):
+        self.canvas = canvas
+
+    def eval(self, script):
+        canvas = self.canvas
+        canvas.calls += 1
+        counts = canvas.counts
+        if script.startswith('list ['):
+            # list [.c create oval ...] [.c create image ...] の作成したIDを返す
+            items = []
+            for command in script[6:-1].split('] ['):
+                counts['create_' + command.split(' ', 3)[2]] += 1
+                canvas._next_id += 1
+                items.append(str(canvas._next_id))
+            return ' '.join(items)
+        for command in script.split('\n'):
+            name = command.split(' ', 2)[1]
+            counts[_TAG_COMMANDS.get(name, name)] += 1
+        return ''
+
+    @staticmethod
+    def splitlist(value):
+        return tuple(value.split())
+
+
+class RecordingCanvas:
+    """キャンバス操作の回数を数えるだけのキャンバス
+
+    calls はメソッド呼び出しとスクリプトの eval を合わせた Tcl の呼び出し回数。
+    counts はスクリプトにまとめて送られた操作も1つずつ数える。
+    画像（_RecordingPhoto）への転送 photo_put と拡大コピー photo_copy も数える。
+    """
+
+    OPERATIONS = ('create_oval', 'create_image', 'create_text', 'coords', 'itemconfigure',
+                  'tag_raise', 'tag_lower', 'delete', 'photo_put', 'photo_copy')
+
+    def __init__(self):
+        self.counts = Counter()
+        self.calls = 0
+        self.bindings = {}  # イベント -> 関数（発生はさせない）
+        self._next_id = 0
+        self.tk = _RecordingTcl(self)
+        self._w = '.headless'
+
+    def _create(self, name):
+        self.counts[name] += 1
+        self.calls += 1
+        self._next_id += 1
+        return self._next_id
+
+    def create_oval(self, *args, **kwargs):
+        return self._create('create_oval')
+
+    def create_image(self, *args, **kwargs):
+        return self._create('create_image')
+
+    def create_text(self, *args, **kwargs):
+        return self._create('create_text')
+
+    def coords(self, *args):
+        self.counts['coords'] += 1
+        self.calls += 1
+
+    def itemconfigure(self, *args, **kwargs):
+        self.counts['itemconfigure'] += 1
+        self.calls += 1
+
+    def tag_raise(self, *args):
+        self.counts['tag_raise'] += 1
+        self.calls += 1
+
+    def tag_lower(self, *args):
+        self.counts['tag_lower'] += 1
+        self.calls += 1
+
+    def delete(self, *args):
+        self.counts['delete'] += 1
+        self.calls += 1
+
+    def bind(self, sequence, func, add=None):
+        self.bindings[sequence] = func
+        return sequence
+
+    def unbind(self, sequence, funcid=None):
+        self.bindings.pop(sequence, None)
+
+    def operations(self):
+        """これまでのキャンバス操作の合計回数"""
+        return sum(self.counts.values())
+
+
+class _RecordingPhoto:
+    """PhotoImage の代わり（転送されたデータは捨て、put / copy の回数を数える）"""
+
+    name = 'headless-photo'
+
+    def __init__(self, canvas):
+        self.canvas = canvas
+        self.tk = self  # photo.tk.call(photo.name, 'put', ...) を受け止める
+
+    def call(self, name, command, *args):
+        canvas = self.canvas
+        canvas.calls += 1
+        canvas.counts['photo_' + command] += 1
+        return ''
+
+
+class _NullVar:
+    """StringVar の代わり"""
+
+    def __init__(self):
+        self.value = ""
+
+    def set(self, value):
+        self.value = value
+
+    def get(self):
+        return self.value
+
+
+class _StubTcl:
+    """Tcl インタプリタの代わり（ウィンドウ操作は何もしない）"""
+
+    def call(self, *args):
+        return ''
+
+
+class _NoTk(tk.Tk):
+    """Tk を初期化しない基底クラス（CanvasAnimationApp の super().__init__() を受け止める）"""
+
+    def __init__(self, *args, **kwargs):
+        self.tk = _StubTcl()
+        self._w = '.'
+        self.children = {}
+        self.master = None
+
+
+class HeadlessApp(CanvasAnimationApp, _NoTk):
+    """ウィンドウを表示しない CanvasAnimationApp
+
+    after では実際にスケジュールせず、呼び出し側が animate を直接回す。
+    スケジューラの時計は animate を1回呼ぶごとに1フレーム分だけ進むので、
+    実際の処理時間に関係なく1回の animate で物理演算が同じだけ進む。
+    """
+
+    def __init__(self, engine=ENGINE_OBJECTS, renderer=RENDERER_ITEMS,
+                 width=1200, height=700, **kwargs):
+        self.headless_size = (width, height)
+        self.headless_time = 0.0
+        super().__init__(engine=engine, renderer=renderer, **kwargs)
+        self.scheduler.clock = lambda: self.headless_time
+
+    def animate(self):
+        if self.scheduler.running:
+            self.headless_time += self.scheduler.interval
+        super().animate()
+
+    def create_widgets(self):
+        self.break_var = _NullVar()
+        self.timer_var = _NullVar()
+        self.canvas = RecordingCanvas()
+        width, height = self.headless_size
+        if self.renderer_name == RENDERER_RASTER:
+            from fireworks.raster import RasterRenderer
+            self.renderer = RasterRenderer(self.canvas, width, height, photo=_RecordingPhoto(self.canvas))
+        elif self.renderer_name == RENDERER_SPRITES:
+            from fireworks.sprites import GlowAtlas, SpriteRenderer
+            # スプライトの画像は作らずに名前だけを返す
+            atlas = GlowAtlas(factory=lambda data: f'headless-sprite-{len(atlas.images)}')
+            self.renderer = SpriteRenderer(self.canvas, atlas=atlas, batch=self.batch)
+        else:
+            self.renderer = create_renderer(self.renderer_name, self.canvas, width, height,
+                                            self.batch)
+        self.canvas_renderer = self.renderer
+
+    def center_window(self):
+        pass
+
+    def after(self, ms, func=None, *args):
+        return 'after#headless'
+
+    def after_cancel(self, id):
+        pass
@@ -0,0 +1,182 @@
+"""標準ワークロードと計測"""
+import math
+import os
+import time
+
+from benchmarks.headless import HeadlessApp
+from fireworks.recording import load_recording
+from fireworks.scheduler import SIMULATION_STEP
+
+
+class Workload:
+    """ベンチマークの負荷パターン
+
+    launches(frame) はそのフレームで打ち上げる (x, 目標y) の一覧を返す。
+    auto_launch が True の場合はアプリ本来の自動打ち上げも行う。
+    replay に記録ファイルを指定した場合は記録した休憩をそのまま再生する。
+    """
+
+    def __init__(self, name, frames, launches=None, auto_launch=False, replay=None):
+        self.name = name
+        self.frames = frames
+        self.launches = launches or (lambda frame: ())
+        self.auto_launch = auto_launch
+        self.replay = replay
+
+    @classmethod
+    def from_recording(cls, path):
+        """記録ファイルを再生するワークロード（フレーム数は記録の長さから決める）"""
+        recorded = load_recording(path)
+        frames = math.ceil(recorded.ticks * SIMULATION_STEP * recorded.fps) + 1
+        name = os.path.splitext(os.path.basename(path))[0]
+        return cls(name, frames, replay=path)
+
+
+def _spread(count, y_min, y_max):
+    """横一列に count 発を並べた打ち上げ位置"""
+    step = 1100 / max(count, 1)
+    return [(50 + int(step * i), y_min + (y_max - y_min) * (i % 5) // 4) for i in range(count)]
+
+
+WORKLOADS = {
+    # 1発だけ打ち上げて消えるまで
+    'single_shell': Workload(
+        'single_shell', 170,
+        launches=lambda frame: [(600, 200)] if frame == 0 else ()),
+    # 通常の休憩中（1分間、アプリ本来の自動打ち上げ）
+    'steady_break': Workload('steady_break', 1200, auto_launch=True),
+    # フィナーレ（20発を立て続けに）
+    'finale_burst': Workload(
+        'finale_burst', 200,
+        launches=lambda frame: _spread(20, 100, 300)[frame:frame + 1] if frame < 20 else ()),
+    # 高負荷（100発をほぼ同時に）
+    'stress': Workload(
+        'stress', 150,
+        launches=lambda frame: _spread(100, 300, 400)[frame * 10:frame * 10 + 10]
+        if frame < 10 else ()),
+}
+
+
+def live_particles(app):
+    """生存パーティクル数"""
+    return app.live_particle_count()
+
+
+def percentile(values, p):
+    """最近傍順位法によるパーセンタイル"""
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    index = max(0, min(len(ordered) - 1, int(round(p / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def run_workload(workload, engine='objects', renderer='items', seed=0, batch=True):
+    """ワークロードを実行して計測結果を返す
+
+    batch が真ならキャンバスの操作を Tcl のスクリプトにまとめて送る（実際のアプリの既定）。
+    """
+    if workload.replay is not None:
+        # 乱数の種・品質の変更は記録の通りに再現される
+        app = HeadlessApp(engine=engine, renderer=renderer, replay=workload.replay, batch=batch)
+    else:
+        # 品質の自動調整で負荷が変わらないよう最高品質に固定して計測する
+        app = HeadlessApp(engine=engine, renderer=renderer, quality_level=0, seed=seed,
+                          batch=batch)
+        app.is_running = True
+        if not workload.auto_launch:
+            app.next_firework_frame = workload.frames + 1
+
+    frame_times = []
+    operations = []
+    calls = []
+    uploads = []  # 画像に転送した画素数（raster のみ）
+    particle_updates = 0
+    peak_particles = 0
+    for frame in range(workload.frames):
+        if app.replay is not None and not app.is_running:
+            # 停止中のイベント（タイマー開始・リセットなど）を適用
+            app.replay_events()
+            if not app.is_running:
+                break
+        for x, y in workload.launches(frame):
+            app.launch_firework(x, y)
+        if app.worker is not None:
+            # 別プロセスが前のフレームまで進むのを待ってから計測する
+            app.worker.sync()
+        before = app.canvas.operations()
+        calls_before = app.canvas.calls
+        start = time.perf_counter()
+        app.animate()
+        frame_times.append(time.perf_counter() - start)
+        operations.append(app.canvas.operations() - before)
+        calls.append(app.canvas.calls - calls_before)
+        uploads.append(getattr(app.renderer, 'upload_area', 0))
+        live = live_particles(app)
+        particle_updates += live
+        peak_particles = max(peak_particles, live)
+    if app.worker is not None:
+        # 別プロセスの処理時間はフレーム時間に含まれない（Tk 側の負担だけを計測する）
+        app.worker.close()
+
+    total = sum(frame_times)
+    frame_ms = [t * 1000 for t in frame_times]
+    return {
+        'frames': workload.frames,
+        'total_s': round(total, 4),
+        'frame_ms': {
+            'p50': round(percentile(frame_ms, 50), 3),
+            'p95': round(percentile(frame_ms, 95), 3),
+            'p99': round(percentile(frame_ms, 99), 3),
+            'max': round(max(frame_ms), 3),
+        },
+        'particles_per_sec': round(particle_updates / total) if total > 0 else 0,
+        'peak_particles': peak_particles,
+        'canvas_ops_per_frame': {
+            'mean': round(sum(operations) / len(operations), 1),
+            'max': max(operations),
+        },
+        # 1回の Tcl の呼び出しで処理できたアイテム操作の数
+        'tcl_calls_per_frame': {
+            'mean': round(sum(calls) / len(calls), 1),
+            'max': max(calls),
+        },
+        'canvas_ops_per_sec': round(sum(operations) / total) if total > 0 else 0,
+        # raster の1フレームの負担は画像への転送量で決まる（キャンバス操作はほぼない）
+        'upload_px_per_frame': {
+            'mean': round(sum(uploads) / len(uploads), 1),
+            'max': max(uploads),
+        },
+    }
+
+
+def compare(baseline, current, tolerance=0.25, min_delta_ms=0.5):
+    """ベースラインと比べて悪化した項目の説明一覧を返す
+
+    フレーム時間は min_delta_ms 未満の差を誤差として無視する。
+    """
+    regressions = []
+    for name, base in baseline.get('workloads', {}).items():
+        result = current.get('workloads', {}).get(name)
+        if result is None:
+            continue
+        checks = [
+            ('frame_ms.p95', base['frame_ms']['p95'], result['frame_ms']['p95'], True),
+            ('frame_ms.p99', base['frame_ms']['p99'], result['frame_ms']['p99'], True),
+            ('canvas_ops_per_frame.mean', base['canvas_ops_per_frame']['mean'],
+             result['canvas_ops_per_frame']['mean'], True),
+            ('particles_per_sec', base['particles_per_sec'], result['particles_per_sec'], False),
+        ]
+        if 'upload_px_per_frame' in base and 'upload_px_per_frame' in result:
+            checks.append(('upload_px_per_frame.mean', base['upload_px_per_frame']['mean'],
+                           result['upload_px_per_frame']['mean'], True))
+        for metric, old, new, lower_is_better in checks:
+            if lower_is_better:
+                worse = new > old * (1 + tolerance)
+                if metric.startswith('frame_ms'):
+                    worse = worse and new - old >= min_delta_ms
+            else:
+                worse = new < old * (1 - tolerance)
+            if worse:
+                regressions.append(f"{name} {metric}: {old} -> {new}")
+    return regressions
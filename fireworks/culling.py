@@ -0,0 +1,30 @@
+"""画面外のパーティクルの間引き
+
+どの関数も数値でも NumPy 配列でも同じように使える（比較結果を & と | で組み合わせる）。
+パーティクルは空気抵抗で横方向の速度の向きが変わらず、重力で下向きの速度は
+増える一方なので、下端より下へ落ちていくもの・左右の端の外へ出ていくものは
+二度と画面に戻らない。
+"""
+
+CULL_MARGIN = 8  # パーティクル（きらめきの外周を含む）の最大半径
+TRAIL_REACH = 1.2  # 軌跡の最も古い点までの距離 ≦ 速度 × 軌跡の長さ × この値（空気抵抗の分）
+DEFAULT_PARTICLE_BUDGET = 3000  # 同時に存在できるパーティクル数の上限
+
+
+def on_screen(x, y, width, height, margin=CULL_MARGIN):
+    """点が画面内（縁にかかる場合を含む）にあるか"""
+    return (x > -margin) & (x < width + margin) & (y > -margin) & (y < height + margin)
+
+
+def cannot_return(x, y, vx, vy, width, height, trail_length):
+    """パーティクルも軌跡も二度と画面に入らないか"""
+    reach = trail_length * TRAIL_REACH
+    below = (vy > 0) & (y - vy * reach > height + CULL_MARGIN)
+    right = (vx >= 0) & (x - vx * reach > width + CULL_MARGIN)
+    left = (vx <= 0) & (x - vx * reach < -CULL_MARGIN)
+    return below | right | left
+
+
+def fade_ratio(life, max_life):
+    """残り寿命の割合（小さいほど古く色あせている。上限超過時はこの順に消す）"""
+    return life / max_life
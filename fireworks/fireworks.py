@@ -1,97 +1,313 @@
+import time
+
+_import_started = time.perf_counter()  # 起動時間の計測の起点（--trace-startup）
+
 import tkinter as tk
-from tkinter import messagebox
+import datetime
+import heapq
+import importlib
 import random
 import math
+import sys
+
+# パーティクルエンジンの種類
+ENGINE_OBJECTS = 'objects'  # Particleオブジェクトを1つずつ更新
+ENGINE_VECTORIZED = 'vectorized'  # NumPy配列で一括更新（要NumPy）
+ENGINE_TEMPLATE = 'template'  # 事前計算した軌道テンプレートを表引き（要NumPy）
+ENGINE_WORKER = 'worker'  # 別プロセスで物理演算し共有メモリで受け渡す（要NumPy）
+ENGINES = (ENGINE_OBJECTS, ENGINE_VECTORIZED, ENGINE_TEMPLATE, ENGINE_WORKER)
+
+# 描画バックエンドの種類
+RENDERER_ITEMS = 'items'  # キャンバスの楕円アイテムを使い回す
+RENDERER_RASTER = 'raster'  # フレームバッファを画像1枚で転送（要NumPy）
+RENDERER_SPRITES = 'sprites'  # 光の粒の画像（スプライト）を使い回す
+RENDERERS = (RENDERER_ITEMS, RENDERER_RASTER, RENDERER_SPRITES)
+
+# キャンバスの大きさ（全画面表示では物理演算の論理座標の大きさ）
+CANVAS_WIDTH = 1200
+CANVAS_HEIGHT = 700
+# 自動打ち上げの範囲（論理座標）
+LAUNCH_X_RANGE = (50, CANVAS_WIDTH - 50)  # 打ち上げる位置
+LAUNCH_Y = CANVAS_HEIGHT - 20  # 打ち上げる高さ（キャンバスの下端）
+TARGET_Y_RANGE = (100, 300)  # 爆発する高さ
+# 乱数の種の上限（記録のヘッダに uint64 で保存し、NumPy の乱数は負の種を受け付けない）
+SEED_LIMIT = 2 ** 64
+
+
+def _import_module(name):
+    """同じパッケージ内のモジュールを読み込む（スクリプト直接実行にも対応）"""
+    if __package__:
+        return importlib.import_module('.' + name, __package__)
+    return importlib.import_module(name)
+
+
+def create_particle_system(engine, bounds=None, budget=None, seed=None):
+    """エンジン名に応じたパーティクルエンジンを作成（objects/workerの場合はNone）"""
+    if engine in (ENGINE_OBJECTS, ENGINE_WORKER):
+        return None
+    if engine == ENGINE_VECTORIZED:
+        return _import_module('particles').ParticleSystem(bounds=bounds, budget=budget, seed=seed)
+    if engine == ENGINE_TEMPLATE:
+        return _import_module('templates').TemplateSystem(bounds=bounds, budget=budget, seed=seed)
+    raise ValueError(f"不明なエンジンです: {engine}")
+
+
+def create_renderer(renderer, canvas, width, height, batch=None, zoom=1):
+    """描画バックエンドを作成
+
+    batch はアイテムを使い回す描画器がコマンドを Tcl のスクリプトにまとめて送るか
+    （None は Tk のキャンバスなら送る）。zoom はラスタ描画で width x height に
+    描いた画像を表示するときの拡大率。
+    """
+    if renderer == RENDERER_ITEMS:
+        return _import_module('render').CanvasItemPool(canvas, batch=batch)
+    if renderer == RENDERER_RASTER:
+        return _import_module('raster').RasterRenderer(canvas, width, height, zoom=zoom)
+    if renderer == RENDERER_SPRITES:
+        return _import_module('sprites').SpriteRenderer(canvas, batch=batch)
+    raise ValueError(f"不明な描画バックエンドです: {renderer}")
+
+
+TrailHistory = _import_module('trails').TrailHistory
+palette = _import_module('palette')
+metrics = _import_module('metrics')
+scheduler = _import_module('scheduler')
+quality = _import_module('quality')
+culling = _import_module('culling')
+recording = _import_module('recording')
+viewport = _import_module('viewport')
+patterns = _import_module('patterns')
+startup = _import_module('startup')
+_import_finished = time.perf_counter()
+
+METRICS_OVERLAY_INTERVAL = 10  # 計測オーバーレイを書き換える間隔（フレーム）
+REPLAY_POLL_MS = 50  # 停止中に再生するイベントを確認する間隔（ミリ秒）
+SYNC_POLL_MS = 50  # 同期モードで停止中にイベントを送受信する間隔（ミリ秒）
+
+
+# 打ち上げ中の花火の色
+FIREWORK_COLORS = ('red', 'blue', 'green', 'yellow', 'purple', 'orange', 'white', 'cyan')
+
 
 class Firework:
-    def __init__(self, x, y, target_y):
+    # 属性を固定して1発あたりのメモリを減らす（FireworkPool で使い回す）
+    __slots__ = ('x', 'y', 'target_y', 'exploded', 'particles', 'trail', 'sparkle_rng', 'color',
+                 'system', 'handle', 'level', 'bounds', 'pattern', 'pool', '_ends')
+    speed = 8  # 打ち上げの速さ
+    
+    def __init__(self, x, y, target_y, system=None, level=None, bounds=None,
+                 rng=random, sparkle_rng=random, pattern=patterns.DEFAULT_PATTERN, pool=None):
+        self.particles = []
+        self._ends = []  # 寿命の同じ輪のまとまりごとの particles の終端の位置（寿命の長い順）
+        self.trail = TrailHistory(10)  # 打ち上げ中の軌跡（最大10点）
+        self.reset(x, y, target_y, system, level, bounds, rng, sparkle_rng, pattern, pool)
+    
+    def reset(self, x, y, target_y, system=None, level=None, bounds=None,
+              rng=random, sparkle_rng=random, pattern=patterns.DEFAULT_PATTERN, pool=None):
+        """打ち上げ前の状態にする（再利用時は軌跡とパーティクルの一覧を使い回す）"""
         self.x = x
         self.y = y
         self.target_y = target_y
-        self.speed = 8
         self.exploded = False
-        self.particles = []
-        self.trail = []
-        self.color = random.choice(['red', 'blue', 'green', 'yellow', 'purple', 'orange', 'white', 'cyan'])
+        self.particles.clear()
+        self._ends.clear()
+        self.trail.clear()
+        # 乱数（色の選択とパーティクルのきらめき）。再現する場合はアプリの乱数を渡す
+        self.sparkle_rng = sparkle_rng
+        self.color = rng.choice(FIREWORK_COLORS)
+        # 一括更新エンジン（Noneの場合はParticleオブジェクトを使用）
+        self.system = system
+        self.handle = None
+        # 品質設定（輪の数・軌跡の長さ・きらめき）
+        self.level = level if level is not None else quality.QUALITY_LEVELS[0]
+        self.bounds = bounds  # 画面の (幅, 高さ)。指定すると画面外のパーティクルを間引く
+        self.pattern = pattern  # 爆発パターンの名前
+        self.pool = pool  # パーティクルを取り出すプール（Noneは毎回作成）
         
     def update(self):
         if not self.exploded:
             # 打ち上げ段階
-            self.trail.append((self.x, self.y))
-            if len(self.trail) > 10:
-                self.trail.pop(0)
+            self.trail.push(self.x, self.y)
             
             self.y -= self.speed
             if self.y <= self.target_y:
                 self.explode()
-        else:
-            # 爆発後のパーティクル更新
-            for particle in self.particles:
+        elif self.system is None:
+            # 爆発後のパーティクル更新（エンジン使用時はエンジン側で一括更新）
+            particles = self.particles
+            for particle in particles:
                 particle.update()
-            # 消えたパーティクルを削除
-            self.particles = [p for p in self.particles if p.life > 0]
+            self.expire()
+            if self.bounds is not None:
+                # 二度と画面に戻らないパーティクルを後ろから削除
+                width, height = self.bounds
+                for i in range(len(particles) - 1, -1, -1):
+                    if particles[i].cannot_return(width, height):
+                        self.discard((i,))
+    
+    def expire(self):
+        """寿命の尽きた輪のまとまりを末尾からまとめて削除
+
+        パーティクルは寿命の長い順に並んでいるので、消えるのは常に末尾のまとまりで、
+        各まとまりの末尾の1粒を見るだけで判定できる（手間は消える数にだけ比例する）。
+        プールを使う場合、削除したパーティクルはプールに戻す。
+        """
+        ends = self._ends
+        particles = self.particles
+        while ends:
+            start = ends[-2] if len(ends) > 1 else 0
+            if start < ends[-1] and particles[-1].life > 0:
+                break
+            ends.pop()
+            if self.pool is not None:
+                self.pool.free_particles.extend(particles[start:])
+            del particles[start:]
+    
+    def discard(self, indices):
+        """指定した位置のパーティクルを削除（位置は大きい順に渡す）
+
+        一覧を作り直さず、各まとまりの末尾との入れ替えを後ろのまとまりへ順に送り、
+        最後に一覧の末尾を取り除く（寿命の順は崩れない）。
+        """
+        particles = self.particles
+        ends = self._ends
+        free = self.pool.free_particles if self.pool is not None else None
+        for i in indices:
+            removed = particles[i]
+            hole = i
+            for cohort, end in enumerate(ends):
+                if end > hole:
+                    last = end - 1
+                    particles[hole] = particles[last]
+                    ends[cohort] = last
+                    hole = last
+            particles.pop()
+            if free is not None:
+                free.append(removed)
     
     def explode(self):
         self.exploded = True
-        # 変化菊パターンで放射状にパーティクルを作成
-        num_particles = 32  # 菊のような放射状パターンのため固定数
-        base_colors = ['gold', 'orange', 'red', 'crimson', 'purple']
-        
-        for i in range(num_particles):
-            # 均等に放射状に配置
-            angle = (2 * math.pi * i) / num_particles
-            # 複数の輪を作る（菊のような重層構造）
-            for ring in range(3):
-                speed = 3 + ring * 2  # 輪ごとに速度を変える
-                color_index = (ring + i // 4) % len(base_colors)
-                color = base_colors[color_index]
-                self.particles.append(Particle(self.x, self.y, angle, speed, color, ring))
-    
-    def draw(self, canvas):
+        if self.system is not None:
+            self.handle = self.system.burst(self.x, self.y, self.pattern)
+            return
+        # コンパイル済みのパターンの初速度・寿命・色でパーティクルを作成
+        # （寿命の長い順に並べ、寿命の同じまとまりの終端を記録する）
+        level = self.level
+        compiled = patterns.compile_pattern(self.pattern, level.rings)
+        self._ends.extend(compiled.cohort_ends)
+        x, y = self.x, self.y
+        trail_length, sparkle_rate, rng = level.trail_length, level.sparkle_rate, self.sparkle_rng
+        if self.pool is None:
+            self.particles.extend(Particle(x, y, 0, 0, color, ring, trail_length, sparkle_rate,
+                                           rng, velocity=(vx, vy), life=life)
+                                  for vx, vy, life, color, ring in compiled.by_life)
+            return
+        # プールに戻ったパーティクルを初期化し直して使う
+        acquire = self.pool.particle
+        self.particles.extend(acquire(x, y, vx, vy, color, ring, trail_length, sparkle_rate,
+                                      rng, life)
+                              for vx, vy, life, color, ring in compiled.by_life)
+    
+    def draw(self, canvas, alpha=0.0):
         if not self.exploded:
-            # 打ち上げ中の軌跡を描画
-            for i, (x, y) in enumerate(self.trail):
-                alpha = i / len(self.trail)
-                size = max(1, int(4 * alpha))
+            # 打ち上げ中の軌跡を描画（補間時は次のステップへ向けてずらす）
+            trail = self.trail
+            length = len(trail)
+            fill = palette.resolve(self.color)
+            shift = self.speed * alpha
+            for i in range(length):
+                j = trail.slot(i)
+                x = trail.xs[j]
+                y = trail.ys[j] - shift
+                fade = i / length
+                size = max(1, int(4 * fade))
                 canvas.create_oval(x-size, y-size, x+size, y+size, 
-                                 fill=self.color, outline='', tags='firework')
-        else:
-            # パーティクルを描画
+                                 fill=fill, outline='', tags='firework')
+        elif self.system is None:
+            # 画面内のパーティクルを描画（エンジン使用時はエンジン側で一括描画）
+            if self.bounds is None:
+                for particle in self.particles:
+                    particle.draw(canvas, alpha)
+                return
+            width, height = self.bounds
             for particle in self.particles:
-                particle.draw(canvas)
+                if particle.is_visible(width, height):
+                    particle.draw(canvas, alpha)
     
     def is_finished(self):
+        if self.system is not None:
+            return self.exploded and self.system.alive(self.handle) == 0
         return self.exploded and len(self.particles) == 0
 
 class Particle:
-    def __init__(self, x, y, angle, speed, color, ring=0):
+    # 属性を固定して1粒あたりのメモリを減らす（FireworkPool で使い回す）
+    __slots__ = ('x', 'y', 'vx', 'vy', 'life', 'max_life', 'initial_color', 'current_color',
+                 'ring', 'max_trail_length', '_trail', 'sparkle_rate', 'rng', 'color_schedule')
+    gravity = 0.08  # 重力（全パーティクル共通）
+    
+    def __init__(self, x, y, angle, speed, color, ring=0, trail_length=8, sparkle_rate=0.1,
+                 rng=random, velocity=None, life=None):
+        # 初速度（コンパイル済みのパターンからは計算済みの値を受け取る）
+        if velocity is None:
+            vx = math.cos(angle) * speed
+            vy = math.sin(angle) * speed
+        else:
+            vx, vy = velocity
+        self._trail = None
+        self.reset(x, y, vx, vy, color, ring, trail_length, sparkle_rate, rng, life)
+    
+    def reset(self, x, y, vx, vy, color, ring=0, trail_length=8, sparkle_rate=0.1,
+              rng=random, life=None):
+        """初期状態にする（再利用時は軌跡の配列を使い回す）"""
         self.x = x
         self.y = y
-        self.vx = math.cos(angle) * speed
-        self.vy = math.sin(angle) * speed
-        self.life = 80 + ring * 10  # 輪によって寿命を変える
+        self.vx = vx
+        self.vy = vy
+        self.life = life if life is not None else 80 + ring * 10  # 輪によって寿命を変える
         self.max_life = self.life
         self.initial_color = color
         self.current_color = color
         self.ring = ring
-        self.gravity = 0.08
-        self.fade_phase = 0  # 色変化のフェーズ
         
         # 尾を引く効果のための軌跡記録
-        self.trail = []
-        self.max_trail_length = 8  # 軌跡の最大長さ
+        self.max_trail_length = trail_length  # 軌跡の最大長さ
+        if self._trail is None or self._trail.capacity != trail_length:
+            self._trail = TrailHistory(trail_length)
+        else:
+            self._trail.clear()
+        self.sparkle_rate = sparkle_rate  # きらめく確率
+        self.rng = rng  # きらめきの乱数
         
-        # 変化菊用の色変化パターン
-        self.color_sequence = [
-            'gold', 'yellow', 'orange', 'red', 'crimson', 'purple', 'blue', 'white'
-        ]
-        self.color_index = 0
+        # 変化菊用の年齢ごとの色（16進表記、寿命と初期色ごとに共有）
+        self.color_schedule = palette.color_schedule(color, self.max_life)
+    
+    @property
+    def trail(self):
+        """軌跡の履歴（リングバッファ）"""
+        return self._trail
+    
+    @trail.setter
+    def trail(self, points):
+        self._trail.load(points)
+    
+    def is_visible(self, width, height):
+        """本体か軌跡の最も古い点が画面内にあるか"""
+        if culling.on_screen(self.x, self.y, width, height):
+            return True
+        trail = self._trail
+        if len(trail) == 0:
+            return False
+        j = trail.slot(0)
+        return culling.on_screen(trail.xs[j], trail.ys[j], width, height)
+    
+    def cannot_return(self, width, height):
+        """本体も軌跡も二度と画面に入らないか"""
+        return culling.cannot_return(self.x, self.y, self.vx, self.vy, width, height,
+                                     self.max_trail_length)
         
     def update(self):
         # 現在位置を軌跡に追加
-        self.trail.append((self.x, self.y, self.current_color))
-        if len(self.trail) > self.max_trail_length:
-            self.trail.pop(0)
+        self._trail.push(self.x, self.y, self.current_color)
             
         self.x += self.vx
         self.y += self.vy
@@ -99,53 +315,32 @@ class Particle:
         self.vx *= 0.985  # 空気抵抗を少し弱める
         self.life -= 1
         
-        # 色の変化（変化菊効果）
-        life_ratio = 1 - (self.life / self.max_life)
-        
-        # 3段階で色が変化
-        if life_ratio < 0.3:
-            # 第1段階: 初期色 → 黄色
-            self.current_color = self.initial_color
-        elif life_ratio < 0.6:
-            # 第2段階: 黄色 → オレンジ → 赤
-            colors = ['yellow', 'orange', 'red']
-            phase = int((life_ratio - 0.3) * 10) % len(colors)
-            self.current_color = colors[phase]
-        else:
-            # 第3段階: 赤 → 紫 → 青 → 白（フェードアウト）
-            colors = ['red', 'purple', 'blue', 'white']
-            phase = int((life_ratio - 0.6) * 10) % len(colors)
-            self.current_color = colors[phase]
+        # 色の変化（変化菊効果、年齢で表を引く）
+        age = min(self.max_life - self.life, len(self.color_schedule) - 1)
+        self.current_color = self.color_schedule[age]
         
-    def draw(self, canvas):
+    def draw(self, canvas, alpha=0.0):
         if self.life > 0:
             # 軌跡を描画（尾を引く効果）
-            for i, (trail_x, trail_y, trail_color) in enumerate(self.trail):
+            trail = self._trail
+            length = len(trail)
+            fade_colors = palette.FADE_COLORS
+            # 軌跡の透明度効果（新しい3点は描かない）
+            for i in range(length - 3):
+                j = trail.slot(i)
+                trail_x = trail.xs[j]
+                trail_y = trail.ys[j]
                 # 軌跡の透明度と大きさを後ろほど小さく
-                trail_alpha = (i + 1) / len(self.trail)
+                trail_alpha = (i + 1) / length
                 trail_size = max(1, int(2 * trail_alpha))
                 
                 # 軌跡の色を少し暗めに
-                if trail_color == 'gold':
-                    fade_color = 'orange'
-                elif trail_color == 'yellow':
-                    fade_color = 'gold'
-                elif trail_color == 'orange':
-                    fade_color = 'red'
-                elif trail_color == 'red':
-                    fade_color = 'darkred'
-                elif trail_color == 'purple':
-                    fade_color = 'darkviolet'
-                elif trail_color == 'blue':
-                    fade_color = 'darkblue'
-                else:
-                    fade_color = trail_color
+                trail_color = trail.colors[j]
+                fade_color = fade_colors.get(trail_color, trail_color)
                 
-                # 軌跡の透明度効果
-                if i < len(self.trail) - 3:  # 古い軌跡ほど暗く
-                    canvas.create_oval(trail_x-trail_size, trail_y-trail_size, 
-                                     trail_x+trail_size, trail_y+trail_size,
-                                     fill=fade_color, outline='', tags='firework')
+                canvas.create_oval(trail_x-trail_size, trail_y-trail_size, 
+                                 trail_x+trail_size, trail_y+trail_size,
+                                 fill=fade_color, outline='', tags='firework')
             
             # メインのパーティクルを描画
             life_ratio = self.life / self.max_life
@@ -157,18 +352,78 @@ class Particle:
             elif self.ring == 2:  # 外側の輪
                 size = max(1, int(size * 0.8))
             
+            # 補間時は速度に沿って次のステップへ向けてずらす
+            x = self.x + self.vx * alpha
+            y = self.y + self.vy * alpha
+            
             # きらめき効果（ランダムで少し大きく描画）
-            if random.random() < 0.1:
+            if self.rng.random() < self.sparkle_rate:
                 size += 1
                 # きらめきの外周を描画
-                canvas.create_oval(self.x-size-1, self.y-size-1, self.x+size+1, self.y+size+1,
-                                 fill='white', outline='', tags='firework')
-                canvas.create_oval(self.x-size, self.y-size, self.x+size, self.y+size,
+                canvas.create_oval(x-size-1, y-size-1, x+size+1, y+size+1,
+                                 fill=palette.HEX_COLORS['white'], outline='', tags='firework')
+                canvas.create_oval(x-size, y-size, x+size, y+size,
                                  fill=self.current_color, outline='', tags='firework')
             else:
-                canvas.create_oval(self.x-size, self.y-size, self.x+size, self.y+size,
+                canvas.create_oval(x-size, y-size, x+size, y+size,
                                  fill=self.current_color, outline='', tags='firework')
 
+class FireworkPool:
+    """使い終わった Firework と Particle を再利用するフリーリスト
+
+    爆発時は free_particles から取り出して初期化し直し、消えたパーティクルと
+    終わった花火はここに戻す。created_* は新しく作った数で、十分に打ち上げた後は
+    （同時に存在する数が増えない限り）増えない。
+    """
+    
+    def __init__(self):
+        self.free_fireworks = []
+        self.free_particles = []
+        self.created_fireworks = 0
+        self.created_particles = 0
+    
+    def firework(self, x, y, target_y, system=None, level=None, bounds=None,
+                 rng=random, sparkle_rng=random, pattern=patterns.DEFAULT_PATTERN):
+        """打ち上げる花火（戻された花火があれば使い回す）"""
+        if self.free_fireworks:
+            firework = self.free_fireworks.pop()
+            firework.reset(x, y, target_y, system, level, bounds, rng, sparkle_rng, pattern, self)
+            return firework
+        self.created_fireworks += 1
+        return Firework(x, y, target_y, system, level, bounds, rng, sparkle_rng, pattern, self)
+    
+    def particle(self, x, y, vx, vy, color, ring, trail_length, sparkle_rate, rng, life):
+        """爆発で使うパーティクル（戻されたパーティクルがあれば使い回す）"""
+        if self.free_particles:
+            particle = self.free_particles.pop()
+            particle.reset(x, y, vx, vy, color, ring, trail_length, sparkle_rate, rng, life)
+            return particle
+        self.created_particles += 1
+        return Particle(x, y, 0, 0, color, ring, trail_length, sparkle_rate, rng,
+                        velocity=(vx, vy), life=life)
+    
+    def release(self, firework):
+        """終わった（または消した）花火を残りのパーティクルと一緒に戻す"""
+        self.free_particles.extend(firework.particles)
+        firework.particles.clear()
+        self.free_fireworks.append(firework)
+    
+    def step(self, fireworks):
+        """全ての花火を1ステップ進め、終わった花火を一覧から外して戻す
+
+        一覧を複製せず、終わった花火の位置に末尾の花火を移して詰める（並び順は変わる）。
+        """
+        i = 0
+        while i < len(fireworks):
+            firework = fireworks[i]
+            firework.update()
+            if firework.is_finished():
+                fireworks[i] = fireworks[-1]
+                fireworks.pop()
+                self.release(firework)
+            else:
+                i += 1
+
 class TimerDialog(tk.Toplevel):
     def __init__(self, parent):
         super().__init__(parent)
@@ -230,7 +485,8 @@ class TimerDialog(tk.Toplevel):
             self.result = total_seconds
             self.destroy()
         else:
-            tk.messagebox.showwarning("警告", "時間を設定してください。")
+            from tkinter import messagebox
+            messagebox.showwarning("警告", "時間を設定してください。")
     
     def cancel_timer(self):
         """キャンセル"""
@@ -238,8 +494,20 @@ class TimerDialog(tk.Toplevel):
         self.destroy()
 
 class CanvasAnimationApp(tk.Tk):
-    def __init__(self):
-        super().__init__()
+    def __init__(self, engine=ENGINE_OBJECTS, renderer=RENDERER_ITEMS,
+                 metrics_overlay=False, metrics_log=None, fps=20, interpolate=False,
+                 quality_level=quality.QUALITY_AUTO,
+                 particle_budget=culling.DEFAULT_PARTICLE_BUDGET,
+                 seed=None, record=None, replay=None, playback=None, batch=None,
+                 trace=None, mirrors=(), sync_serve=None, sync_follow=None,
+                 fullscreen=False, pattern_weights=None):
+        # 起動時間の計測（任意）
+        self.trace = trace
+        if trace is not None:
+            with trace.phase('tk_init'):
+                super().__init__()
+        else:
+            super().__init__()
         
         self.title("Fireworks Timer Application")
         self.geometry("1280x720")
@@ -247,7 +515,90 @@ class CanvasAnimationApp(tk.Tk):
         # アニメーション制御
         self.is_running = False
         self.fireworks = []
+        self.pool = FireworkPool()  # 花火とパーティクルを使い回す（定常状態では新しく作らない）
         self.animation_id = None
+        self.tick = 0  # 物理ステップの通し番号（記録・再生の時刻。リセットしても戻さない）
+        
+        # 記録を再生する場合は乱数の種・FPS・品質・パーティクル数の上限・爆発パターンの重みを記録に合わせる
+        # （同期の受信側は送信元から届くイベントを記録と同じように再生する）
+        self.replay = None
+        self.follower = None
+        recorded = None
+        if sync_follow is not None:
+            self.follower = _import_module('sync').SyncFollower(*sync_follow)
+            recorded = self.follower.recording
+        elif replay is not None:
+            recorded = recording.load_recording(replay)
+        # 再生中・同期の受信側は記録・送信元のイベントだけで動かす（画面の操作を受け付けると
+        # 状態と乱数がずれて戻せなくなる）
+        self.local_input = recorded is None
+        if recorded is not None:
+            self.replay = recording.Replay(recorded)
+            seed = recorded.seed
+            fps = recorded.fps
+            particle_budget = recorded.particle_budget
+            # 自動調整だった場合も段階の変更は記録から再現する
+            quality_level = 0 if recorded.quality is None else recorded.quality
+            if recorded.pattern_weights:
+                unknown = sorted(set(recorded.pattern_weights) - set(patterns.PATTERNS))
+                if unknown:
+                    raise ValueError(f"記録に不明な爆発パターンがあります: {', '.join(unknown)}")
+                pattern_weights = recorded.pattern_weights
+        # 乱数（打ち上げの位置・間隔・色と、描画時のきらめきは別の系列にする）
+        self.seed = seed if seed is not None else random.randrange(2 ** 32)
+        self.rng = random.Random(self.seed)
+        self.sparkle_rng = random.Random(self.seed + 1)
+        # 打ち上げる爆発パターンと選ばれる重み（既定は元々の変化菊だけ）
+        self.pattern_weights = dict(pattern_weights or patterns.default_weights())
+        
+        # 画面外のパーティクルの間引きに使う画面の大きさと、同時に存在できる
+        # パーティクル数の上限（Noneは無制限）
+        self.bounds = (CANVAS_WIDTH, CANVAS_HEIGHT)
+        self.particle_budget = particle_budget
+        self.particle_system = create_particle_system(engine, self.bounds, particle_budget,
+                                                      self.seed)
+        # workerエンジンでは花火もパーティクルも別プロセスが持つ
+        self.worker = None
+        if engine == ENGINE_WORKER:
+            self.worker = _import_module('worker').PhysicsWorker(self.bounds, particle_budget,
+                                                                 seed=self.seed)
+        # 事前に描画したショーを再生する場合は物理演算を行わない
+        self.show = _import_module('showcache').ShowCache(playback) if playback else None
+        self.renderer_name = renderer
+        self.renderer = None  # create_widgetsでキャンバスと共に作成
+        self.batch = batch  # キャンバスの操作をまとめて送るか（Noneは自動）
+        # 全画面表示ではキャンバスをウィンドウに合わせ、論理座標から拡大・縮小して描く
+        self.fullscreen = fullscreen
+        self.layout = None  # キャンバスの大きさに応じた表示の設定（全画面表示のみ）
+        self.canvas_renderer = None  # キャンバスに描く描画器（拡大・縮小やミラーの手前）
+        # 物理演算は固定ステップ、描画は目標FPSで行う
+        self.scheduler = scheduler.FrameScheduler(fps)
+        self.interpolate = interpolate  # 描画位置をステップ間で補間するか
+        # フレーム時間に応じて品質を自動調整（段階を指定した場合は固定）
+        self.governor = quality.QualityGovernor(
+            self.scheduler.interval,
+            fixed=None if quality_level == quality.QUALITY_AUTO else int(quality_level))
+        self.apply_quality()
+        # 打ち上げ・クリック・タイマー操作の記録（任意）
+        self.recorder = None
+        if record:
+            self.recorder = recording.EventRecorder(
+                record, self.seed,
+                None if quality_level == quality.QUALITY_AUTO else int(quality_level),
+                fps, particle_budget, self.pattern_weights)
+        # 同期の送信元（同じイベントを受信側に送る）
+        self.sync_server = None
+        if sync_serve is not None:
+            self.sync_server = _import_module('sync').SyncServer(
+                self.seed,
+                None if quality_level == quality.QUALITY_AUTO else int(quality_level),
+                fps, particle_budget, port=sync_serve, pattern_weights=self.pattern_weights)
+        
+        # フレーム計測（オーバーレイ表示・JSON Lines出力は任意）
+        self.metrics = metrics.FrameMetrics()
+        self.metrics_log = metrics.MetricsLog(metrics_log) if metrics_log else None
+        self.show_metrics = metrics_overlay
+        self.metrics_item = None
         
         # タイマー制御
         self.timer_seconds = 0
@@ -255,10 +606,44 @@ class CanvasAnimationApp(tk.Tk):
         self.timer_id = None
         self.start_time = None  # 開始時刻を記録
         self.end_time = None  # 終了時刻を記録
+        self.timer_deadline = None  # 終了予定時刻（time.monotonic基準）
         
-        self.create_widgets()
+        if trace is not None:
+            with trace.phase('create_widgets'):
+                self.create_widgets()
+            # キャンバスが最初に描画された後で経過時間を記録
+            self.first_frame_binding = self.canvas.bind('<Expose>', self.on_first_expose, '+')
+        else:
+            self.create_widgets()
+        # 同じ花火を表示する別ウィンドウ（物理演算は共有する）
+        self.mirror_windows = []
+        for width, height in mirrors:
+            self.add_mirror(width, height)
         self.setup_animations()
-        self.center_window()  # ウィンドウを中央に配置
+        if fullscreen:
+            self.attributes('-fullscreen', True)
+        else:
+            self.center_window()  # ウィンドウを中央に配置
+        if self.sync_server is not None or self.follower is not None:
+            self.after(SYNC_POLL_MS, self.poll_sync)
+        elif self.replay is not None:
+            self.after(REPLAY_POLL_MS, self.poll_replay)
+    
+    def on_first_expose(self, event):
+        """キャンバスの最初の Expose（描画はこの後のアイドル処理で行われる）"""
+        self.canvas.unbind('<Expose>', self.first_frame_binding)
+        self.after_idle(self.first_frame_painted)
+    
+    def first_frame_painted(self):
+        """最初のフレームまでの時間を記録して起動時間を報告"""
+        self.trace.mark('first_frame')
+        print(self.trace.report(), file=sys.stderr)
+        for name, seconds, limit in self.trace.over_budget():
+            print(f"警告: {name} が目安を超えました（{seconds * 1000:.0f} ms > "
+                  f"{limit * 1000:.0f} ms）", file=sys.stderr)
+        lazy = startup.loaded_lazy_modules()
+        if lazy:
+            print(f"起動時に読み込まれたモジュール: {', '.join(lazy)}", file=sys.stderr)
     
     def center_window(self):
         """ウィンドウを画面中央に配置"""
@@ -279,19 +664,22 @@ class CanvasAnimationApp(tk.Tk):
             bg="green",
             fg="white",
             font=("Arial", 12, "bold"),
-            width=10
+            width=10,
+            state=tk.NORMAL if self.local_input else tk.DISABLED
         )
         self.start_button.pack(side=tk.LEFT, padx=5)
         
-        tk.Button(
+        self.reset_button = tk.Button(
             control_frame,
             text="リセット",
             command=self.reset_animation,
             bg="orange",
             fg="white",
             font=("Arial", 12, "bold"),
-            width=8
-        ).pack(side=tk.LEFT, padx=5)
+            width=8,
+            state=tk.NORMAL if self.local_input else tk.DISABLED
+        )
+        self.reset_button.pack(side=tk.LEFT, padx=5)
         
 
         
@@ -316,48 +704,125 @@ class CanvasAnimationApp(tk.Tk):
         timer_label.pack(side=tk.LEFT, padx=20, pady=5)
         
         # キャンバス
-        self.canvas = tk.Canvas(
-            self,
-            width=1200,
-            height=700,
-            bg='black',
-            relief=tk.SUNKEN,
-            borderwidth=2
-        )
-        self.canvas.pack(padx=10, pady=10)
+        if self.fullscreen:
+            # 枠なしでウィンドウ全体に広げる（大きさは <Configure> で受け取る）
+            self.canvas = tk.Canvas(
+                self,
+                width=CANVAS_WIDTH,
+                height=CANVAS_HEIGHT,
+                bg='black',
+                highlightthickness=0,
+                borderwidth=0
+            )
+            self.canvas.pack(fill=tk.BOTH, expand=True)
+            self.canvas.bind("<Configure>", self.on_canvas_configure)
+            # Escで全画面表示をやめる（キャンバスはウィンドウに合わせたまま）
+            self.bind("<Escape>", lambda event: self.attributes('-fullscreen', False))
+        else:
+            self.canvas = tk.Canvas(
+                self,
+                width=CANVAS_WIDTH,
+                height=CANVAS_HEIGHT,
+                bg='black',
+                relief=tk.SUNKEN,
+                borderwidth=2
+            )
+            self.canvas.pack(padx=10, pady=10)
+        # 花火の描画器（アイテムを使い回す、またはラスタ画像）
+        self.canvas_renderer = create_renderer(self.renderer_name, self.canvas,
+                                               CANVAS_WIDTH, CANVAS_HEIGHT, self.batch)
+        self.renderer = self.canvas_renderer
         
         # キャンバスクリックで花火発射
         self.canvas.bind("<Button-1>", self.on_canvas_click)
+        # F3で計測オーバーレイの表示を切り替え
+        self.bind("<F3>", self.toggle_metrics_overlay)
+    
+    def on_canvas_configure(self, event):
+        """キャンバスの大きさが変わったら表示の設定と描画器を作り直す"""
+        self.resize_canvas(event.width, event.height)
+    
+    def resize_canvas(self, width, height):
+        """論理座標を width x height のキャンバスに収めて描くようにする
+
+        ラスタ描画では画素数が多すぎる場合に低い解像度で描いて拡大する。
+        大きさが変わらない場合は何もしない。
+        """
+        size = (width, height)
+        if self.layout is not None and self.layout.size == size:
+            return
+        zoom = viewport.raster_zoom(width, height) if self.renderer_name == RENDERER_RASTER else 1
+        self.layout = viewport.Layout(self.bounds, size, zoom)
+        self.canvas_renderer.clear()
+        if self.renderer_name == RENDERER_RASTER:
+            # ラスタ画像は解像度ごとに作り直す
+            self.canvas_renderer = create_renderer(self.renderer_name, self.canvas,
+                                                   *self.layout.render_size, self.batch, zoom)
+        view = self.layout.viewport(self.canvas_renderer)
+        if isinstance(self.renderer, _import_module('mirror').FrameFanout):
+            self.renderer.primary = view
+        else:
+            self.renderer = view
+    
+    def share_frames(self):
+        """描画器を、描いた円をミラーにも渡す FrameFanout に差し替える（差し替え済みならそのまま）"""
+        mirror = _import_module('mirror')
+        if not isinstance(self.renderer, mirror.FrameFanout):
+            self.renderer = mirror.FrameFanout(self.renderer, CANVAS_WIDTH, CANVAS_HEIGHT)
+        return self.renderer
+    
+    def add_mirror(self, width, height):
+        """同じ花火を width x height のキャンバスに表示するウィンドウを開く"""
+        fanout = self.share_frames()
+        window = _import_module('mirror').MirrorWindow(
+            self, width, height,
+            lambda canvas, w, h: create_renderer(self.renderer_name, canvas, w, h, self.batch),
+            title=f"Fireworks Mirror {len(self.mirror_windows) + 1}")
+        fanout.add(window.output)
+        window.protocol("WM_DELETE_WINDOW", lambda: self.close_mirror(window))
+        self.mirror_windows.append(window)
+        return window
+    
+    def close_mirror(self, window):
+        """ミラーのウィンドウを閉じる"""
+        self.renderer.remove(window.output)
+        self.mirror_windows.remove(window)
+        window.destroy()
     
     def setup_animations(self):
         """アニメーションの初期設定"""
         self.frame_count = 0
-        self.next_firework_frame = random.randint(60, 120)  # 次の花火発射フレーム
+        self.next_firework_frame = self.rng.randint(60, 120)  # 次の花火発射フレーム
     
     def show_timer_dialog(self):
-        """タイマー設定ダイアログを表示"""
+        """タイマー設定ダイアログを表示（再生中・同期の受信側では何もしない）"""
+        if not self.local_input:
+            return
         dialog = TimerDialog(self)
         self.wait_window(dialog)
         
         if dialog.result is not None:
-            self.timer_seconds = dialog.result
-            self.remaining_seconds = self.timer_seconds
-            # 開始時刻と終了時刻を記録
-            import datetime
-            now = datetime.datetime.now()
-            self.start_time = now
-            self.end_time = now + datetime.timedelta(seconds=self.timer_seconds)
-            self.start_animation()
+            self.start_break(dialog.result)
+    
+    def start_break(self, seconds):
+        """休憩タイマーを開始して花火を打ち上げ始める"""
+        self.record_event(recording.EVENT_TIMER_START, seconds)
+        self.timer_seconds = seconds
+        self.remaining_seconds = self.timer_seconds
+        # 開始時刻と終了時刻を記録（残り時間は時刻の変更に影響されない単調時計で数える）
+        now = datetime.datetime.now()
+        self.timer_deadline = time.monotonic() + self.timer_seconds
+        self.start_time = now
+        self.end_time = now + datetime.timedelta(seconds=self.timer_seconds)
+        self.start_animation()
     
     def get_current_time(self):
         """現在時刻を取得（hh:mm形式）"""
-        import datetime
         now = datetime.datetime.now()
         return now.strftime("%H:%M")
     
     def calculate_end_time(self):
         """終了時刻を計算（hh:mm形式）"""
-        import datetime
         now = datetime.datetime.now()
         end_time = now + datetime.timedelta(seconds=self.timer_seconds)
         return end_time.strftime("%H:%M")
@@ -386,42 +851,77 @@ class CanvasAnimationApp(tk.Tk):
     def update_timer(self):
         """タイマー更新"""
         if self.is_running and self.remaining_seconds > 0:
-            self.remaining_seconds -= 1
+            if self.timer_deadline is not None:
+                # 終了予定時刻から残り時間を求める（処理が遅れてもすぐに追いつく）
+                left = self.timer_deadline - time.monotonic()
+                self.remaining_seconds = max(0, math.ceil(left))
+                # 次に表示が変わる秒の境目まで待つ
+                delay = max(1, math.ceil((left - (self.remaining_seconds - 1)) * 1000))
+            else:
+                self.remaining_seconds -= 1
+                delay = 1000
             self.update_timer_display()
             self.update_break_display()  # 休憩中表示も更新
             
             if self.remaining_seconds <= 0:
-                # タイマー終了時の表示を更新
-                self.update_break_display()
-                # 花火を停止
-                self.is_running = False
-                if self.animation_id:
-                    self.after_cancel(self.animation_id)
-                    self.animation_id = None
-                # 花火を消す
-                self.canvas.delete('firework')
+                # 再生中は記録したタイマー終了のステップで止める
+                if self.replay is None:
+                    self.finish_break()
                 return
             
             # 次のタイマー更新をスケジュール
-            self.timer_id = self.after(1000, self.update_timer)
+            self.timer_id = self.after(delay, self.update_timer)
+    
+    def finish_break(self):
+        """タイマー終了（花火を止めて消す）"""
+        self.record_event(recording.EVENT_TIMER_END)
+        self.remaining_seconds = 0
+        self.update_timer_display()
+        # タイマー終了時の表示を更新
+        self.update_break_display()
+        # 花火を停止（次の休憩では止まっていた間を物理演算に数えない）
+        self.is_running = False
+        if self.animation_id:
+            self.after_cancel(self.animation_id)
+            self.animation_id = None
+        self.scheduler.stop()
+        # 花火を消す
+        self.renderer.clear()
         
     def on_canvas_click(self, event):
-        """キャンバスクリックで花火を発射"""
-        if self.is_running:
-            self.launch_firework(event.x, event.y)
+        """キャンバスクリックで花火を発射（再生中は記録したクリックだけを使う）"""
+        if self.is_running and self.local_input and self.show is None:
+            x, y = event.x, event.y
+            if self.layout is not None:
+                # 全画面表示ではキャンバスの座標を論理座標に戻す（論理座標の外は無視）
+                x, y = (int(round(v)) for v in self.layout.to_world(x, y))
+                if not (0 <= x <= CANVAS_WIDTH and 0 <= y <= CANVAS_HEIGHT):
+                    return
+            self.launch_firework(x, y)
     
-    def launch_firework(self, x=None, y=None):
-        """花火を発射"""
+    def launch_firework(self, x=None, y=None, pattern=None):
+        """花火を発射（pattern を省略すると重みに従って爆発パターンを選ぶ）"""
+        # 位置を指定した打ち上げ（クリック）と自動打ち上げを区別して記録
+        kind = recording.EVENT_CLICK if x is not None and y is not None else recording.EVENT_LAUNCH
         if x is None:
-            x = random.randint(50, 1150)  # キャンバス幅に合わせて調整
+            x = self.rng.randint(*LAUNCH_X_RANGE)
         if y is None:
-            target_y = random.randint(100, 300)  # 高さも拡大
+            target_y = self.rng.randint(*TARGET_Y_RANGE)
         else:
             target_y = y
-            
+        # パターンは記録しない（再生時も同じ乱数で同じパターンが選ばれる）
+        if pattern is None:
+            pattern = patterns.choose(self.rng, self.pattern_weights)
+        self.record_event(kind, x, target_y)
+        
         # 下から打ち上げ
-        start_y = 680  # キャンバス高さに合わせて調整
-        firework = Firework(x, start_y, target_y)
+        start_y = LAUNCH_Y
+        if self.worker is not None:
+            self.worker.launch(x, start_y, target_y, pattern)
+            return
+        firework = self.pool.firework(x, start_y, target_y, self.particle_system,
+                                      self.governor.settings, self.bounds, self.rng,
+                                      self.sparkle_rng, pattern)
         self.fireworks.append(firework)
     
     def start_animation(self):
@@ -441,52 +941,398 @@ class CanvasAnimationApp(tk.Tk):
         if self.animation_id:
             self.after_cancel(self.animation_id)
             self.animation_id = None
+        self.scheduler.stop()
         if self.timer_id:
             self.after_cancel(self.timer_id)
             self.timer_id = None
     
     def reset_animation(self):
         """アニメーションリセット"""
+        self.record_event(recording.EVENT_RESET)
         self.stop_animation()
+        for firework in self.fireworks:
+            self.pool.release(firework)
         self.fireworks.clear()
-        self.canvas.delete('firework')
+        if self.particle_system is not None:
+            self.particle_system.clear()
+        if self.worker is not None:
+            self.worker.clear()
+        if self.show is not None:
+            self.show.rewind()
+        self.renderer.clear()
         self.frame_count = 0
-        self.next_firework_frame = random.randint(60, 120)  # リセット時も次の発射タイミングを設定
+        self.next_firework_frame = self.rng.randint(60, 120)  # リセット時も次の発射タイミングを設定
         self.timer_seconds = 0
         self.remaining_seconds = 0
         self.start_time = None
         self.end_time = None
+        self.timer_deadline = None
         self.timer_var.set("")
         self.break_var.set("")
     
-    def animate(self):
-        """メインアニメーションループ"""
+    @property
+    def quality_level(self):
+        """現在の品質の段階（0が最高品質）"""
+        return self.governor.level
+    
+    def apply_quality(self):
+        """現在の品質設定をパーティクルエンジンに反映（以降の打ち上げにも使われる）"""
+        if self.particle_system is not None:
+            self.particle_system.set_level(self.governor.settings)
+        if self.worker is not None:
+            self.worker.set_level(self.governor.settings)
+    
+    def enforce_particle_budget(self):
+        """パーティクル数が上限を超えたら色あせたものから削除（エンジン使用時はエンジン側で行う）"""
+        if self.particle_budget is None or self.particle_system is not None:
+            return
+        excess = self.live_particle_count() - self.particle_budget
+        if excess <= 0:
+            return
+        fireworks = self.fireworks
+        candidates = ((culling.fade_ratio(p.life, p.max_life), n, i)
+                      for n, firework in enumerate(fireworks)
+                      for i, p in enumerate(firework.particles))
+        chosen = {}
+        for _, n, i in heapq.nsmallest(excess, candidates):
+            chosen.setdefault(n, []).append(i)
+        for n, indices in chosen.items():
+            fireworks[n].discard(sorted(indices, reverse=True))
+    
+    def live_firework_count(self):
+        """打ち上げ中・爆発中の花火の数"""
+        if self.worker is not None:
+            return self.worker.fireworks
+        return len(self.fireworks)
+    
+    def live_particle_count(self):
+        """生存パーティクル数"""
+        if self.particle_system is not None:
+            return self.particle_system.count
+        if self.worker is not None:
+            return self.worker.count
+        if self.show is not None:
+            return self.show.points
+        return sum(len(firework.particles) for firework in self.fireworks)
+    
+    def toggle_metrics_overlay(self, event=None):
+        """計測オーバーレイの表示を切り替え"""
+        self.show_metrics = not self.show_metrics
+        if not self.show_metrics and self.metrics_item is not None:
+            self.canvas.delete(self.metrics_item)
+            self.metrics_item = None
+    
+    def update_metrics_overlay(self):
+        """計測オーバーレイを書き換えて最前面に表示"""
+        text = self.metrics.overlay_text()
+        if self.metrics_item is None:
+            self.metrics_item = self.canvas.create_text(
+                10, 10, text=text, anchor='nw', fill='lime',
+                font=("Courier", 10), tags='metrics')
+        else:
+            self.canvas.itemconfigure(self.metrics_item, text=text)
+        self.canvas.tag_raise(self.metrics_item)
+    
+    def record_event(self, kind, a=0, b=0):
+        """現在のステップ番号でイベントを記録（記録中・同期の送信元のみ）"""
+        if self.recorder is not None:
+            self.recorder.record(self.tick, kind, a, b)
+        if self.sync_server is not None:
+            self.sync_server.send(self.tick, kind, a, b)
+    
+    def replay_events(self):
+        """記録のうち現在のステップまでのイベントを適用"""
+        for kind, a, b in self.replay.due(self.tick):
+            if kind == recording.EVENT_CLICK:
+                self.launch_firework(a, b)
+            elif kind == recording.EVENT_TIMER_START:
+                # 途中から参加した同期の受信側は、送信元がタイマーを開始した時刻に合わせる
+                # （start_break の中でアニメーションが進むので先に遅れを求める）
+                behind = self.follower.lag(self.tick) if self.follower is not None else 0
+                self.start_break(a)
+                if behind:
+                    self.timer_deadline -= behind
+                    self.end_time -= datetime.timedelta(seconds=behind)
+            elif kind == recording.EVENT_TIMER_END:
+                self.finish_break()
+            elif kind == recording.EVENT_RESET:
+                self.reset_animation()
+            elif kind == recording.EVENT_QUALITY:
+                self.governor.level = a
+                self.apply_quality()
+            # 自動打ち上げは同じ乱数から同じ位置で作り直されるので適用しない
+    
+    def poll_replay(self):
+        """停止中も記録のイベントを適用する（タイマー開始で再び動き出す）"""
+        if self.replay.finished:
+            return
         if not self.is_running:
+            self.replay_events()
+        self.after(REPLAY_POLL_MS, self.poll_replay)
+    
+    def poll_sync(self):
+        """同期のイベントを送受信する（停止中も受信側はイベントを適用する）"""
+        if self.sync_server is not None:
+            self.sync_server.flush(self.tick)
+        if self.follower is not None and not self.is_running:
+            self.follower.receive()
+            self.replay_events()
+        self.after(SYNC_POLL_MS, self.poll_sync)
+    
+    def sync_steps(self, wanted):
+        """同期の受信側: 届いたイベントを適用し、今フレームで進めるステップ数を返す
+
+        送信元が進んだステップより先には進めない。
+        """
+        self.follower.receive()
+        # 現在のステップのイベント（タイマー終了など）はステップを待たずに適用
+        self.replay_events()
+        return self.follower.steps(self.tick, wanted)
+    
+    def step(self):
+        """物理演算を1ステップ進める"""
+        if self.replay is not None:
+            self.replay_events()
+            if not self.is_running:
+                return
+        
+        # 事前に描画したショーは再生位置を進めるだけ
+        if self.show is not None:
+            self.show.step()
+            self.frame_count += 1
+            self.tick += 1
             return
-            
-        # キャンバスをクリア
-        self.canvas.delete('firework')
         
         # 自動で花火を発射（決められたタイミングで）
         if self.frame_count >= self.next_firework_frame:
             self.launch_firework()
-            # 次の発射タイミングを設定
-            self.next_firework_frame = self.frame_count + random.randint(60, 120)
+            # 次の発射タイミングを設定（品質を下げている間は間隔を空ける）
+            self.next_firework_frame = (self.frame_count +
+                                        self.rng.randint(*self.governor.settings.launch_interval))
         
-        # 花火を更新・描画
-        for firework in self.fireworks[:]:
-            firework.update()
-            firework.draw(self.canvas)
-            
-            # 終了した花火を削除
-            if firework.is_finished():
-                self.fireworks.remove(firework)
+        # 物理演算は別プロセスに任せる（ステップ数だけ送る）
+        if self.worker is not None:
+            self.worker.step()
+            self.frame_count += 1
+            self.tick += 1
+            return
+        
+        # パーティクルを一括更新（エンジン使用時）
+        if self.particle_system is not None:
+            self.particle_system.update()
         
+        # 花火を更新（終了した花火は一覧から外してプールに戻す）
+        self.pool.step(self.fireworks)
+        
+        self.enforce_particle_budget()
         self.frame_count += 1
+        self.tick += 1
+    
+    def render(self, alpha=0.0):
+        """現在の状態を描画（alphaは次のステップへの進み具合）"""
+        # フレームの描画開始（アイテムは削除せず使い回す）
+        self.renderer.begin_frame()
+        
+        for firework in self.fireworks:
+            firework.draw(self.renderer, alpha)
+        
+        if self.particle_system is not None:
+            self.particle_system.draw(self.renderer, alpha)
+        
+        # 別プロセスが公開した最新のフレームを描く
+        if self.worker is not None:
+            self.worker.draw(self.renderer)
+        if self.show is not None:
+            self.show.draw(self.renderer)
+        
+        # 使わなかったアイテムを隠す
+        self.renderer.end_frame()
+    
+    def animate(self):
+        """メインアニメーションループ"""
+        if not self.is_running:
+            return
+        
+        # afterの遅れ（予定時刻から実際に呼ばれるまで）
+        start = time.perf_counter()
+        frames = self.scheduler
+        lag = max(0.0, frames.clock() - frames.next_frame) if frames.running else 0.0
+        
+        # 経過時間に応じた回数だけ物理演算を進める（遅れていればまとめて追いつく）
+        steps = frames.begin_frame()
+        if self.follower is not None:
+            steps = self.sync_steps(steps) if self.is_running else 0
+        for _ in range(steps):
+            self.step()
+        if not self.is_running:
+            return  # 再生中にタイマー終了のイベントで止まった
+        
+        updated = time.perf_counter()
+        self.render(frames.alpha if self.interpolate else 0.0)
+        drawn = time.perf_counter()
         
-        # 次のフレームをスケジュール
-        self.animation_id = self.after(50, self.animate)  # 約20FPS
+        # 処理時間に応じて品質を調整
+        if self.governor.observe(drawn - start):
+            self.apply_quality()
+            self.record_event(recording.EVENT_QUALITY, self.governor.level)
+        if self.sync_server is not None:
+            self.sync_server.flush(self.tick)
+        
+        self.metrics.record(start, updated - start, drawn - updated, lag,
+                            self.live_firework_count(), self.live_particle_count(),
+                            self.renderer.item_count, self.governor.level)
+        if self.show_metrics and self.metrics.total_frames % METRICS_OVERLAY_INTERVAL == 1:
+            self.update_metrics_overlay()
+        if self.metrics_log is not None:
+            self.metrics_log.maybe_write(self.metrics)
+        
+        # 次のフレームを予定時刻に合わせてスケジュール
+        self.animation_id = self.after(frames.end_frame(), self.animate)
+    
+    def destroy(self):
+        """ウィンドウを閉じる（物理演算プロセスの終了と記録の書き出しも行う）"""
+        if self.recorder is not None:
+            self.recorder.close(self.tick)
+        if self.worker is not None:
+            self.worker.close()
+        if self.show is not None:
+            self.show.close()
+        if self.sync_server is not None:
+            self.sync_server.close()
+        if self.follower is not None:
+            self.follower.close()
+        super().destroy()
+
+def parse_size(text):
+    """「幅x高さ」の文字列を (幅, 高さ) に変換（argparse の type として使う）"""
+    from argparse import ArgumentTypeError  # 起動時には読み込まない
+    try:
+        width, height = (int(value) for value in text.lower().split('x'))
+    except ValueError:
+        raise ArgumentTypeError(f"大きさは 幅x高さ で指定してください: {text}") from None
+    if width <= 0 or height <= 0:
+        raise ArgumentTypeError(f"大きさは正の数で指定してください: {text}")
+    return width, height
+
+def parse_seed(text):
+    """乱数の種の文字列を整数に変換（0 以上 SEED_LIMIT 未満、argparse の type として使う）"""
+    from argparse import ArgumentTypeError  # 起動時には読み込まない
+    try:
+        seed = int(text)
+    except ValueError:
+        raise ArgumentTypeError(f"乱数の種は整数で指定してください: {text}") from None
+    if not 0 <= seed < SEED_LIMIT:
+        raise ArgumentTypeError(f"乱数の種は 0 以上 2**64 未満で指定してください: {text}")
+    return seed
+
+def pattern_weights_from(args):
+    """--pattern / --pattern-mix の指定から爆発パターンの重みを作る（指定なしは None）"""
+    if args.patterns:
+        return dict(args.patterns)
+    return patterns.mix_weights() if args.pattern_mix else None
+
+def main(argv=None):
+    """コマンドラインから起動"""
+    import argparse
+    parser = argparse.ArgumentParser(description="Fireworks Timer Application")
+    parser.add_argument('--engine', choices=ENGINES, default=ENGINE_OBJECTS,
+                        help="パーティクルエンジン（vectorized/templateはNumPyが必要）")
+    parser.add_argument('--renderer', choices=RENDERERS, default=RENDERER_ITEMS,
+                        help="描画バックエンド（rasterはNumPyが必要）")
+    parser.add_argument('--metrics-overlay', action='store_true',
+                        help="フレーム計測を画面に表示（F3で切り替え）")
+    parser.add_argument('--metrics-log', metavar='PATH',
+                        help="フレーム計測を1秒ごとにJSON Linesで追記するファイル")
+    parser.add_argument('--fps', type=int, choices=scheduler.FPS_CHOICES, default=20,
+                        help="描画の目標FPS（物理演算は常に20Hzの固定ステップ）")
+    parser.add_argument('--interpolate', action='store_true',
+                        help="物理ステップの間の描画位置を補間する")
+    parser.add_argument('--quality', default=quality.QUALITY_AUTO,
+                        choices=[quality.QUALITY_AUTO] +
+                        [str(i) for i in range(len(quality.QUALITY_LEVELS))],
+                        help="描画品質（autoはフレーム時間に応じて自動調整、0が最高品質）")
+    parser.add_argument('--particle-budget', type=int, default=culling.DEFAULT_PARTICLE_BUDGET,
+                        help="同時に存在できるパーティクル数の上限（0で無制限）")
+    parser.add_argument('--seed', type=parse_seed,
+                        help="乱数の種（同じ種と操作なら同じ花火になる）")
+    parser.add_argument('--record', metavar='PATH',
+                        help="打ち上げ・クリック・タイマー操作を記録するファイル")
+    parser.add_argument('--replay', metavar='PATH',
+                        help="記録したファイルを再生する（乱数の種・FPS・品質は記録に合わせる）")
+    parser.add_argument('--playback', metavar='PATH',
+                        help="prerender で事前に描画したショーを再生する（物理演算を行わない）")
+    parser.add_argument('--no-batch', dest='batch', action='store_false', default=None,
+                        help="キャンバスの操作を Tcl のスクリプトにまとめず1つずつ送る")
+    parser.add_argument('--pattern', action='append', type=patterns.parse_weight, default=[],
+                        metavar='NAME[=WEIGHT]', dest='patterns',
+                        help="打ち上げる爆発パターンと重み（複数指定可、既定は "
+                             f"{patterns.DEFAULT_PATTERN} のみ: {', '.join(patterns.PATTERNS)}）")
+    parser.add_argument('--pattern-mix', action='store_true',
+                        help="登録されている全パターンを既定の重みで混ぜて打ち上げる")
+    parser.add_argument('--fullscreen', action='store_true',
+                        help="全画面で表示する（花火を画面の大きさに合わせて拡大、Escで解除）")
+    parser.add_argument('--mirror', action='append', type=parse_size, default=[],
+                        metavar='WxH',
+                        help="同じ花火を指定した大きさの別ウィンドウにも表示する（複数指定可）")
+    parser.add_argument('--sync-serve', type=int, nargs='?', const=47800, metavar='PORT',
+                        help="同期の送信元になり、ローカルのポートで受信側を待つ（既定: 47800）")
+    parser.add_argument('--sync-follow', metavar='[HOST:]PORT',
+                        help="同期の受信側として送信元と同じ花火を表示する")
+    parser.add_argument('--trace-startup', action='store_true',
+                        help="読み込み・ウィジェット作成・最初のフレームまでの時間を表示する")
+    args = parser.parse_args(argv)
+    trace = None
+    if args.trace_startup:
+        trace = startup.StartupTrace(start=_import_started)
+        trace.times['import'] = _import_finished - _import_started
+    app = CanvasAnimationApp(engine=args.engine, renderer=args.renderer,
+                             metrics_overlay=args.metrics_overlay,
+                             metrics_log=args.metrics_log,
+                             fps=args.fps, interpolate=args.interpolate,
+                             quality_level=args.quality,
+                             particle_budget=args.particle_budget or None,
+                             seed=args.seed, record=args.record, replay=args.replay,
+                             playback=args.playback, batch=args.batch, trace=trace,
+                             mirrors=args.mirror, fullscreen=args.fullscreen,
+                             pattern_weights=pattern_weights_from(args),
+                             sync_serve=args.sync_serve,
+                             sync_follow=(_import_module('sync').parse_address(args.sync_follow)
+                                          if args.sync_follow else None))
+    app.mainloop()
+
+def prerender_main(argv=None):
+    """花火のショーを事前に描画してファイルに保存（コマンドラインから起動）"""
+    import argparse
+    parser = argparse.ArgumentParser(
+        prog="fireworks.py prerender",
+        description="花火のショーを事前に描画し、--playback で再生できるファイルに保存")
+    parser.add_argument('output', help="保存先のファイル")
+    parser.add_argument('--seconds', type=int, required=True,
+                        help="ショーの長さ（秒）。休憩時間に合わせる（短い場合は繰り返し再生）")
+    parser.add_argument('--seed', type=parse_seed, help="乱数の種")
+    parser.add_argument('--engine', choices=(ENGINE_OBJECTS, ENGINE_VECTORIZED, ENGINE_TEMPLATE),
+                        default=ENGINE_OBJECTS, help="シミュレーションに使うパーティクルエンジン")
+    parser.add_argument('--quality', type=int, choices=range(len(quality.QUALITY_LEVELS)),
+                        default=0, help="描画品質（0が最高品質）")
+    parser.add_argument('--particle-budget', type=int, default=culling.DEFAULT_PARTICLE_BUDGET,
+                        help="同時に存在できるパーティクル数の上限（0で無制限、エンジン使用時のみ）")
+    parser.add_argument('--pattern', action='append', type=patterns.parse_weight, default=[],
+                        metavar='NAME[=WEIGHT]', dest='patterns',
+                        help="打ち上げる爆発パターンと重み（複数指定可、既定は "
+                             f"{patterns.DEFAULT_PATTERN} のみ）")
+    parser.add_argument('--pattern-mix', action='store_true',
+                        help="登録されている全パターンを既定の重みで混ぜて打ち上げる")
+    args = parser.parse_args(argv)
+    frames = _import_module('showcache').render_show(
+        args.output, args.seconds, seed=args.seed, engine=args.engine,
+        quality_level=args.quality, width=CANVAS_WIDTH, height=CANVAS_HEIGHT,
+        particle_budget=args.particle_budget or None,
+        pattern_weights=pattern_weights_from(args))
+    print(f"{frames}フレーム（{args.seconds}秒）を {args.output} に保存しました")
+    return 0
 
 if __name__ == "__main__":
-    app = CanvasAnimationApp()
-    app.mainloop()
\ No newline at end of file
+    # 「prerender」で始まる場合はショーの事前描画
+    if sys.argv[1:2] == ['prerender']:
+        sys.exit(prerender_main(sys.argv[2:]))
+    main()
\ No newline at end of file
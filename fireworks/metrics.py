@@ -0,0 +1,95 @@
+"""フレーム時間と負荷の計測
+
+1フレームごとに更新時間・描画時間・after の遅れ（予定時刻から実際に
+呼ばれるまでの時間）と、花火・パーティクル・キャンバスアイテムの数を記録する。
+直近の集計はキャンバス上のオーバーレイ表示と JSON Lines ファイルに出力できる。
+"""
+import time
+from collections import deque
+
+
+class FrameMetrics:
+    """直近のフレームの計測値を保持して集計する"""
+
+    def __init__(self, window=100):
+        self.frames = deque(maxlen=window)  # (開始時刻, 更新秒, 描画秒, 遅れ秒)
+        self.fireworks = 0
+        self.particles = 0
+        self.items = 0
+        self.quality = 0
+        self.total_frames = 0
+
+    def record(self, start, update_s, draw_s, lag_s, fireworks, particles, items, quality=0):
+        """1フレーム分の計測値を記録"""
+        self.frames.append((start, update_s, draw_s, lag_s))
+        self.fireworks = fireworks
+        self.particles = particles
+        self.items = items
+        self.quality = quality
+        self.total_frames += 1
+
+    def clear(self):
+        """計測値を破棄"""
+        self.frames.clear()
+
+    def summary(self):
+        """直近のフレームの集計（時間はミリ秒）"""
+        n = len(self.frames)
+        result = {
+            'frames': self.total_frames,
+            'fps': 0.0,
+            'update_ms': 0.0,
+            'update_max_ms': 0.0,
+            'draw_ms': 0.0,
+            'draw_max_ms': 0.0,
+            'lag_ms': 0.0,
+            'lag_max_ms': 0.0,
+            'fireworks': self.fireworks,
+            'particles': self.particles,
+            'items': self.items,
+            'quality': self.quality,
+        }
+        if n == 0:
+            return result
+        starts, updates, draws, lags = zip(*self.frames)
+        if n > 1 and starts[-1] > starts[0]:
+            result['fps'] = round((n - 1) / (starts[-1] - starts[0]), 1)
+        for name, values in (('update', updates), ('draw', draws), ('lag', lags)):
+            result[f'{name}_ms'] = round(sum(values) / n * 1000, 2)
+            result[f'{name}_max_ms'] = round(max(values) * 1000, 2)
+        return result
+
+    def overlay_text(self):
+        """オーバーレイに表示する文字列"""
+        s = self.summary()
+        return (f"FPS {s['fps']:.1f}\n"
+                f"update {s['update_ms']:.1f} ms (max {s['update_max_ms']:.1f})\n"
+                f"draw {s['draw_ms']:.1f} ms (max {s['draw_max_ms']:.1f})\n"
+                f"lag {s['lag_ms']:.1f} ms (max {s['lag_max_ms']:.1f})\n"
+                f"fireworks {s['fireworks']}  particles {s['particles']}  items {s['items']}\n"
+                f"quality {s['quality']}")
+
+
+class MetricsLog:
+    """集計を一定間隔で JSON Lines ファイルに追記する"""
+
+    def __init__(self, path, interval=1.0, clock=time.monotonic):
+        self.path = path
+        self.interval = interval
+        self.clock = clock
+        self._next = None
+
+    def maybe_write(self, metrics):
+        """前回の書き込みから interval 秒以上経っていれば追記する"""
+        now = self.clock()
+        if self._next is None:
+            self._next = now + self.interval
+            return False
+        if now < self._next:
+            return False
+        self._next = now + self.interval
+        import json  # 記録するときだけ必要（起動時には読み込まない）
+        record = dict(metrics.summary(), time=time.time())
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(record) + '\n')
+        return True
@@ -0,0 +1,134 @@
+"""1つのシミュレーションを複数のウィンドウに映す
+
+発表者用のモニターとプロジェクターのように、同じ花火を別の大きさの
+ウィンドウにも表示する。物理演算と Firework.draw などの描画の呼び出しは
+メインのウィンドウで1回だけ行い、FrameFanout が受け取った円を記録して、
+各 MirrorWindow の ScaledOutput がそれを自分の大きさに拡大・縮小して描く。
+ウィンドウを増やしても増えるのはキャンバスへの描画だけになる。
+"""
+import tkinter as tk
+
+if __package__:
+    from .viewport import Layout, Viewport
+else:
+    from viewport import Layout, Viewport
+
+
+class FrameFanout:
+    """描画器の代わりに受け取った円を、元の描画器とミラーの両方に渡す
+
+    元の描画器が draw_points を持つ場合（ラスタ描画）は配列のまま受け取る。
+    """
+
+    def __init__(self, primary, width, height):
+        self.primary = primary
+        self.width = width  # 元の座標系の大きさ
+        self.height = height
+        self.mirrors = []
+        self.shapes = []  # 今フレームの (x0, y0, x1, y1, 色) または (x, y, 半径, RGB) の配列
+        if hasattr(primary, 'draw_points'):
+            self.draw_points = self._draw_points
+
+    @property
+    def item_count(self):
+        """元の描画器のキャンバス上のアイテム数"""
+        return self.primary.item_count
+
+    def add(self, mirror):
+        """ミラー（ScaledOutput）を追加"""
+        mirror.layout(self.width, self.height)
+        self.mirrors.append(mirror)
+
+    def remove(self, mirror):
+        """ミラーを外す"""
+        if mirror in self.mirrors:
+            self.mirrors.remove(mirror)
+
+    def begin_frame(self):
+        self.shapes = []
+        self.primary.begin_frame()
+
+    def create_oval(self, x0, y0, x1, y1, fill='', outline='', tags=None):
+        self.shapes.append((x0, y0, x1, y1, fill))
+        return self.primary.create_oval(x0, y0, x1, y1, fill=fill, outline=outline, tags=tags)
+
+    def _draw_points(self, x, y, radius, colors):
+        self.shapes.append((x, y, radius, colors))
+        self.primary.draw_points(x, y, radius, colors)
+
+    def end_frame(self):
+        self.primary.end_frame()
+        for mirror in self.mirrors:
+            mirror.show(self.shapes)
+
+    def clear(self):
+        self.shapes = []
+        self.primary.clear()
+        for mirror in self.mirrors:
+            mirror.clear()
+
+
+class ScaledOutput:
+    """記録した円を別の大きさのキャンバスの描画器に拡大・縮小して描く
+
+    キャンバスに収まるように縦横比を保って拡大・縮小し、中央に寄せる。
+    """
+
+    def __init__(self, renderer, width, height):
+        self.renderer = renderer
+        self.size = (width, height)  # 描画先のキャンバスの大きさ
+        self.view = Viewport(renderer)
+
+    @property
+    def scale(self):
+        return self.view.scale
+
+    @property
+    def offset(self):
+        return self.view.offset
+
+    def layout(self, width, height):
+        """元の座標系 (width, height) を描画先に合わせる倍率と位置を決める"""
+        self.view = Layout((width, height), self.size).viewport(self.renderer)
+        self.clear()
+
+    def show(self, shapes):
+        """記録した円を拡大・縮小して描画"""
+        view = self.view
+        view.begin_frame()
+        create_oval = view.create_oval
+        for shape in shapes:
+            if len(shape) == 5:
+                x0, y0, x1, y1, fill = shape
+                create_oval(x0, y0, x1, y1, fill=fill, outline='', tags='firework')
+            else:
+                view.draw_points(*shape)
+        view.end_frame()
+
+    def clear(self):
+        """花火を消す"""
+        self.renderer.clear()
+
+
+class MirrorWindow(tk.Toplevel):
+    """メインのウィンドウと同じ花火を表示する別ウィンドウ
+
+    休憩中の表示とタイマーはメインのウィンドウの StringVar をそのまま表示する。
+    renderer_factory(canvas, 幅, 高さ) で描画器を作る。
+    """
+
+    def __init__(self, master, width, height, renderer_factory, title="Fireworks Mirror"):
+        super().__init__(master)
+        self.title(title)
+        self.configure(bg='black')
+        self.resizable(False, False)
+        labels = tk.Frame(self, bg='black')
+        labels.pack(fill=tk.X)
+        for var, color in ((master.break_var, 'red'), (master.timer_var, 'deep sky blue')):
+            tk.Label(labels, textvariable=var, font=("Arial", 16, "bold"),
+                     fg=color, bg='black').pack(side=tk.LEFT, padx=20, pady=5)
+        self.canvas = tk.Canvas(self, width=width, height=height, bg='black',
+                                highlightthickness=0)
+        self.canvas.pack()
+        self.output = ScaledOutput(renderer_factory(self.canvas, width, height), width, height)
+
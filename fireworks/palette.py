@@ -0,0 +1,103 @@
+"""変化菊の色スケジュール
+
+パーティクルの色は (寿命, 年齢) だけで決まるので、年齢ごとの色を
+寿命・初期色ごとに1度だけ計算して表にしておく。色はあらかじめ
+16進表記に変換しておき、Tk が色名を毎回解釈しなくて済むようにする。
+"""
+
+# Tk（X11）の色名と16進表記の対応
+HEX_COLORS = {
+    'gold': '#ffd700',
+    'yellow': '#ffff00',
+    'orange': '#ffa500',
+    'red': '#ff0000',
+    'crimson': '#dc143c',
+    'purple': '#a020f0',
+    'blue': '#0000ff',
+    'white': '#ffffff',
+    'green': '#00ff00',
+    'cyan': '#00ffff',
+    'darkred': '#8b0000',
+    'darkviolet': '#9400d3',
+    'darkblue': '#00008b',
+}
+
+# 軌跡用の暗めの色
+FADE_NAMES = {
+    'gold': 'orange',
+    'yellow': 'gold',
+    'orange': 'red',
+    'red': 'darkred',
+    'purple': 'darkviolet',
+    'blue': 'darkblue',
+}
+
+# 変化菊の第2段階・第3段階の色
+STAGE2_NAMES = ('yellow', 'orange', 'red')
+STAGE3_NAMES = ('red', 'purple', 'blue', 'white')
+
+
+def resolve(color):
+    """色名を16進表記に変換（未知の色名はそのまま返す）"""
+    return HEX_COLORS.get(color, color)
+
+
+# 軌跡の色 -> 暗めの色（色名・16進表記のどちらからでも引ける）
+FADE_COLORS = {}
+for _name, _hex in HEX_COLORS.items():
+    FADE_COLORS[_name] = FADE_COLORS[_hex] = resolve(FADE_NAMES.get(_name, _name))
+
+
+def fade_color(color):
+    """軌跡用の暗めの色（16進表記）"""
+    return FADE_COLORS.get(color, color)
+
+
+def stage_color(initial_color, life, max_life):
+    """残り寿命から現在の色名を求める（3段階で変化）"""
+    life_ratio = 1 - (life / max_life)
+    if life_ratio < 0.3:
+        # 第1段階: 初期色
+        return initial_color
+    if life_ratio < 0.6:
+        # 第2段階: 黄色 → オレンジ → 赤
+        return STAGE2_NAMES[int((life_ratio - 0.3) * 10) % len(STAGE2_NAMES)]
+    # 第3段階: 赤 → 紫 → 青 → 白（フェードアウト）
+    return STAGE3_NAMES[int((life_ratio - 0.6) * 10) % len(STAGE3_NAMES)]
+
+
+_name_schedules = {}
+_hex_schedules = {}
+
+
+def name_schedule(initial_color, lifetime):
+    """年齢（0〜lifetime）ごとの色名の表"""
+    key = (initial_color, lifetime)
+    schedule = _name_schedules.get(key)
+    if schedule is None:
+        schedule = tuple(stage_color(initial_color, lifetime - age, lifetime)
+                         for age in range(lifetime + 1))
+        _name_schedules[key] = schedule
+    return schedule
+
+
+def color_schedule(initial_color, lifetime):
+    """年齢（0〜lifetime）ごとの色（16進表記）の表"""
+    key = (initial_color, lifetime)
+    schedule = _hex_schedules.get(key)
+    if schedule is None:
+        schedule = tuple(resolve(name) for name in name_schedule(initial_color, lifetime))
+        _hex_schedules[key] = schedule
+    return schedule
+
+
+_rgb_cache = {}
+
+
+def rgb(color):
+    """色（色名または16進表記）を (R, G, B) に変換"""
+    value = _rgb_cache.get(color)
+    if value is None:
+        code = resolve(color).lstrip('#')
+        value = _rgb_cache[color] = (int(code[0:2], 16), int(code[2:4], 16), int(code[4:6], 16))
+    return value
@@ -0,0 +1,350 @@
+"""構造体配列（SoA）形式のパーティクルエンジン
+
+全ての花火のパーティクルを NumPy の連続した配列で保持し、
+1フレーム分の更新を1回のバッチ処理で行う。
+物理挙動（重力・空気抵抗・寿命・色変化）は Particle.update と同一。
+"""
+import numpy as np
+
+if __package__:
+    from . import culling, palette
+    from .patterns import DEFAULT_PATTERN, compile_pattern
+    from .trails import TrailBuffer
+else:
+    import culling
+    import palette
+    from patterns import DEFAULT_PATTERN, compile_pattern
+    from trails import TrailBuffer
+
+GRAVITY = 0.08  # 重力
+DRAG = 0.985  # 空気抵抗
+MAX_TRAIL_LENGTH = 8  # 軌跡の最大長さ
+
+# 色はインデックスで管理し、描画時は16進表記の表を引く
+COLORS = ['gold', 'orange', 'red', 'crimson', 'purple', 'yellow', 'blue', 'white',
+          'green', 'cyan']
+_INDEX = {name: i for i, name in enumerate(COLORS)}
+FILLS = [palette.resolve(name) for name in COLORS]
+FADE_FILLS = [palette.fade_color(name) for name in COLORS]
+WHITE = palette.resolve('white')
+# ラスタ描画用の RGB
+RGB = np.array([palette.rgb(name) for name in FILLS], dtype=np.float32)
+FADE_RGB = np.array([palette.rgb(name) for name in FADE_FILLS], dtype=np.float32)
+WHITE_RGB = np.array(palette.rgb(WHITE), dtype=np.float32)
+
+# (初期色, 寿命, 年齢) -> 現在の色インデックス。使う寿命の行だけを作る
+_color_table = np.zeros((len(COLORS), 1, 1), dtype=np.int8)
+_prepared_lifetimes = set()
+
+
+def prepare_colors(lifetimes):
+    """指定した寿命の色スケジュールを表に追加"""
+    global _color_table
+    missing = [int(l) for l in lifetimes if int(l) not in _prepared_lifetimes]
+    if not missing:
+        return
+    size = max(max(missing) + 1, _color_table.shape[1])
+    if size > _color_table.shape[1]:
+        table = np.zeros((len(COLORS), size, size), dtype=np.int8)
+        old = _color_table.shape[1]
+        table[:, :old, :old] = _color_table
+        _color_table = table
+    for lifetime in missing:
+        for c, name in enumerate(COLORS):
+            schedule = palette.name_schedule(name, lifetime)
+            _color_table[c, lifetime, :lifetime + 1] = [_INDEX[n] for n in schedule]
+        _prepared_lifetimes.add(lifetime)
+
+
+def chrysanthemum_layout(num_particles=32, rings=3):
+    """変化菊パターンの (角度, 速度, 色, 輪) 配列を Firework.explode と同じ順序で返す"""
+    base_colors = ['gold', 'orange', 'red', 'crimson', 'purple']
+    i = np.repeat(np.arange(num_particles), rings)
+    ring = np.tile(np.arange(rings), num_particles)
+    angles = (2 * np.pi * i) / num_particles
+    speeds = 3.0 + ring * 2
+    colors = np.array([_INDEX[base_colors[c]] for c in (ring + i // 4) % len(base_colors)],
+                      dtype=np.int8)
+    return angles, speeds, colors, ring
+
+
+def pattern_arrays(compiled):
+    """コンパイル済みのパターンの (vx, vy, 色, 輪, 寿命) 配列（パターンごとに1度だけ変換）
+
+    並びは Particle オブジェクトの花火と同じく寿命の長い順。
+    """
+    arrays = compiled.arrays
+    if arrays is None:
+        vx, vy, life, colors, ring = zip(*compiled.by_life)
+        life = np.array(life, dtype=np.int32)
+        prepare_colors(np.unique(life))
+        arrays = compiled.arrays = (np.array(vx), np.array(vy),
+                                    np.array([_INDEX[c] for c in colors], dtype=np.int8),
+                                    np.array(ring, dtype=np.int8), life)
+    return arrays
+
+
+class ParticleSystem:
+    """全花火のパーティクルを一括で更新・描画するエンジン
+
+    bounds（画面の幅, 高さ）を指定すると画面外のパーティクルを描かず、
+    二度と画面に戻らないものは寿命前に削除する。budget を指定すると
+    生存数がそれを超えないよう、爆発時に色あせたものから削除する。
+    """
+
+    def __init__(self, capacity=4096, max_trail_length=MAX_TRAIL_LENGTH, bounds=None,
+                 budget=None, seed=None):
+        self.bounds = bounds
+        self.budget = budget
+        self.capacity = 0
+        self.count = 0  # 生存パーティクル数（配列の先頭 count 個が有効）
+        self.max_trail_length = max_trail_length
+        self.trail_length = max_trail_length  # 描画する軌跡の長さ（品質で短くする）
+        self.sparkle_rate = 0.1  # きらめく確率
+        self.rng = np.random.default_rng(seed)  # きらめきの乱数（種を指定すると再現できる）
+        self.rings = 3  # 以降の爆発の輪の数
+        self._next_owner = 0
+        self._owner_counts = {}
+        self._allocate(capacity)
+
+    def _allocate(self, capacity):
+        """配列を確保（既存の生存パーティクルは引き継ぐ）"""
+        n = self.count
+        old = getattr(self, 'x', None)
+        fields = {
+            'x': np.float64, 'y': np.float64, 'vx': np.float64, 'vy': np.float64,
+            'life': np.int32, 'max_life': np.int32,
+            'ring': np.int8, 'color': np.int8, 'current': np.int8,
+            'owner': np.int32,
+        }
+        for name, dtype in fields.items():
+            arr = np.zeros(capacity, dtype=dtype)
+            if old is not None:
+                arr[:n] = getattr(self, name)[:n]
+            setattr(self, name, arr)
+        if old is None:
+            self.trail = TrailBuffer(self.max_trail_length, capacity)
+        else:
+            self.trail.resize(capacity, n)
+        self.capacity = capacity
+
+    def emit(self, x, y, angles, speeds, colors, rings):
+        """パーティクルを追加し、所有者ハンドルを返す"""
+        lifetimes = 80 + np.asarray(rings, dtype=np.int32) * 10  # 輪によって寿命を変える
+        prepare_colors(np.unique(lifetimes))
+        return self._spawn(x, y, np.cos(angles) * speeds, np.sin(angles) * speeds, colors,
+                           rings, lifetimes)
+
+    def _spawn(self, x, y, vx, vy, colors, rings, lifetimes):
+        """初速度と寿命を指定してパーティクルを追加し、所有者ハンドルを返す
+
+        寿命は事前に prepare_colors で準備しておくこと。
+        """
+        k = len(vx)
+        if self.budget is not None and self.count + k > self.budget:
+            self._evict(self.count + k - self.budget)
+        if self.count + k > self.capacity:
+            self._allocate(max(self.capacity * 2, self.count + k))
+        s = slice(self.count, self.count + k)
+        self.x[s] = x
+        self.y[s] = y
+        self.vx[s] = vx
+        self.vy[s] = vy
+        self.life[s] = lifetimes
+        self.max_life[s] = lifetimes
+        self.ring[s] = rings
+        self.color[s] = colors
+        self.current[s] = colors
+        self.trail.reset(self.count, self.count + k)
+
+        owner = self._next_owner
+        self._next_owner += 1
+        self.owner[s] = owner
+        self._owner_counts[owner] = k
+        self.count += k
+        return owner
+
+    def set_level(self, level):
+        """品質設定（QualityLevel）を反映（輪の数は以降の爆発から）"""
+        self.trail_length = min(level.trail_length, self.max_trail_length)
+        self.sparkle_rate = level.sparkle_rate
+        self.rings = level.rings
+
+    def burst(self, x, y, pattern=DEFAULT_PATTERN):
+        """コンパイル済みのパターンで爆発させ、所有者ハンドルを返す"""
+        vx, vy, colors, rings, lifetimes = pattern_arrays(compile_pattern(pattern, self.rings))
+        return self._spawn(x, y, vx, vy, colors, rings, lifetimes)
+
+    def alive(self, owner):
+        """指定した所有者の生存パーティクル数"""
+        return self._owner_counts.get(owner, 0)
+
+    def update(self):
+        """全パーティクルを1フレーム進める"""
+        n = self.count
+        if n == 0:
+            return
+
+        # 現在位置を軌跡に追加（リングバッファの1行を上書き）
+        self.trail.push(n, self.x[:n], self.y[:n], self.current[:n])
+
+        self.x[:n] += self.vx[:n]
+        self.y[:n] += self.vy[:n]
+        self.vy[:n] += GRAVITY  # 重力効果
+        self.vx[:n] *= DRAG  # 空気抵抗
+        self.life[:n] -= 1
+
+        # 色の変化（変化菊効果）
+        self.current[:n] = changed_colors(self.life[:n], self.max_life[:n], self.color[:n])
+
+        self._compact()
+
+    def _evict(self, excess):
+        """残り寿命の割合が小さい（色あせた）ものから excess 個を削除"""
+        n = self.count
+        excess = min(excess, n)
+        if excess <= 0:
+            return
+        ratio = culling.fade_ratio(self.life[:n], self.max_life[:n])
+        self.life[np.argpartition(ratio, excess - 1)[:excess]] = 0
+        self._compact()
+
+    def _compact(self):
+        """寿命が尽きたパーティクルと画面に戻らないパーティクルを詰めて削除"""
+        n = self.count
+        keep = self.life[:n] > 0
+        if self.bounds is not None:
+            width, height = self.bounds
+            keep &= ~culling.cannot_return(self.x[:n], self.y[:n], self.vx[:n], self.vy[:n],
+                                           width, height, self.max_trail_length)
+        if keep.all():
+            return
+        m = int(keep.sum())
+        for name in ('x', 'y', 'vx', 'vy', 'life', 'max_life', 'ring', 'color',
+                     'current', 'owner'):
+            arr = getattr(self, name)
+            arr[:m] = arr[:n][keep]
+        self.trail.compact(n, keep)
+        self.count = m
+        owners, counts = np.unique(self.owner[:m], return_counts=True)
+        self._owner_counts = dict(zip(owners.tolist(), counts.tolist()))
+
+    def clear(self):
+        """全パーティクルを削除"""
+        self.count = 0
+        self._owner_counts = {}
+        self.trail.reset(0, self.capacity)
+
+    def draw(self, canvas, alpha=0.0):
+        """全パーティクルを描画（Particle.draw と同じ見た目、alpha は補間の進み具合）"""
+        n = self.count
+        if n == 0:
+            return
+        size = particle_sizes(self.life[:n], self.max_life[:n], self.ring[:n])
+        sparkle = self.rng.random(n) < self.sparkle_rate
+        trail = self.trail
+        x, y = self.x[:n], self.y[:n]
+        if alpha:
+            x = x + self.vx[:n] * alpha
+            y = y + self.vy[:n] * alpha
+        color = self.current[:n]
+        trail_x, trail_y, trail_c = trail.xs[:, :n], trail.ys[:, :n], trail.colors[:, :n]
+        lengths = np.minimum(trail.lengths[:n], self.trail_length)
+        if self.bounds is not None:
+            # 本体も軌跡の最も古い点も画面外のパーティクルは描かない
+            width, height = self.bounds
+            old_x, old_y, has_trail = trail.oldest(n)
+            shown = (culling.on_screen(x, y, width, height) |
+                     has_trail & culling.on_screen(old_x, old_y, width, height))
+            if not shown.all():
+                x, y, size, sparkle, color = x[shown], y[shown], size[shown], sparkle[shown], color[shown]
+                trail_x, trail_y, trail_c = trail_x[:, shown], trail_y[:, shown], trail_c[:, shown]
+                lengths = lengths[shown]
+        draw_particles(canvas, x, y, size, sparkle, color, trail_x, trail_y, trail_c,
+                       lengths, trail.slots(trail.capacity))
+
+
+def changed_colors(life, max_life, initial):
+    """残り寿命から変化菊の現在の色を表引きで求める
+
+    寿命は事前に prepare_colors で準備しておくこと。
+    """
+    age = np.minimum(max_life - life, max_life)
+    return _color_table[initial, max_life, age]
+
+
+def particle_sizes(life, max_life, ring):
+    """寿命と輪からメインのパーティクルの大きさを求める"""
+    size = np.maximum(2, (4 * life / max_life).astype(np.int64))
+    # 輪の構造により少し大きさを調整
+    size = np.where(ring == 0, np.maximum(2, (size * 1.2).astype(np.int64)), size)
+    size = np.where(ring == 2, np.maximum(1, (size * 0.8).astype(np.int64)), size)
+    return size
+
+
+def draw_particles(canvas, x, y, size, sparkle, color, trail_x, trail_y, trail_c,
+                   trail_lengths, order):
+    """配列で渡されたパーティクルと軌跡を描画
+
+    軌跡の配列は (スロット, パーティクル) の形で、order は古い順のスロット位置。
+    履歴が短いパーティクルは order の末尾 trail_lengths 個だけを使う。
+    描画先が draw_points を持つ場合（ラスタ描画）は配列のまま一括で渡す。
+    """
+    draw_points = getattr(canvas, 'draw_points', None)
+    if draw_points is not None:
+        _draw_particles_bulk(draw_points, x, y, size, sparkle, color, trail_x, trail_y,
+                             trail_c, trail_lengths, order)
+        return
+
+    create_oval = canvas.create_oval
+    xs = x.tolist()
+    ys = y.tolist()
+    sizes = (size + sparkle).tolist()  # きらめき効果で少し大きく
+    sparkles = sparkle.tolist()
+    currents = color.tolist()
+    trail_lens = trail_lengths.tolist()
+    trail_x = trail_x.tolist()
+    trail_y = trail_y.tolist()
+    trail_c = trail_c.tolist()
+    capacity = len(order)
+
+    for p in range(len(xs)):
+        # 軌跡を描画（新しい3点は描かない）
+        length = trail_lens[p]
+        offset = capacity - length
+        for i in range(length - 3):
+            trail_size = max(1, int(2 * (i + 1) / length))
+            j = order[offset + i]
+            tx = trail_x[j][p]
+            ty = trail_y[j][p]
+            create_oval(tx-trail_size, ty-trail_size, tx+trail_size, ty+trail_size,
+                        fill=FADE_FILLS[trail_c[j][p]], outline='', tags='firework')
+
+        px, py, s = xs[p], ys[p], sizes[p]
+        if sparkles[p]:
+            create_oval(px-s-1, py-s-1, px+s+1, py+s+1,
+                        fill=WHITE, outline='', tags='firework')
+        create_oval(px-s, py-s, px+s, py+s,
+                    fill=FILLS[currents[p]], outline='', tags='firework')
+
+
+def _draw_particles_bulk(draw_points, x, y, size, sparkle, color, trail_x, trail_y, trail_c,
+                         trail_lengths, order):
+    """draw_particles の配列版（1点ずつのループを行わない）"""
+    capacity = len(order)
+    lengths = np.asarray(trail_lengths, dtype=np.int64)
+    # 軌跡を描画（各パーティクルの i 番目の点は order の capacity - length + i 番目）
+    for row in range(capacity - 3):
+        i = row - (capacity - lengths)
+        use = i >= 0
+        if not use.any():
+            continue
+        j = order[row]
+        trail_size = np.maximum(1, (2 * (i[use] + 1) / lengths[use]).astype(np.int64))
+        draw_points(trail_x[j][use], trail_y[j][use], trail_size, FADE_RGB[trail_c[j][use]])
+
+    size = size + sparkle  # きらめき効果で少し大きく
+    if sparkle.any():
+        draw_points(x[sparkle], y[sparkle], size[sparkle] + 1,
+                    np.broadcast_to(WHITE_RGB, (int(sparkle.sum()), 3)))
+    draw_points(x, y, size, RGB[color])
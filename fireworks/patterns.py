@@ -0,0 +1,150 @@
+"""花火の爆発パターン
+
+パターンは光線の数・輪ごとの速度と寿命・色の並びで宣言的に定義する。
+(パターン, 輪の数) ごとに1度だけ、各パーティクルの初速度・寿命・色・輪の表に
+変換（コンパイル）してキャッシュするので、爆発時は表を爆発位置から始めるだけで
+三角関数も配置の計算も行わない。パーティクルの並びは元の変化菊と同じく
+光線ごとに内側の輪から順になる。寿命の長い順に並べ替えた表（by_life）も
+持ち、Particle オブジェクトの花火は寿命の同じ輪をまとめて末尾から消す。
+"""
+import math
+
+DEFAULT_PATTERN = 'peony'
+
+
+class Pattern:
+    """1種類の爆発パターンの定義
+
+    光線は arms 本の腕に均等に分け、各腕の中では spread（ラジアン）の幅に並べる
+    （arms が None の場合は全周に均等）。色は光線 band 本ごとに、さらに輪ごとに
+    1つずつ colors の中をずらして選ぶ。
+    """
+
+    def __init__(self, name, rays, speeds, lifetimes, colors, band=4, arms=None, spread=0.0,
+                 weight=1):
+        if len(speeds) != len(lifetimes):
+            raise ValueError(f"輪ごとの速度と寿命の数が違います: {name}")
+        self.name = name
+        self.rays = rays  # 光線の数
+        self.speeds = speeds  # 輪ごとの速度（内側から）
+        self.lifetimes = lifetimes  # 輪ごとの寿命（フレーム）
+        self.colors = colors  # 初期色の並び
+        self.band = band  # 同じ色にする光線の数
+        self.arms = arms if arms is not None else rays  # 腕の数
+        self.spread = spread  # 1本の腕の中の光線の広がり
+        self.weight = weight  # 全パターンを混ぜて打ち上げる場合に選ばれる重み
+
+    def angles(self):
+        """光線ごとの角度"""
+        per_arm = self.rays // self.arms
+        angles = []
+        for i in range(self.rays):
+            arm, k = divmod(i, per_arm)
+            offset = self.spread * (k / (per_arm - 1) - 0.5) if per_arm > 1 else 0.0
+            angles.append((2 * math.pi * arm) / self.arms + offset)
+        return angles
+
+
+class CompiledPattern:
+    """コンパイル済みのパターン（パーティクルごとの初速度・寿命・色・輪）
+
+    particles は (vx, vy, 寿命, 色, 輪) の組の一覧。by_life は同じ組を寿命の
+    長い順に並べたもので、cohort_ends は寿命の同じ組のまとまりごとの終端の位置。
+    arrays は NumPy のエンジンが配列に変換した結果を保存する場所
+    （particles.pattern_arrays）。
+    """
+
+    def __init__(self, pattern, rings):
+        self.name = pattern.name
+        rings = min(rings, len(pattern.speeds))
+        particles = []
+        colors = pattern.colors
+        for i, angle in enumerate(pattern.angles()):
+            cos, sin = math.cos(angle), math.sin(angle)
+            for ring in range(rings):
+                speed = pattern.speeds[ring]
+                color = colors[(ring + i // pattern.band) % len(colors)]
+                particles.append((cos * speed, sin * speed, pattern.lifetimes[ring], color, ring))
+        self.particles = tuple(particles)
+        self.by_life = tuple(sorted(particles, key=lambda p: -p[2]))
+        lives = [p[2] for p in self.by_life]
+        self.cohort_ends = tuple(end for end in range(1, len(lives) + 1)
+                                 if end == len(lives) or lives[end] != lives[end - 1])
+        self.rings = rings
+        self.arrays = None
+
+    def __len__(self):
+        return len(self.particles)
+
+
+PATTERNS = {}  # 名前 -> Pattern
+_compiled = {}  # (名前, 輪の数) -> CompiledPattern
+
+
+def register(pattern):
+    """パターンを追加（同じ名前のパターンは置き換える）"""
+    PATTERNS[pattern.name] = pattern
+    for key in [key for key in _compiled if key[0] == pattern.name]:
+        del _compiled[key]
+    return pattern
+
+
+def compile_pattern(name, rings=3):
+    """コンパイル済みのパターンを返す（初回のみ計算）"""
+    key = (name, rings)
+    compiled = _compiled.get(key)
+    if compiled is None:
+        pattern = PATTERNS.get(name)
+        if pattern is None:
+            raise ValueError(f"不明な爆発パターンです: {name}")
+        compiled = _compiled[key] = CompiledPattern(pattern, rings)
+    return compiled
+
+
+def default_weights():
+    """既定の重み（元々の変化菊だけを打ち上げる）"""
+    return {DEFAULT_PATTERN: 1}
+
+
+def mix_weights():
+    """登録されている全パターンの重み（全パターンを混ぜて打ち上げる場合）"""
+    return {name: pattern.weight for name, pattern in PATTERNS.items()}
+
+
+def choose(rng, weights):
+    """重みに従ってパターン名を選ぶ（1種類だけの場合は乱数を使わない）"""
+    names = list(weights)
+    if len(names) == 1:
+        return names[0]
+    return rng.choices(names, [weights[name] for name in names])[0]
+
+
+def parse_weight(text):
+    """「名前」または「名前=重み」を (名前, 重み) に変換（argparse の type として使う）"""
+    from argparse import ArgumentTypeError  # 起動時には読み込まない
+    name, _, weight = text.partition('=')
+    if name not in PATTERNS:
+        raise ArgumentTypeError(f"不明な爆発パターンです: {name}（{', '.join(PATTERNS)}）")
+    try:
+        weight = float(weight) if weight else 1.0
+    except ValueError:
+        raise ArgumentTypeError(f"重みは数値で指定してください: {text}") from None
+    if weight <= 0:
+        raise ArgumentTypeError(f"重みは正の数で指定してください: {text}")
+    return name, weight
+
+
+# 変化菊（元々の唯一のパターン）: 32本の光線に速度の違う3つの輪
+register(Pattern('peony', 32, (3, 5, 7), (80, 90, 100),
+                 ('gold', 'orange', 'red', 'crimson', 'purple'), weight=4))
+# 柳: 遅く長く光り、重力で垂れ下がる
+register(Pattern('willow', 30, (2, 2.8, 3.6), (110, 120, 130),
+                 ('gold', 'gold', 'orange'), band=10, weight=2))
+# 輪: 1つの輪だけが大きく広がる
+register(Pattern('ring', 48, (5,), (90,), ('cyan', 'blue', 'white'), band=16))
+# ヤシ: 少ない太い腕が伸びる
+register(Pattern('palm', 24, (4, 5.5, 7), (70, 80, 90), ('gold', 'yellow', 'orange'),
+                 band=3, arms=8, spread=0.12, weight=2))
+# 十字: 4本の腕がそれぞれ扇形に開く
+register(Pattern('crossette', 16, (4, 6), (70, 85), ('green', 'yellow', 'white'),
+                 arms=4, spread=0.6))
@@ -0,0 +1,75 @@
+"""フレーム時間に応じて描画品質を自動調整する
+
+直近のフレームの処理時間がフレーム周期（予算）を超えそうなら品質を1段階下げ、
+十分な余裕が続いたら1段階戻す。下げる判定と戻す判定のしきい値・必要な
+フレーム数を変えて、品質が行ったり来たりしないようにする（ヒステリシス）。
+"""
+from collections import deque
+
+
+class QualityLevel:
+    """1段階分の品質設定"""
+
+    def __init__(self, trail_length, rings, sparkle_rate, launch_interval):
+        self.trail_length = trail_length  # パーティクルの軌跡の長さ
+        self.rings = rings  # 1発あたりの輪の数
+        self.sparkle_rate = sparkle_rate  # きらめく確率
+        self.launch_interval = launch_interval  # 自動打ち上げの間隔（フレーム、最小と最大）
+
+
+# 0 が最高品質（元々の見た目）。数字が大きいほど軽い
+QUALITY_LEVELS = (
+    QualityLevel(8, 3, 0.1, (60, 120)),
+    QualityLevel(6, 3, 0.05, (80, 140)),
+    QualityLevel(5, 2, 0.02, (100, 170)),
+    QualityLevel(3, 1, 0.0, (120, 200)),
+)
+QUALITY_AUTO = 'auto'
+
+
+class QualityGovernor:
+    """フレームの処理時間を見て品質の段階を上げ下げする
+
+    fixed に段階を指定した場合は自動調整せずにその段階のままにする。
+    """
+
+    def __init__(self, budget, levels=QUALITY_LEVELS, fixed=None, window=20,
+                 high=0.8, low=0.4, recover_frames=100):
+        self.budget = budget  # 1フレームの予算（秒）
+        self.levels = levels
+        self.window = window
+        self.high = high  # 平均がこの割合を超えたら品質を下げる
+        self.low = low  # この割合を下回るフレームが続いたら品質を上げる
+        self.recover_frames = recover_frames  # 品質を上げるのに必要な連続フレーム数
+        self.adaptive = fixed is None
+        self.level = 0 if fixed is None else fixed
+        if not 0 <= self.level < len(levels):
+            raise ValueError(f"品質の段階は0〜{len(levels) - 1}で指定してください: {fixed}")
+        self.samples = deque(maxlen=window)
+        self.calm = 0  # 余裕のあるフレームが続いた数
+
+    @property
+    def settings(self):
+        """現在の段階の品質設定"""
+        return self.levels[self.level]
+
+    def observe(self, seconds):
+        """1フレームの処理時間を記録し、段階が変わったら True を返す"""
+        if not self.adaptive:
+            return False
+        self.samples.append(seconds)
+        self.calm = self.calm + 1 if seconds < self.budget * self.low else 0
+
+        if (len(self.samples) == self.window and self.level < len(self.levels) - 1
+                and sum(self.samples) / self.window > self.budget * self.high):
+            return self._change(self.level + 1)
+        if self.calm >= self.recover_frames and self.level > 0:
+            return self._change(self.level - 1)
+        return False
+
+    def _change(self, level):
+        """段階を変えて計測をやり直す（変更直後の判定を避ける）"""
+        self.level = level
+        self.samples.clear()
+        self.calm = 0
+        return True
@@ -0,0 +1,226 @@
+"""ラスタ描画バックエンド
+
+全ての花火を NumPy の RGB フレームバッファに加算合成で描き込み、
+1フレームにつき1枚の PhotoImage としてキャンバスに転送する。
+キャンバスアイテムは画像1つだけなので、パーティクル数が増えても
+Tk の負荷はほとんど変わらない。
+画面は TILE_SIZE 四方のタイルに分けて、今フレームか前フレームに点が
+描かれたタイル（変化した領域）だけを画像に転送する。
+zoom を指定すると width x height の低い解像度で描き、表示用の画像には
+変化した領域を zoom 倍に拡大してコピーする（4K などの大画面用）。
+"""
+import tkinter as tk
+
+import numpy as np
+
+if __package__:
+    from . import palette
+else:
+    import palette
+
+
+MAX_RADIUS = 16  # これより大きい点は半径を切り詰める
+TILE_SIZE = 32  # 変化した領域を管理するタイルの大きさ（ピクセル）
+FULL_UPLOAD_RATIO = 0.5  # 変化した面積が画面のこの割合以上なら画像全体を1度に転送する
+
+
+def dirty_rects(tiles, tile_size, width, height):
+    """変化したタイルの真偽値配列 (行, 列) を転送用の矩形 (x0, y0, x1, y1) の一覧にまとめる
+
+    各行で連続するタイルを1つにまとめ、さらに同じ列範囲が縦に続く場合はつなげる。
+    """
+    rects = []
+    open_rects = {}  # (開始列, 終了列) -> 開始行
+    for row in range(tiles.shape[0] + 1):
+        runs = set()
+        if row < tiles.shape[0]:
+            columns = np.flatnonzero(tiles[row]).tolist()
+            start = None
+            for i, c in enumerate(columns):
+                if start is None:
+                    start = c
+                if i + 1 == len(columns) or columns[i + 1] != c + 1:
+                    runs.add((start, c + 1))
+                    start = None
+        for run in list(open_rects):
+            if run not in runs:
+                top = open_rects.pop(run)
+                rects.append((run[0] * tile_size, top * tile_size,
+                              min(run[1] * tile_size, width), min(row * tile_size, height)))
+        for run in runs:
+            open_rects.setdefault(run, row)
+    return rects
+
+
+def soft_dot(radius):
+    """半径 radius の柔らかい円の (dx, dy, 重み) を返す（縁は半ピクセルずつぼかす）"""
+    half = int(np.ceil(radius + 0.5))
+    dy, dx = np.mgrid[-half:half + 1, -half:half + 1]
+    distance = np.hypot(dx, dy)
+    weight = np.clip(radius + 0.5 - distance, 0.0, 1.0)
+    inside = weight > 0.1  # ほとんど見えない縁の画素は省く
+    return dx[inside], dy[inside], weight[inside].astype(np.float32)
+
+
+class RasterRenderer:
+    """フレームバッファに描いて PhotoImage 1枚で表示する描画器
+
+    CanvasItemPool と同じ begin_frame / create_oval / end_frame / clear を持ち、
+    さらに配列で一括描画する draw_points を持つ。
+    width, height は描画の解像度で、キャンバスには zoom 倍に拡大した
+    display（zoom が1の場合は photo そのもの）を表示する。
+    """
+
+    def __init__(self, canvas, width, height, tag='firework', photo=None, zoom=1,
+                 display=None):
+        self.canvas = canvas
+        self.width = width
+        self.height = height
+        self.tag = tag
+        self.zoom = zoom
+        self.photo = photo if photo is not None else tk.PhotoImage(
+            master=canvas, width=width, height=height)
+        if zoom == 1:
+            self.display = self.photo
+        else:
+            self.display = display if display is not None else tk.PhotoImage(
+                master=canvas, width=width * zoom, height=height * zoom)
+        self.item = None
+        self.pixels = np.zeros((height, width, 3), dtype=np.uint8)
+        # 縁に余白を持たせた描き込み用の座標系（はみ出し判定を点の中心だけで済ませる）
+        self._margin = MAX_RADIUS + 1  # 画面外でも縁にかかりうる点の範囲
+        self._pad = 2 * self._margin
+        self._stride = width + 2 * self._pad
+        self._header = f'P6 {width} {height} 255 '.encode('ascii')
+        self._tiles = (-(-height // TILE_SIZE), -(-width // TILE_SIZE))
+        self._touched = np.zeros(self._tiles, dtype=bool)  # 前フレームで点を描いたタイル
+        self._full_upload = True  # 次のフレームで画像全体を転送する
+        self.upload_area = 0  # 直前のフレームで転送した画素数
+        self._kernels = {}
+        self._ovals = []  # create_oval で受け取った (x, y, 半径, R, G, B)
+        self._taps = []  # 描き込み待ちの (画素位置, 点の色, 円の重み)
+
+    @property
+    def item_count(self):
+        """キャンバス上に存在するアイテム数（画像1つのみ）"""
+        return 0 if self.item is None else 1
+
+    def _kernel(self, radius):
+        """半径ごとの (余白付き座標での画素オフセット, 重み)"""
+        kernel = self._kernels.get(radius)
+        if kernel is None:
+            dx, dy, weight = soft_dot(radius)
+            kernel = self._kernels[radius] = (dy * self._stride + dx, weight)
+        return kernel
+
+    def begin_frame(self):
+        """フレームの描画を開始"""
+        self._ovals.clear()
+        self._taps.clear()
+
+    def create_oval(self, x0, y0, x1, y1, fill='', outline='', tags=None):
+        """楕円を円の点として受け取る（描き込みは end_frame でまとめて行う）"""
+        r, g, b = palette.rgb(fill)
+        self._ovals.append(((x0 + x1) / 2, (y0 + y1) / 2, (x1 - x0) / 2, r, g, b))
+
+    def draw_points(self, x, y, radius, colors):
+        """点を一括で描く（x, y, radius は配列、colors は (n, 3) の RGB）"""
+        x = np.rint(x).astype(np.int64)
+        y = np.rint(y).astype(np.int64)
+        radius = np.minimum(np.asarray(radius, dtype=np.float64), MAX_RADIUS)
+        colors = np.asarray(colors, dtype=np.float32)
+        # 画面外の点を捨てる（余白内なら縁にかかる点も描ける）
+        m = self._margin
+        visible = (x > -m) & (x < self.width + m) & (y > -m) & (y < self.height + m)
+        if not visible.all():
+            x, y, radius, colors = x[visible], y[visible], radius[visible], colors[visible]
+        pad = self._pad
+        center = (y + pad) * self._stride + (x + pad)
+        for r in np.unique(radius).tolist():
+            select = radius == r
+            offsets, weight = self._kernel(r)
+            flat = (center[select][:, None] + offsets).ravel()
+            self._taps.append((flat, colors[select], weight))
+
+    def end_frame(self):
+        """加算合成してフレームバッファの変化した領域を画像に転送"""
+        if self._ovals:
+            ovals = np.array(self._ovals)
+            self.draw_points(ovals[:, 0], ovals[:, 1], np.maximum(ovals[:, 2], 0.5), ovals[:, 3:])
+            self._ovals.clear()
+
+        # 前フレームの点を消す（今フレームで描く範囲は下で上書きする）
+        for x0, y0, x1, y1 in dirty_rects(self._touched, TILE_SIZE, self.width, self.height):
+            self.pixels[y0:y1, x0:x1] = 0
+        touched = np.zeros(self._tiles, dtype=bool)
+
+        if self._taps:
+            flat = np.concatenate([t[0] for t in self._taps])
+            pad = self._pad
+            stride = self._stride
+            rows = flat // stride
+            # 画面内に描かれた画素のタイルを記録
+            x = flat - rows * stride - pad
+            y = rows - pad
+            inside = (x >= 0) & (x < self.width) & (y >= 0) & (y < self.height)
+            touched[y[inside] // TILE_SIZE, x[inside] // TILE_SIZE] = True
+            # 点がかかる行の範囲だけを合成する
+            first, last = int(rows.min()), int(rows.max()) + 1
+            top, bottom = max(first - pad, 0), min(last - pad, self.height)
+            flat -= first * stride
+            size = (last - first) * stride
+            for c in range(3):
+                weights = np.concatenate([np.outer(colors[:, c], weight).ravel()
+                                          for _, colors, weight in self._taps])
+                channel = np.bincount(flat, weights=weights, minlength=size)
+                channel = channel.reshape(-1, stride)[top + pad - first:bottom + pad - first,
+                                                      pad:pad + self.width]
+                np.minimum(channel, 255, out=self.pixels[top:bottom, :, c], casting='unsafe')
+            self._taps.clear()
+
+        dirty = touched | self._touched
+        self._touched = touched
+        self._upload(dirty)
+        if self.item is None:
+            self.item = self.canvas.create_image(0, 0, image=self.display, anchor='nw',
+                                                 tags=self.tag)
+
+    def _upload(self, dirty):
+        """変化したタイルを画像に転送（変化が大きい場合は画像全体）"""
+        put = self.photo.tk.call
+        if not self._full_upload:
+            if not dirty.any():
+                self.upload_area = 0
+                return
+            rects = dirty_rects(dirty, TILE_SIZE, self.width, self.height)
+            area = sum((x1 - x0) * (y1 - y0) for x0, y0, x1, y1 in rects)
+            if area < self.width * self.height * FULL_UPLOAD_RATIO:
+                for x0, y0, x1, y1 in rects:
+                    header = f'P6 {x1 - x0} {y1 - y0} 255 '.encode('ascii')
+                    put(self.photo.name, 'put', header + self.pixels[y0:y1, x0:x1].tobytes(),
+                        '-format', 'ppm', '-to', x0, y0)
+                    self._enlarge(x0, y0, x1, y1)
+                self.upload_area = area
+                return
+        put(self.photo.name, 'put', self._header + self.pixels.tobytes(), '-format', 'ppm')
+        self._enlarge(0, 0, self.width, self.height)
+        self.upload_area = self.width * self.height
+        self._full_upload = False
+
+    def _enlarge(self, x0, y0, x1, y1):
+        """転送した領域を拡大して表示用の画像にコピー"""
+        k = self.zoom
+        if k == 1:
+            return
+        self.display.tk.call(self.display.name, 'copy', self.photo.name,
+                             '-from', x0, y0, x1, y1, '-to', x0 * k, y0 * k, '-zoom', k)
+
+    def clear(self):
+        """画像を消す（次のフレームで作り直す）"""
+        self.canvas.delete(self.tag)
+        self.item = None
+        self.pixels[:] = 0
+        self._touched[:] = False
+        self._full_upload = True  # 画像に残っている前の内容も消す
+        self._ovals.clear()
+        self._taps.clear()
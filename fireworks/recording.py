@@ -0,0 +1,160 @@
+"""打ち上げ・クリック・タイマー操作の記録と再生
+
+乱数の種と、物理ステップの番号（tick）付きのイベントを小さな固定長の
+バイナリ形式でファイルに書き出す。同じ種で乱数を作り直し、記録した
+イベントを同じステップで適用すれば、休憩中の花火をそのまま再現できる
+（性能の比較に使う回帰用ワークロードにもなる）。
+
+ファイルの形式（リトルエンディアン）:
+    ヘッダ: マジック 'FWREC'、版、乱数の種、品質の段階（255は自動）、FPS、パーティクル数の上限（0は無制限）、
+        爆発パターンの数と、パターンごとの名前（UTF-8 で16バイト、NUL埋め）と重み（float64）の表
+        （パターンの選び方で乱数の使い方が変わるので、再生・同期の受信側も同じ重みを使う）
+    イベント: tick（uint32）、種類（uint8）、引数2つ（int32）の13バイトの繰り返し
+"""
+import struct
+
+MAGIC = b'FWREC'
+VERSION = 2
+_HEADER = struct.Struct('<5sBQBBIB')
+_PATTERN = struct.Struct('<16sd')
+_EVENT = struct.Struct('<IBii')
+HEADER_SIZE = _HEADER.size  # ヘッダの固定部分の大きさ（爆発パターンの重みの表が続く）
+EVENT_SIZE = _EVENT.size
+QUALITY_AUTO_CODE = 255
+
+# イベントの種類
+EVENT_LAUNCH = 1  # 自動打ち上げ (x, 目標y)。再生時は乱数から同じ位置が作り直される
+EVENT_CLICK = 2  # クリックでの打ち上げ (x, 目標y)
+EVENT_TIMER_START = 3  # タイマー開始 (秒数)
+EVENT_TIMER_END = 4  # タイマー終了
+EVENT_RESET = 5  # リセット
+EVENT_QUALITY = 6  # 品質の段階の変更 (段階)
+EVENT_END = 7  # 記録の終わり
+EVENT_TICK = 8  # 同期モードのみ: 送信元がこのステップまで進んだ（これより前のイベントは送信済み）
+
+
+class Recording:
+    """読み込んだ記録（設定とイベントの一覧）"""
+
+    def __init__(self, seed, quality=None, fps=20, particle_budget=None, events=(),
+                 pattern_weights=None):
+        self.seed = seed
+        self.quality = quality  # 開始時の品質の段階（Noneは自動調整）
+        self.fps = fps
+        self.particle_budget = particle_budget
+        self.events = list(events)  # (tick, 種類, 引数1, 引数2)
+        self.pattern_weights = pattern_weights  # 爆発パターン名 -> 重み（Noneは記録なし）
+
+    @property
+    def ticks(self):
+        """記録した物理ステップ数"""
+        return self.events[-1][0] if self.events else 0
+
+    def count(self, kind):
+        """指定した種類のイベントの数"""
+        return sum(1 for event in self.events if event[1] == kind)
+
+
+def encode_header(seed, quality=None, fps=20, particle_budget=None, pattern_weights=None):
+    """ヘッダのバイト列（pattern_weights は爆発パターン名 -> 重み）"""
+    weights = pattern_weights or {}
+    table = []
+    for name, weight in weights.items():
+        encoded = name.encode('utf-8')
+        if len(encoded) > _PATTERN.size - 8:
+            raise ValueError(f"爆発パターンの名前が長すぎて記録できません: {name}")
+        table.append(_PATTERN.pack(encoded, weight))
+    return _HEADER.pack(MAGIC, VERSION, seed,
+                        QUALITY_AUTO_CODE if quality is None else quality,
+                        fps, particle_budget or 0, len(table)) + b''.join(table)
+
+
+def header_size(data):
+    """ヘッダの固定部分 data から、重みの表を含むヘッダ全体の大きさを求める"""
+    return _HEADER.size + data[_HEADER.size - 1] * _PATTERN.size
+
+
+def decode_header(data, source='記録'):
+    """ヘッダを読んで、イベントが空の Recording を返す"""
+    if len(data) < _HEADER.size or bytes(data[:len(MAGIC)]) != MAGIC:
+        raise ValueError(f"記録ファイルではありません: {source}")
+    magic, version, seed, quality, fps, budget, count = _HEADER.unpack_from(data)
+    if version != VERSION:
+        raise ValueError(f"対応していない記録ファイルの版です: {version}")
+    if len(data) < header_size(data):
+        raise ValueError(f"記録ファイルのヘッダが途中で切れています: {source}")
+    weights = {}
+    for i in range(count):
+        name, weight = _PATTERN.unpack_from(data, _HEADER.size + i * _PATTERN.size)
+        weights[name.rstrip(b'\0').decode('utf-8')] = weight
+    return Recording(seed, None if quality == QUALITY_AUTO_CODE else quality, fps,
+                     budget or None, pattern_weights=weights or None)
+
+
+def encode_event(tick, kind, a=0, b=0):
+    """イベント1件のバイト列"""
+    return _EVENT.pack(tick, kind, a, b)
+
+
+def decode_events(data):
+    """イベントのバイト列を (tick, 種類, 引数1, 引数2) の一覧にする（端数は無視）"""
+    usable = len(data) - len(data) % _EVENT.size
+    return list(_EVENT.iter_unpack(memoryview(data)[:usable]))
+
+
+def load_recording(path):
+    """記録ファイルを読み込む"""
+    with open(path, 'rb') as f:
+        data = f.read()
+    recorded = decode_header(data, path)
+    # 書き込み途中で終了した場合の端数は捨てる
+    recorded.events = decode_events(memoryview(data)[header_size(data):])
+    return recorded
+
+
+class EventRecorder:
+    """イベントを記録ファイルに追記する"""
+
+    def __init__(self, path, seed, quality=None, fps=20, particle_budget=None,
+                 pattern_weights=None):
+        self.path = path
+        self.file = open(path, 'wb')
+        self.file.write(encode_header(seed, quality, fps, particle_budget, pattern_weights))
+        self.events = 0
+
+    def record(self, tick, kind, a=0, b=0):
+        """イベントを1件記録"""
+        self.file.write(_EVENT.pack(tick, kind, a, b))
+        self.events += 1
+
+    def close(self, tick):
+        """記録の終わりを書き込んで閉じる"""
+        if self.file is None:
+            return
+        self.record(tick, EVENT_END)
+        self.file.close()
+        self.file = None
+
+
+class Replay:
+    """記録したイベントを tick の順に取り出す"""
+
+    def __init__(self, recording):
+        self.recording = recording
+        self.position = 0
+
+    @property
+    def finished(self):
+        """全てのイベントを取り出したか"""
+        return self.position >= len(self.recording.events)
+
+    def due(self, tick):
+        """tick までに適用するイベント (種類, 引数1, 引数2) を順に取り出す
+
+        1件ずつ進めるので、イベントの適用中に呼び直しても順序が崩れない。
+        """
+        events = self.recording.events
+        while self.position < len(events) and events[self.position][0] <= tick:
+            event = events[self.position]
+            self.position += 1
+            yield event[1:]
@@ -0,0 +1,408 @@
+"""キャンバス描画バックエンド
+
+毎フレーム canvas.delete して create_oval し直す代わりに、
+作成済みのキャンバスアイテムを使い回して coords/itemconfigure で動かす。
+前のフレームと同じ位置・同じ色の楕円（止まっている軌跡の点など）は
+アイテムに一切触れないので、Tk が再描画するのは変化した領域だけになる。
+
+実際の Tk のキャンバスでは、1フレーム分の作成・移動・色変更・削除を
+Tcl のスクリプトにまとめて1回（大量の場合は数回）の eval で送るので、
+アイテムごとに Python と Tcl を往復する必要がない。
+"""
+import bisect
+import itertools
+import operator
+import tkinter as tk
+from collections import deque
+
+BATCH_COMMANDS = 4000  # 1回の eval で送るコマンド数の上限
+_COORDS = {n: ' '.join(['%.1f'] * n) for n in (2, 4)}  # 座標の書式（0.1ピクセル単位）
+
+
+def _tcl_coords(coords):
+    """座標の一覧の Tcl での表記"""
+    fmt = _COORDS.get(len(coords))
+    if fmt is None:
+        fmt = _COORDS[len(coords)] = ' '.join(['%.1f'] * len(coords))
+    return fmt % tuple(coords)
+
+
+def _tcl_word(value):
+    """Tcl のコマンドの引数1つ分の表記"""
+    word = str(value)
+    if not word:
+        return '{}'
+    if any(c in word for c in ' \t\n{}[]$"\\;'):
+        return '{' + word + '}'
+    return word
+
+
+class CommandBatch:
+    """キャンバスへのコマンドを溜めておき、Tcl のスクリプトとしてまとめて実行する
+
+    作成したアイテムのIDは flush の戻り値で受け取る。
+    """
+
+    def __init__(self, canvas, limit=BATCH_COMMANDS):
+        self.tk = canvas.tk
+        self.path = canvas._w
+        self.limit = limit
+        self.commands = []  # 結果を使わないコマンド
+        self.creates = []  # アイテムを作成するコマンド（IDを返す）
+        self.calls = 0  # 直前の flush で eval した回数
+        self._options = {}  # (属性, 値) -> '-属性 値'（色や画像は限られるので使い回す）
+
+    def __len__(self):
+        return len(self.commands) + len(self.creates)
+
+    def coords(self, item, *coords):
+        self.commands.append(f"{self.path} coords {item} {_tcl_coords(coords)}")
+
+    def _format(self, options):
+        """オプションの Tcl での表記"""
+        words = []
+        cache = self._options
+        for option in options.items():
+            word = cache.get(option)
+            if word is None:
+                word = cache[option] = f"-{option[0]} {_tcl_word(option[1])}"
+            words.append(word)
+        return ' '.join(words)
+
+    def itemconfigure(self, item, **options):
+        self.commands.append(f"{self.path} itemconfigure {item} {self._format(options)}")
+
+    def delete(self, *items):
+        self.commands.append(f"{self.path} delete {' '.join(map(str, items))}")
+
+    def tag_raise(self, item, above):
+        self.commands.append(f"{self.path} raise {item} {above}")
+
+    def tag_lower(self, item, below):
+        self.commands.append(f"{self.path} lower {item} {below}")
+
+    def create(self, kind, coords, options):
+        self.creates.append(
+            f"{self.path} create {kind} {_tcl_coords(coords)} {self._format(options)}")
+
+    def flush(self):
+        """溜めたコマンドを実行し、作成したアイテムのIDを作成順に返す
+
+        Tcl のエラー（tk.TclError）はそのまま送出する。途中まで実行されている
+        可能性があるので、呼び出し側はキャンバスの状態を作り直すこと。
+        """
+        commands, creates = self.commands, self.creates
+        self.commands, self.creates = [], []
+        self.calls = 0
+        limit = self.limit
+        for start in range(0, len(commands), limit):
+            self.tk.eval('\n'.join(commands[start:start + limit]))
+            self.calls += 1
+        items = []
+        for start in range(0, len(creates), limit):
+            # list [create ...] [create ...] で作成したIDを1度に受け取る
+            result = self.tk.eval('list [' + '] ['.join(creates[start:start + limit]) + ']')
+            items.extend(int(item) for item in self.tk.splitlist(result))
+            self.calls += 1
+        return items
+
+
+class CanvasItemPool:
+    """楕円アイテムを使い回すリテインドモードの描画器
+
+    canvas.create_oval と同じ呼び出し方ができるので、
+    Firework.draw / Particle.draw にキャンバスの代わりに渡せる。
+    楕円は (座標, 色) をキーに前フレームのアイテムと対応付け、変化した
+    楕円だけを end_frame でまとめて空きアイテムに割り当てる。割り当ての後、
+    重なり順が create_oval の呼び出し順と違うアイテムだけを直前の楕円の上へ移す。
+
+    batch が None の場合、Tk のキャンバスなら CommandBatch でまとめて送り、
+    それ以外（テスト用のキャンバスなど）はメソッドを1つずつ呼ぶ。
+    まとめて送ったスクリプトが失敗した場合は1つずつ呼ぶ方式に切り替える。
+    """
+
+    def __init__(self, canvas, tag='firework', shrink_interval=100, spare=64, batch=None):
+        self.canvas = canvas
+        if batch is None:
+            batch = isinstance(canvas, tk.Canvas)
+        self.batch = CommandBatch(canvas) if batch else None
+        self.tag = tag
+        self.shrink_interval = shrink_interval  # 縮小を検討する間隔（フレーム）
+        self.spare = spare  # 縮小時に残しておく予備アイテム数
+        self.items = []  # アイテムID（作成順）
+        self.shapes = {}  # アイテムID -> キャンバス上の現在の (x0, y0, x1, y1, 色)
+        self.hidden = deque()  # 非表示にしているアイテムID（隠した順）
+        self.depths = {}  # アイテムID -> 重なり順（大きいほど手前）
+        self._top = 0  # これまでに与えた最大の重なり順
+        self.used = 0  # 今フレームで使用したアイテム数
+        self.visible = 0  # 表示状態のアイテム数
+        self.changed = 0  # 今フレームで移動・色変更・表示切り替えしたアイテム数
+        self.calls = 0  # 今フレームで Tcl を呼び出した回数
+        self.peak = 0  # 縮小間隔内での最大使用数
+        self.frames = 0
+        self._shown = {}  # 前フレームに表示した (座標, 色) -> アイテムID
+        self._frame = {}  # 今フレームで描く (座標, 色) -> アイテムID（呼び出し順、未割り当ては None）
+
+    @property
+    def item_count(self):
+        """キャンバス上に存在するアイテム数（非表示のものも含む）"""
+        return len(self.items)
+
+    def begin_frame(self):
+        """フレームの描画を開始"""
+        self._frame = {}
+
+    def create_oval(self, x0, y0, x1, y1, fill='', outline='', tags=None):
+        """楕円を描画（前フレームと同じ楕円ならそのアイテムをそのまま使う）
+
+        新しく割り当てるアイテムは end_frame で決まるため、その場合は None を返す。
+        """
+        return self._place((x0, y0, x1, y1, fill))
+
+    def _place(self, shape):
+        """(座標..., 見た目) を今フレームに追加（座標と見た目が同じアイテムがあれば使う）"""
+        if shape in self._frame:
+            # 同じ位置・同じ色の楕円は1つで描き、後から描いた位置の重なり順にする
+            item = self._frame[shape] = self._frame.pop(shape)
+            return item
+        item = self._shown.pop(shape, None)
+        self._frame[shape] = item
+        return item
+
+    def _create(self, shape):
+        """新しいアイテムを作成"""
+        return self.canvas.create_oval(*shape[:4], fill=shape[4], outline='', tags=self.tag)
+
+    def _create_command(self, shape):
+        """新しいアイテムを作成する CommandBatch.create の引数"""
+        return 'oval', shape[:4], {'fill': shape[4], 'outline': '', 'tags': self.tag}
+
+    def _options(self, shape):
+        """見た目（形の最後の要素）を設定する itemconfigure の引数"""
+        return {'fill': shape[-1]}
+
+    def _stack(self, item):
+        """アイテムを最前面にあるものとして記録（作成時）"""
+        self._top += 1
+        self.depths[item] = self._top
+
+    @staticmethod
+    def _unordered(depths):
+        """重なり順の一覧のうち、最長の増加部分列に入らない位置"""
+        # 前の全てより大きく後の全てより小さいものは必ず最長の増加部分列に入るので、
+        # 残り（順が入れ替わった部分）だけから求める
+        highest = itertools.accumulate(depths, max)
+        lowest = list(itertools.accumulate(reversed(depths), min))
+        lowest.reverse()
+        candidates = list(itertools.compress(range(len(depths)),
+                                             map(operator.ne, highest, lowest)))
+        bisect_left = bisect.bisect_left
+        tails = []  # 長さ k+1 の増加列の末尾の重なり順
+        ends = []  # その末尾の candidates での位置
+        previous = [-1] * len(candidates)
+        for n, i in enumerate(candidates):
+            depth = depths[i]
+            k = bisect_left(tails, depth)
+            if k == len(tails):
+                tails.append(depth)
+                ends.append(n)
+            else:
+                tails[k] = depth
+                ends[k] = n
+            if k:
+                previous[n] = ends[k - 1]
+        unordered = set(candidates)
+        n = ends[-1] if ends else -1
+        while n >= 0:
+            unordered.discard(candidates[n])
+            n = previous[n]
+        return sorted(unordered)
+
+    def _restack(self, order, misplaced, target):
+        """今フレームのアイテムを create_oval の呼び出し順に重ねる
+
+        misplaced（呼び出し順の位置の昇順）のアイテムだけを、呼び出し順で直前の
+        アイテムのすぐ上へ移し、重なり順を付け直す。移したアイテム数を返す。
+        """
+        if not misplaced:
+            return 0
+        moving = set(misplaced)
+        first = 0  # 移さない最初のアイテムの位置
+        while first in moving:
+            first += 1
+        moved = 0
+        for i in misplaced:
+            if i:
+                target.tag_raise(order[i], order[i - 1])
+            elif first < len(order):
+                target.tag_lower(order[i], order[first])
+            else:
+                continue  # 全て移す場合は先頭のアイテムを基準にする
+            moved += 1
+        # 表示中のアイテムの重なり順を呼び出し順に付け直す
+        start = self._top + 1
+        self.depths.update(zip(order, range(start, start + len(order))))
+        self._top += len(order)
+        return moved
+
+    def _assign(self, shape, item, target):
+        """アイテムを指定した形と見た目にする（変化した属性だけを送る）"""
+        old = self.shapes[item]
+        if old[:-1] != shape[:-1]:
+            target.coords(item, *shape[:-1])
+        if old[-1] != shape[-1]:
+            target.itemconfigure(item, **self._options(shape))
+        self.shapes[item] = shape
+
+    def end_frame(self):
+        """新しい楕円にアイテムを割り当て、使わなかったアイテムを隠す"""
+        # 前フレームで使っていて今フレームで使わなかったアイテムから順に割り当てる。
+        # 呼び出し順で前後のアイテムの間に重なっているものを選び、間にない場合は
+        # 最も手前のものを使ってそのアイテムだけを後で移す
+        depths = self.depths
+        leftovers = sorted(self._shown.values(), key=depths.__getitem__)
+        free = [depths[item] for item in leftovers]
+        frame = self._frame
+        shapes = list(frame)
+        order = list(frame.values())  # 呼び出し順のアイテム（未割り当ては None）
+        count = len(order)
+        misplaced = []  # 重なり順を直すために移す位置（呼び出し順）
+        fixed = list(order)  # 移さずに重なり順の基準にするアイテム（それ以外は None）
+        kept_depths = [depths[item] for item in order if item is not None]
+        if kept_depths != sorted(kept_depths):
+            # 描く順が入れ替わったアイテムは、動かさずに済む最大の組以外を移す
+            kept = [i for i, item in enumerate(order) if item is not None]
+            for j in self._unordered(kept_depths):
+                fixed[kept[j]] = None
+                misplaced.append(kept[j])
+        batch = self.batch
+        target = batch if batch is not None else self.canvas
+        created = []  # 新しく作るアイテムの (位置, 形)
+        changed = 0
+        top = float('inf')
+        below = 0  # 前にある最後の基準のアイテムの重なり順
+        upper = top  # 後にある最初の基準のアイテムの重なり順
+        upper_at = -1  # その位置
+        last = -1  # 直前に割り当てた位置
+        for i in [i for i, item in enumerate(order) if item is None]:
+            for j in range(i - 1, last, -1):
+                if fixed[j] is not None:
+                    below = depths[fixed[j]]
+                    break
+            last = i
+            if upper_at <= i:
+                upper_at = i + 1
+                while upper_at < count and fixed[upper_at] is None:
+                    upper_at += 1
+                upper = depths[fixed[upper_at]] if upper_at < count else top
+            shape = shapes[i]
+            if leftovers:
+                k = bisect.bisect_right(free, below)
+                if k < len(free) and free[k] < upper:
+                    below = free[k]
+                    fixed[i] = leftovers[k]
+                else:
+                    k = len(free) - 1
+                    misplaced.append(i)
+                del free[k]
+                item = leftovers.pop(k)
+                self._assign(shape, item, target)
+            elif self.hidden:
+                # 非表示にしていたアイテムを再表示（隠している間の重なり順は不明）
+                item = self.hidden.popleft()
+                if self.shapes[item][:-1] != shape[:-1]:
+                    target.coords(item, *shape[:-1])
+                target.itemconfigure(item, state='normal', **self._options(shape))
+                self.shapes[item] = shape
+                depths[item] = None
+                misplaced.append(i)
+            else:
+                # 新しいアイテムは最前面に作られるので、後に基準のアイテムがあれば移す
+                if upper != top:
+                    misplaced.append(i)
+                if batch is not None:
+                    batch.create(*self._create_command(shape))
+                    created.append((i, shape))
+                    changed += 1
+                    continue  # アイテムIDは送った後に決まる
+                else:
+                    item = self._create(shape)
+                    self.items.append(item)
+                    self.shapes[item] = shape
+                    self._stack(item)
+            order[i] = item
+            frame[shape] = item
+            changed += 1
+        misplaced.sort()
+        for item in leftovers:
+            target.itemconfigure(item, state='hidden')
+            self.hidden.append(item)
+            changed += 1
+        if batch is not None:
+            try:
+                items = batch.flush()
+                calls = batch.calls
+                for (i, shape), item in zip(created, items):
+                    self.items.append(item)
+                    self.shapes[item] = shape
+                    self._stack(item)
+                    order[i] = item
+                    frame[shape] = item
+                if self._restack(order, misplaced, batch):
+                    # 作成したアイテムを基準に移すものがあるので、作成後に送る
+                    batch.flush()
+                    calls += batch.calls
+            except tk.TclError:
+                self._fall_back(frame)
+                return
+            self.calls = calls
+        else:
+            self.calls = changed + self._restack(order, misplaced, self.canvas)
+        self._shown = frame
+        self.used = len(frame)
+        self.visible = len(frame)
+        self.changed = changed
+
+        # 使用数が減ったらプールを縮小
+        self.peak = max(self.peak, self.used)
+        self.frames += 1
+        if self.frames >= self.shrink_interval:
+            keep = self.peak + self.spare
+            if len(self.items) > keep * 2:
+                # 表示中のアイテムは keep 以下なので、余りは全て非表示のアイテム
+                surplus = len(self.items) - keep
+                doomed = [self.hidden.pop() for _ in range(surplus)]
+                self.canvas.delete(*doomed)
+                removed = set(doomed)
+                self.items = [item for item in self.items if item not in removed]
+                for item in doomed:
+                    del self.shapes[item]
+                    del self.depths[item]
+            self.frames = 0
+            self.peak = 0
+
+    def _fall_back(self, frame):
+        """まとめて送るのをやめ、全アイテムを作り直して今フレームを1つずつ描き直す"""
+        self.batch = None
+        shapes = list(frame)
+        self.clear()
+        self.begin_frame()
+        for shape in shapes:
+            self._place(shape)
+        self.end_frame()
+
+    def clear(self):
+        """全アイテムを削除"""
+        self.canvas.delete(self.tag)
+        self.items.clear()
+        self.shapes.clear()
+        self.hidden.clear()
+        self.depths.clear()
+        self._shown = {}
+        self._frame = {}
+        self.used = 0
+        self.visible = 0
+        self.changed = 0
+        self.calls = 0
+        self.peak = 0
+        self.frames = 0
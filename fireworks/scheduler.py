@@ -0,0 +1,82 @@
+"""固定ステップのフレームスケジューラ
+
+物理演算は常に SIMULATION_STEP 秒ごとの固定ステップで進め、描画は
+目標 FPS で行う。単調増加する時計で経過時間を積算し、フレームが遅れた
+場合は物理ステップをまとめて実行して追いつく（遅れすぎた分は捨てる）。
+次のフレームは予定時刻からの差で after の待ち時間を決めるので、
+1フレームの処理時間が周期に上乗せされてずれていくことがない。
+"""
+import time
+
+SIMULATION_STEP = 0.05  # 物理演算の1ステップ（秒）。物理定数は20Hzを前提に調整済み
+FPS_CHOICES = (20, 30, 60)  # 選択できる描画の目標FPS
+MAX_CATCH_UP_STEPS = 5  # 1フレームで追いつくために実行する最大ステップ数
+
+
+class FrameScheduler:
+    """描画フレームごとに実行する物理ステップ数と次フレームまでの待ち時間を決める"""
+
+    def __init__(self, fps=20, step=SIMULATION_STEP, max_steps=MAX_CATCH_UP_STEPS,
+                 clock=time.monotonic):
+        if fps <= 0:
+            raise ValueError(f"FPSは正の値にしてください: {fps}")
+        self.fps = fps
+        self.interval = 1.0 / fps  # 描画フレームの周期（秒）
+        self.step = step
+        self.max_steps = max_steps
+        self.clock = clock
+        self.running = False
+        self.accumulator = 0.0  # まだ物理演算に使っていない経過時間
+        self.last = 0.0  # 前回 begin_frame した時刻
+        self.next_frame = 0.0  # 次のフレームの予定時刻
+        self.dropped_steps = 0  # 追いつけずに捨てた物理ステップ数
+        self.skipped_frames = 0  # 予定時刻に間に合わず飛ばした描画フレーム数
+
+    @property
+    def alpha(self):
+        """前回の物理ステップから次のステップまでの進み具合（0〜1、補間用）"""
+        return min(self.accumulator / self.step, 1.0)
+
+    def start(self):
+        """計時を開始（最初のフレームで1ステップ進める）"""
+        now = self.clock()
+        self.running = True
+        self.accumulator = self.step
+        self.last = now
+        self.next_frame = now
+
+    def stop(self):
+        """計時を停止（再開時は start からやり直す）"""
+        self.running = False
+
+    def begin_frame(self):
+        """経過時間を積算し、このフレームで実行する物理ステップ数を返す"""
+        if not self.running:
+            self.start()
+        else:
+            now = self.clock()
+            self.accumulator += now - self.last
+            self.last = now
+        # 浮動小数点の誤差で1ステップ分に僅かに足りない場合も切り上げる
+        steps = int(self.accumulator / self.step + 1e-6)
+        if steps > self.max_steps:
+            # 遅れすぎた分は捨てる（処理落ちで延々と追いかけ続けないように）
+            self.dropped_steps += steps - self.max_steps
+            steps = self.max_steps
+            self.accumulator = 0.0
+        else:
+            self.accumulator = max(0.0, self.accumulator - steps * self.step)
+        return steps
+
+    def end_frame(self):
+        """次のフレームまでの待ち時間（ミリ秒）を返す"""
+        self.next_frame += self.interval
+        now = self.clock()
+        if now > self.next_frame:
+            # 予定時刻を過ぎていたら間に合わなかったフレームを飛ばす
+            behind = int((now - self.next_frame) / self.interval)
+            self.skipped_frames += behind
+            self.next_frame += behind * self.interval
+            if now > self.next_frame:
+                return 1
+        return max(1, int(round((self.next_frame - now) * 1000)))
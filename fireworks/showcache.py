@@ -0,0 +1,202 @@
+"""事前に描画した花火のショーのキャッシュ
+
+休憩の長さ分の花火をあらかじめシミュレーションし、1ステップごとに描く円の
+一覧（中心・半径・色）を圧縮してファイルに保存する。再生時は物理演算を一切
+行わず、ファイルから読んだ円を描画器に渡すだけなので、シミュレーションと
+描画を同時にこなせない低性能な端末でも花火を表示できる。
+
+ファイルの形式（リトルエンディアン）:
+    ヘッダ: マジック 'FWSHOW'、版、1秒あたりのステップ数、フレーム数、幅、高さ
+    フレーム: 圧縮後のバイト数（uint32）と zlib で圧縮した本体の繰り返し
+    本体: 円の数 n 個分の x（int16）、y（int16）、半径（uint8）、RGB（3バイト）を列ごとに並べたもの
+"""
+import random
+import struct
+import zlib
+from array import array
+
+if __package__:
+    from . import palette
+    from .quality import QUALITY_LEVELS
+    from .scheduler import SIMULATION_STEP
+else:
+    import palette
+    from quality import QUALITY_LEVELS
+    from scheduler import SIMULATION_STEP
+
+MAGIC = b'FWSHOW'
+VERSION = 1
+_HEADER = struct.Struct('<6sBHIHH')
+_LENGTH = struct.Struct('<I')
+MAX_RADIUS = 255
+_fills = {}  # RGB のバイト列 -> 16進表記
+
+
+class CircleRecorder:
+    """create_oval で描かれた円を集めるキャンバスの代わり"""
+
+    def __init__(self):
+        self.circles = []  # (x, y, 半径, 色)
+
+    def create_oval(self, x0, y0, x1, y1, fill='', outline='', tags=None):
+        self.circles.append((round((x0 + x1) / 2), round((y0 + y1) / 2),
+                             min(MAX_RADIUS, round((x1 - x0) / 2)), fill))
+
+
+def encode_frame(circles):
+    """円の一覧を1フレーム分のバイト列に圧縮"""
+    xs = array('h', (max(-32768, min(32767, c[0])) for c in circles))
+    ys = array('h', (max(-32768, min(32767, c[1])) for c in circles))
+    radii = bytes(c[2] for c in circles)
+    colors = b''.join(bytes(palette.rgb(c[3])) for c in circles)
+    return zlib.compress(xs.tobytes() + ys.tobytes() + radii + colors)
+
+
+def decode_frame(data):
+    """encode_frame の逆変換（(x, y, 半径, '#rrggbb') の一覧）"""
+    raw = zlib.decompress(data)
+    n = len(raw) // 8
+    xs = array('h')
+    xs.frombytes(raw[:2 * n])
+    ys = array('h')
+    ys.frombytes(raw[2 * n:4 * n])
+    radii = raw[4 * n:5 * n]
+    colors = raw[5 * n:]
+    fills = _fills
+    circles = []
+    for i in range(n):
+        rgb = colors[3 * i:3 * i + 3]
+        fill = fills.get(rgb)
+        if fill is None:
+            fill = fills[rgb] = '#' + rgb.hex()
+        circles.append((xs[i], ys[i], radii[i], fill))
+    return circles
+
+
+def render_show(path, seconds, seed=None, engine='objects', quality_level=0,
+                width=1200, height=700, particle_budget=None, pattern_weights=None):
+    """花火のショーを seconds 秒分シミュレーションしてファイルに保存し、フレーム数を返す
+
+    打ち上げの位置・間隔・色・爆発パターンはアプリの自動打ち上げと同じ規則で、種から決まる。
+    """
+    if __package__:
+        from .fireworks import (LAUNCH_X_RANGE, LAUNCH_Y, TARGET_Y_RANGE, FireworkPool,
+                                create_particle_system, patterns)
+    else:
+        from fireworks import (LAUNCH_X_RANGE, LAUNCH_Y, TARGET_Y_RANGE, FireworkPool,
+                               create_particle_system, patterns)
+
+    rng = random.Random(seed)
+    sparkle_rng = random.Random(None if seed is None else seed + 1)
+    level = QUALITY_LEVELS[quality_level]
+    bounds = (width, height)
+    weights = pattern_weights or patterns.default_weights()
+    system = create_particle_system(engine, bounds, particle_budget, seed)
+    if system is not None:
+        system.set_level(level)
+    fireworks = []
+    pool = FireworkPool()
+    frames = int(round(seconds / SIMULATION_STEP))
+    next_launch = rng.randint(60, 120)
+
+    with open(path, 'wb') as f:
+        f.write(_HEADER.pack(MAGIC, VERSION, int(round(1 / SIMULATION_STEP)), frames,
+                             width, height))
+        for frame in range(frames):
+            # アプリの step と同じ順序で進める
+            if frame >= next_launch:
+                x = rng.randint(*LAUNCH_X_RANGE)
+                target_y = rng.randint(*TARGET_Y_RANGE)
+                pattern = patterns.choose(rng, weights)
+                fireworks.append(pool.firework(x, LAUNCH_Y, target_y, system, level, bounds,
+                                               rng, sparkle_rng, pattern))
+                next_launch = frame + rng.randint(*level.launch_interval)
+            if system is not None:
+                system.update()
+            pool.step(fireworks)
+
+            recorder = CircleRecorder()
+            for firework in fireworks:
+                firework.draw(recorder)
+            if system is not None:
+                system.draw(recorder)
+            data = encode_frame(recorder.circles)
+            f.write(_LENGTH.pack(len(data)))
+            f.write(data)
+    return frames
+
+
+class ShowCache:
+    """保存したショーを先頭から順に読み出して描画する
+
+    step() でフレームを進め、draw() では最後に進めたフレームだけを展開する
+    （描画が間に合わなかったフレームは展開せずに読み飛ばす）。
+    最後まで再生したら先頭に戻る。
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, 'rb')
+        header = self.file.read(_HEADER.size)
+        if len(header) < _HEADER.size:
+            raise ValueError(f"ショーのキャッシュではありません: {path}")
+        magic, version, self.steps_per_second, self.frames, self.width, self.height = \
+            _HEADER.unpack(header)
+        if magic != MAGIC:
+            raise ValueError(f"ショーのキャッシュではありません: {path}")
+        if version != VERSION:
+            raise ValueError(f"対応していないキャッシュの版です: {version}")
+        self.position = 0  # 次に読むフレームの番号
+        self.pending = 0  # 進めたがまだ読んでいないフレーム数
+        self.circles = []  # 最後に展開したフレームの円
+        self.loops = 0  # 最後まで再生して先頭に戻った回数
+
+    @property
+    def duration(self):
+        """ショーの長さ（秒）"""
+        return self.frames / self.steps_per_second
+
+    @property
+    def points(self):
+        """最後に展開したフレームの円の数"""
+        return len(self.circles)
+
+    def step(self, frames=1):
+        """再生位置を進める"""
+        self.pending += frames
+
+    def rewind(self):
+        """先頭から再生し直す"""
+        self.file.seek(_HEADER.size)
+        self.position = 0
+        self.pending = 0
+        self.circles = []
+
+    def _read(self, decode):
+        """次のフレームを読む（decode が False なら読み飛ばす）"""
+        if self.position >= self.frames:
+            self.rewind()
+            self.loops += 1
+        (length,) = _LENGTH.unpack(self.file.read(_LENGTH.size))
+        self.position += 1
+        if not decode:
+            self.file.seek(length, 1)
+            return None
+        return decode_frame(self.file.read(length))
+
+    def draw(self, canvas):
+        """現在のフレームの円を描画"""
+        if self.frames == 0:
+            return
+        if self.pending:
+            for _ in range(self.pending - 1):
+                self._read(False)
+            self.circles = self._read(True)
+            self.pending = 0
+        create_oval = canvas.create_oval
+        for x, y, r, fill in self.circles:
+            create_oval(x - r, y - r, x + r, y + r, fill=fill, outline='', tags='firework')
+
+    def close(self):
+        """ファイルを閉じる"""
+        self.file.close()
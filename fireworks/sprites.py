@@ -0,0 +1,158 @@
+"""光の粒のスプライトによる描画バックエンド
+
+パーティクルを楕円の代わりに、周りがぼんやり光る小さな画像（スプライト）で描く。
+スプライトは (色, 半径, きらめき) の組み合わせごとに1度だけ PhotoImage として
+作ってアトラスに保存し、キャンバスの画像アイテムを coords で動かして使い回す。
+きらめくパーティクルは白い外周と本体の2つの楕円で描かれるが、スプライトでは
+白い縁取り付きの1枚の画像にまとめるので、アイテム数が半分になる。
+"""
+import base64
+import math
+import struct
+import tkinter as tk
+import zlib
+
+if __package__:
+    from . import palette
+    from .render import CanvasItemPool
+else:
+    import palette
+    from render import CanvasItemPool
+
+GLOW_ALPHA = 0.45  # 光の輪の中心側の不透明度
+WHITE = palette.resolve('white')
+_TOLERANCE = 1e-6  # きらめきの外周と本体の中心・半径の差の許容誤差（画素）
+
+
+def png_rgba(width, height, pixels):
+    """RGBA の画素（行ごとのバイト列の一覧）から PNG のバイト列を作る"""
+    def chunk(kind, data):
+        return (struct.pack('>I', len(data)) + kind + data +
+                struct.pack('>I', zlib.crc32(kind + data) & 0xffffffff))
+
+    raw = b''.join(b'\x00' + row for row in pixels)  # 各行のフィルタは「なし」
+    return (b'\x89PNG\r\n\x1a\n' +
+            chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 6, 0, 0, 0)) +
+            chunk(b'IDAT', zlib.compress(raw)) +
+            chunk(b'IEND', b''))
+
+
+def glow_pixels(rgb, radius, sparkle):
+    """光の粒の画像の (大きさ, RGBA の行の一覧)
+
+    中心に半径 radius の色の円、きらめく場合はその外側に幅1の白い縁、
+    さらに外側に色が薄れていく光の輪を描く。
+    """
+    outer = radius + 1 if sparkle else radius  # 光の輪が始まる半径
+    glow = max(1, radius // 2 + 1)  # 光の輪の幅
+    half = int(math.ceil(outer + glow))
+    halo_rgb = (255, 255, 255) if sparkle else rgb
+    rows = []
+    for py in range(-half, half + 1):
+        row = bytearray()
+        for px in range(-half, half + 1):
+            d = math.hypot(px, py)
+            # 外側から順に重ねる（光の輪 → 白い縁 → 本体）
+            color, alpha = (0, 0, 0), 0.0
+            if d > outer - 0.5:
+                t = max(0.0, 1.0 - (d - outer + 0.5) / (glow + 0.5))
+                color, alpha = _over(color, alpha, halo_rgb, GLOW_ALPHA * t * t)
+            if sparkle:
+                color, alpha = _over(color, alpha, (255, 255, 255),
+                                     min(1.0, max(0.0, outer + 0.5 - d)))
+            color, alpha = _over(color, alpha, rgb, min(1.0, max(0.0, radius + 0.5 - d)))
+            row += bytes(color) + bytes((int(round(alpha * 255)),))
+        rows.append(bytes(row))
+    return 2 * half + 1, rows
+
+
+def _over(base, base_alpha, color, alpha):
+    """base の上に color を不透明度 alpha で重ねた (色, 不透明度)"""
+    if alpha <= 0.0:
+        return base, base_alpha
+    out_alpha = alpha + base_alpha * (1.0 - alpha)
+    mixed = tuple(int(round((c * alpha + b * base_alpha * (1.0 - alpha)) / out_alpha))
+                  for c, b in zip(color, base))
+    return mixed, out_alpha
+
+
+class GlowAtlas:
+    """(色, 半径, きらめき) ごとのスプライトを1度だけ作って保存する
+
+    factory は PNG のデータ（base64）から画像を作る関数（既定は PhotoImage）。
+    """
+
+    def __init__(self, master=None, factory=None):
+        if factory is None:
+            def factory(data):
+                return tk.PhotoImage(master=master, data=data, format='png')
+        self.factory = factory
+        self.images = {}  # (色, 半径, きらめき) -> 画像（参照を保持して破棄されないようにする）
+
+    def image(self, fill, radius, sparkle=False):
+        """スプライトの画像（初めて使う組み合わせの場合はここで作る）"""
+        key = (fill, radius, sparkle)
+        image = self.images.get(key)
+        if image is None:
+            size, rows = glow_pixels(palette.rgb(fill), radius, sparkle)
+            data = base64.b64encode(png_rgba(size, size, rows)).decode('ascii')
+            image = self.images[key] = self.factory(data)
+        return image
+
+
+class SpriteRenderer(CanvasItemPool):
+    """create_oval で受け取った円をスプライトの画像アイテムで描く描画器
+
+    CanvasItemPool と同じくアイテムを使い回し、(中心, 画像) が前フレームと
+    同じアイテムには触れない。白い円の直後に同じ中心で半径が（論理座標で）1小さい
+    円が来た場合はきらめき（白い外周と本体）とみなし、1枚のスプライトにまとめる。
+    scale は論理座標の長さ1に当たる画素数で、Viewport が拡大・縮小するときに設定する。
+    """
+
+    def __init__(self, canvas, atlas=None, **kwargs):
+        super().__init__(canvas, **kwargs)
+        self.atlas = atlas if atlas is not None else GlowAtlas(canvas)
+        self.scale = 1.0
+        self._held = None  # きらめきの外周かもしれない白い円 (x, y, 半径, 丸める前の半径)
+
+    def begin_frame(self):
+        super().begin_frame()
+        self._held = None
+
+    def create_oval(self, x0, y0, x1, y1, fill='', outline='', tags=None):
+        """円をスプライトとして描画（アイテムは end_frame で割り当てる）"""
+        x = (x0 + x1) / 2
+        y = (y0 + y1) / 2
+        half = (x1 - x0) / 2
+        radius = max(1, int(round(half)))
+        held = self._held
+        if held is not None:
+            self._held = None
+            # 拡大・縮小した座標は丸めの誤差を含むので、僅かな差は同じとみなす
+            if (abs(held[0] - x) < _TOLERANCE and abs(held[1] - y) < _TOLERANCE
+                    and abs(held[3] - half - self.scale) < _TOLERANCE):
+                return self._place((x, y, self.atlas.image(fill, radius, True)))
+            self._place((held[0], held[1], self.atlas.image(WHITE, held[2])))
+        if fill == WHITE:
+            # 次の円がきらめきの本体かどうかが分かるまで待つ
+            self._held = (x, y, radius, half)
+            return None
+        return self._place((x, y, self.atlas.image(fill, radius)))
+
+    def end_frame(self):
+        held = self._held
+        if held is not None:
+            self._held = None
+            self._place((held[0], held[1], self.atlas.image(WHITE, held[2])))
+        super().end_frame()
+
+    def _create(self, shape):
+        x, y, image = shape
+        return self.canvas.create_image(x, y, image=image, tags=self.tag)
+
+    def _create_command(self, shape):
+        x, y, image = shape
+        return 'image', (x, y), {'image': image, 'tags': self.tag}
+
+    def _options(self, shape):
+        return {'image': shape[-1]}
@@ -0,0 +1,65 @@
+"""起動時間の計測
+
+モジュールの読み込み、ウィジェットの作成、最初のフレームが描画されるまでの
+時間を記録し、目安の時間（STARTUP_BUDGET）を超えた区間を報告する。
+"""
+import sys
+import time
+from contextlib import contextmanager
+
+# 起動の各区間の目安（秒）。first_frame は読み込み開始からの経過時間
+STARTUP_BUDGET = {
+    'import': 0.25,  # fireworks.py と必須モジュールの読み込み
+    'tk_init': 0.5,  # Tk の初期化（ウィンドウシステムへの接続）
+    'create_widgets': 0.25,  # ウィジェットと描画器の作成
+    'first_frame': 1.5,  # 最初のフレームが描画されるまで
+}
+# 起動時には読み込まないモジュール（使う時点で読み込む）
+LAZY_MODULES = ('numpy', 'argparse', 'json', 'tkinter.messagebox')
+
+
+class StartupTrace:
+    """起動の各区間の時間を記録する
+
+    start は計測の起点（既定は作成した時刻）。区間は phase で、
+    起点からの経過時間は mark で記録する。
+    """
+
+    def __init__(self, start=None, clock=time.perf_counter, budget=STARTUP_BUDGET):
+        self.clock = clock
+        self.start = clock() if start is None else start
+        self.budget = budget
+        self.times = {}  # 区間名 -> 秒
+
+    @contextmanager
+    def phase(self, name):
+        """with 文の中の処理時間を記録"""
+        started = self.clock()
+        try:
+            yield
+        finally:
+            self.times[name] = self.clock() - started
+
+    def mark(self, name):
+        """起点からの経過時間を記録"""
+        self.times[name] = self.clock() - self.start
+
+    def over_budget(self):
+        """目安を超えた (区間名, 秒, 目安) の一覧"""
+        return [(name, seconds, self.budget[name]) for name, seconds in self.times.items()
+                if name in self.budget and seconds > self.budget[name]]
+
+    def report(self):
+        """計測結果の表示用の文字列"""
+        lines = ["起動時間:"]
+        for name, seconds in self.times.items():
+            limit = self.budget.get(name)
+            note = '' if limit is None else f" (目安 {limit * 1000:.0f} ms" + \
+                ('、超過)' if seconds > limit else ')')
+            lines.append(f"  {name:<15} {seconds * 1000:8.1f} ms{note}")
+        return '\n'.join(lines)
+
+
+def loaded_lazy_modules():
+    """読み込み済みの、起動時には読み込まないはずのモジュール"""
+    return [name for name in LAZY_MODULES if name in sys.modules]
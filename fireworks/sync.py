@@ -0,0 +1,168 @@
+"""複数の画面で同じ花火を表示する同期モード
+
+1つのアプリが送信元（authority）になり、ローカルのソケットで待ち受ける。
+送信元は記録ファイルと同じ形式のヘッダ（乱数の種・品質・FPS・パーティクル数の
+上限・爆発パターンの重み）と、13バイトの固定長イベント（打ち上げ・クリック・タイマー操作・品質の
+変更）を受信側（follower）に送る。受信側は同じ種の乱数で同じ物理演算を行い、
+イベントを同じステップで適用するので、花火そのものは送らない。
+
+送信元は1フレーム分のイベントと「このステップまで進んだ」という EVENT_TICK を
+まとめて1回だけ各受信側に送る（受信側1つあたり1秒に約260バイト）。
+受信側は EVENT_TICK のステップより先には進まないので、クリックなどのイベントを
+取りこぼさない。途中から参加した受信側には最初からのイベントを送り、早送りで追いつかせる。
+ソケットは全てノンブロッキングで、Tk の after のループの中で読み書きする。
+"""
+import socket
+
+if __package__:
+    from . import recording
+    from .scheduler import SIMULATION_STEP
+else:
+    import recording
+    from scheduler import SIMULATION_STEP
+
+DEFAULT_PORT = 47800
+MAX_BACKLOG = 4 * 1024 * 1024  # 送りきれないデータがこれを超えた受信側は切断する
+MAX_CATCH_UP_STEPS = 40  # 受信側が遅れているときに1フレームで進める最大ステップ数
+
+
+def parse_address(text, host='127.0.0.1'):
+    """「ホスト:ポート」または「ポート」を (ホスト, ポート) に変換"""
+    if ':' in text:
+        host, text = text.rsplit(':', 1)
+    return host, int(text)
+
+
+class SyncServer:
+    """送信元: 待ち受けて、イベントを全ての受信側に送る"""
+
+    def __init__(self, seed, quality=None, fps=20, particle_budget=None,
+                 port=DEFAULT_PORT, host='127.0.0.1', pattern_weights=None):
+        header = recording.encode_header(seed, quality, fps, particle_budget, pattern_weights)
+        self.listener = socket.create_server((host, port))
+        self.listener.setblocking(False)
+        self.port = self.listener.getsockname()[1]
+        # 途中から参加した受信側に送るため、ヘッダとこれまでのイベントを全て残す
+        self.history = bytearray(header)
+        self.pending = bytearray()  # まだ送っていないイベント
+        self.followers = []  # [ソケット, 送りきれていないデータ]
+        self.last_tick = None
+        self.sent_bytes = 0
+
+    def send(self, tick, kind, a=0, b=0):
+        """イベントを送る（実際の送信は flush でまとめて行う）"""
+        self.pending += recording.encode_event(tick, kind, a, b)
+
+    def flush(self, tick=None):
+        """新しい受信側を受け入れ、溜めたイベントと現在のステップを送る"""
+        self.accept()
+        if tick is not None and tick != self.last_tick:
+            self.pending += recording.encode_event(tick, recording.EVENT_TICK)
+            self.last_tick = tick
+        data = bytes(self.pending)
+        self.pending.clear()
+        self.history += data
+        for follower in self.followers[:]:
+            follower[1] += data
+            self._write(follower)
+
+    def accept(self):
+        """接続してきた受信側にこれまでの記録を送り始める"""
+        while True:
+            try:
+                conn, _ = self.listener.accept()
+            except (BlockingIOError, InterruptedError):
+                return
+            conn.setblocking(False)
+            conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            follower = [conn, bytearray(self.history)]
+            self.followers.append(follower)
+            self._write(follower)
+
+    def _write(self, follower):
+        """送れるだけ送る（受信が追いつかない受信側は切断）"""
+        conn, backlog = follower
+        if not backlog:
+            return
+        try:
+            sent = conn.send(backlog)
+        except (BlockingIOError, InterruptedError):
+            sent = 0
+        except OSError:
+            self._drop(follower)
+            return
+        del backlog[:sent]
+        self.sent_bytes += sent
+        if len(backlog) > MAX_BACKLOG:
+            self._drop(follower)
+
+    def _drop(self, follower):
+        self.followers.remove(follower)
+        follower[0].close()
+
+    def close(self):
+        """全ての受信側を切断して待ち受けをやめる"""
+        for follower in self.followers[:]:
+            self._drop(follower)
+        self.listener.close()
+
+
+class SyncFollower:
+    """受信側: 送信元のイベントを受け取り、再生用の Recording に追加する"""
+
+    def __init__(self, host='127.0.0.1', port=DEFAULT_PORT, timeout=5.0):
+        self.sock = socket.create_connection((host, port), timeout)
+        # 固定部分を読んでから、続く爆発パターンの重みの表を読む
+        header = b''
+        size = recording.HEADER_SIZE
+        while len(header) < size:
+            data = self.sock.recv(size - len(header))
+            if not data:
+                raise ConnectionError(f"同期の送信元が切断しました: {host}:{port}")
+            header += data
+            if len(header) == recording.HEADER_SIZE:
+                size = recording.header_size(header)
+        self.recording = recording.decode_header(header, f"{host}:{port}")
+        self.sock.setblocking(False)
+        self.buffer = bytearray()
+        self.horizon = 0  # このステップより前のイベントは全て受け取った
+        self.connected = True
+        self.received_bytes = len(header)
+
+    def receive(self):
+        """届いたイベントを読み込む（送信元が切断したら False）"""
+        while self.connected:
+            try:
+                data = self.sock.recv(65536)
+            except (BlockingIOError, InterruptedError):
+                break
+            except OSError:
+                data = b''
+            if not data:
+                self.connected = False
+                break
+            self.buffer += data
+            self.received_bytes += len(data)
+        events = recording.decode_events(self.buffer)
+        del self.buffer[:len(events) * recording.EVENT_SIZE]
+        append = self.recording.events.append
+        for event in events:
+            if event[1] == recording.EVENT_TICK:
+                self.horizon = max(self.horizon, event[0])
+            else:
+                append(event)
+        return self.connected
+
+    def steps(self, tick, wanted):
+        """tick から進めてよいステップ数（遅れている場合は多めに進めて追いつく）"""
+        behind = self.horizon - tick
+        if behind <= 0:
+            return 0
+        return min(behind, MAX_CATCH_UP_STEPS, max(wanted, behind // 2))
+
+    def lag(self, tick):
+        """送信元からの遅れ（秒）"""
+        return max(0, self.horizon - tick) * SIMULATION_STEP
+
+    def close(self):
+        self.sock.close()
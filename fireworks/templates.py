@@ -0,0 +1,217 @@
+"""爆発の軌道テンプレート
+
+爆発後のパーティクルの動きは爆発位置からの相対で決まる（角度・輪の速度・
+重力・空気抵抗のみに依存する）。そこで年齢ごとの相対位置・色・大きさの表を
+(パーティクル数, 輪の数, 寿命) または (爆発パターン, 輪の数) ごとに1度だけ
+計算してキャッシュし、実行中の爆発は「爆発位置 + 年齢」だけで表す。
+"""
+import numpy as np
+
+if __package__:
+    from . import culling
+    from .particles import (DRAG, GRAVITY, MAX_TRAIL_LENGTH, changed_colors,
+                            chrysanthemum_layout, draw_particles, particle_sizes,
+                            pattern_arrays, prepare_colors)
+    from .patterns import DEFAULT_PATTERN, compile_pattern
+else:
+    import culling
+    from particles import (DRAG, GRAVITY, MAX_TRAIL_LENGTH, changed_colors,
+                           chrysanthemum_layout, draw_particles, particle_sizes,
+                           pattern_arrays, prepare_colors)
+    from patterns import DEFAULT_PATTERN, compile_pattern
+
+_templates = {}
+
+
+def get_template(num_particles=32, rings=3, lifetime=80):
+    """変化菊のキャッシュ済みのテンプレートを返す（初回のみ計算）"""
+    key = (num_particles, rings, lifetime)
+    template = _templates.get(key)
+    if template is None:
+        angles, speeds, colors, ring = chrysanthemum_layout(num_particles, rings)
+        template = _templates[key] = ExplosionTemplate(
+            np.cos(angles) * speeds, np.sin(angles) * speeds, colors, ring,
+            lifetime + ring * 10)  # 輪によって寿命を変える
+    return template
+
+
+def pattern_template(pattern=DEFAULT_PATTERN, rings=3):
+    """爆発パターンのキャッシュ済みのテンプレートを返す（初回のみ計算）"""
+    key = (pattern, rings)
+    template = _templates.get(key)
+    if template is None:
+        template = _templates[key] = ExplosionTemplate(
+            *pattern_arrays(compile_pattern(pattern, rings)))
+    return template
+
+
+class ExplosionTemplate:
+    """1種類の爆発の、年齢ごとの相対位置・色・大きさの表
+
+    表の形は (年齢, パーティクル)。パーティクルは寿命の長い順に並べてあり、
+    年齢 a で生きているのは先頭 alive_counts[a] 個になる。
+    """
+
+    def __init__(self, vx, vy, colors, ring, max_life):
+        order = np.argsort(-max_life, kind='stable')
+        vx, vy, colors = vx[order], vy[order], colors[order]
+        ring, max_life = ring[order], max_life[order]
+
+        self.duration = int(max_life.max())  # 全パーティクルが消える年齢
+        shape = (self.duration + 1, len(vx))
+        self.dx = np.zeros(shape)
+        self.dy = np.zeros(shape)
+        self.colors = np.zeros(shape, dtype=np.int8)
+        self.colors[0] = colors
+        prepare_colors(np.unique(max_life))
+
+        # Particle.update と同じ順序で1度だけ積分する
+        x = np.zeros(len(vx))
+        y = np.zeros(len(vx))
+        vx = vx.astype(np.float64)
+        vy = vy.astype(np.float64)
+        for age in range(1, self.duration + 1):
+            x += vx
+            y += vy
+            vy += GRAVITY
+            vx *= DRAG
+            self.dx[age] = x
+            self.dy[age] = y
+            self.colors[age] = changed_colors(max_life - age, max_life, colors)
+
+        ages = np.arange(self.duration + 1)[:, None]
+        life = np.maximum(max_life - ages, 0)
+        self.sizes = particle_sizes(life, max_life, ring)
+        self.alive_counts = (max_life > ages).sum(axis=1)
+
+
+class _Burst:
+    """実行中の爆発（爆発位置と年齢だけを持つ）"""
+
+    __slots__ = ('template', 'x', 'y', 'age')
+
+    def __init__(self, template, x, y):
+        self.template = template
+        self.x = x
+        self.y = y
+        self.age = 0
+
+
+class TemplateSystem:
+    """テンプレートの表引きと平行移動だけで爆発を描画するエンジン
+
+    ParticleSystem と同じ burst / alive / update / draw / clear を持つ。
+    パーティクル単位では削除できないため、画面外の判定や上限超過時の削除は
+    爆発単位で行う（上限を超える場合は古い爆発から消す）。
+    """
+
+    def __init__(self, max_trail_length=MAX_TRAIL_LENGTH, bounds=None, budget=None, seed=None):
+        self.bounds = bounds
+        self.budget = budget
+        self.max_trail_length = max_trail_length
+        self.trail_length = max_trail_length  # 描画する軌跡の長さ（品質で短くする）
+        self.sparkle_rate = 0.1  # きらめく確率
+        self.rings = 3  # 以降の爆発の輪の数
+        self.rng = np.random.default_rng(seed)  # きらめきの乱数（種を指定すると再現できる）
+        self.bursts = {}  # 所有者ハンドル -> _Burst
+        self._next_owner = 0
+
+    @property
+    def count(self):
+        """生存パーティクル数"""
+        return sum(int(b.template.alive_counts[b.age]) for b in self.bursts.values())
+
+    def set_level(self, level):
+        """品質設定（QualityLevel）を反映（輪の数は以降の爆発から）"""
+        self.trail_length = min(level.trail_length, self.max_trail_length)
+        self.sparkle_rate = level.sparkle_rate
+        self.rings = level.rings
+
+    def burst(self, x, y, pattern=DEFAULT_PATTERN):
+        """爆発パターンのテンプレートで爆発させ、所有者ハンドルを返す"""
+        template = pattern_template(pattern, self.rings)
+        if self.budget is not None:
+            # 上限を超える分は古い爆発から消す（辞書は追加順なので先頭が最も古い）
+            count = self.count
+            while self.bursts and count + len(template.dx[0]) > self.budget:
+                oldest = next(iter(self.bursts))
+                count -= self.alive(oldest)
+                del self.bursts[oldest]
+        owner = self._next_owner
+        self._next_owner += 1
+        self.bursts[owner] = _Burst(template, x, y)
+        return owner
+
+    def alive(self, owner):
+        """指定した所有者の生存パーティクル数"""
+        burst = self.bursts.get(owner)
+        if burst is None:
+            return 0
+        return int(burst.template.alive_counts[burst.age])
+
+    def update(self):
+        """全ての爆発の年齢を1つ進める"""
+        finished = []
+        for owner, burst in self.bursts.items():
+            burst.age += 1
+            if burst.age >= burst.template.duration or self._gone(burst):
+                finished.append(owner)
+        for owner in finished:
+            del self.bursts[owner]
+
+    def _gone(self, burst):
+        """爆発の全パーティクルが二度と画面に戻らないか"""
+        if self.bounds is None:
+            return False
+        t = burst.template
+        age = burst.age
+        n = int(t.alive_counts[age])
+        # 直前の1ステップの移動量（落下中は軌跡の点の間隔の上限）
+        vx = t.dx[age, :n] - t.dx[age - 1, :n]
+        vy = t.dy[age, :n] - t.dy[age - 1, :n]
+        width, height = self.bounds
+        return bool(culling.cannot_return(t.dx[age, :n] + burst.x, t.dy[age, :n] + burst.y,
+                                          vx, vy, width, height, self.max_trail_length).all())
+
+    def clear(self):
+        """全ての爆発を削除"""
+        self.bursts.clear()
+
+    def draw(self, canvas, alpha=0.0):
+        """全ての爆発を描画（表引き + 平行移動、alpha は補間の進み具合）"""
+        for burst in self.bursts.values():
+            t = burst.template
+            age = burst.age
+            n = int(t.alive_counts[age])
+            if n == 0:
+                continue
+            x = t.dx[age, :n]
+            y = t.dy[age, :n]
+            if alpha:
+                # 次の年齢の行との間を線形補間
+                after = min(age + 1, t.duration)
+                x = x + (t.dx[after, :n] - x) * alpha
+                y = y + (t.dy[after, :n] - y) * alpha
+            x = x + burst.x
+            y = y + burst.y
+            # 軌跡は直前の年齢の行をそのまま使う
+            length = min(age, self.trail_length)
+            rows = slice(age - length, age)
+            shown = slice(None)
+            if self.bounds is not None:
+                # 本体も軌跡の最も古い点も画面外のパーティクルは描かない
+                width, height = self.bounds
+                visible = culling.on_screen(x, y, width, height)
+                if length:
+                    visible |= culling.on_screen(t.dx[age - length, :n] + burst.x,
+                                                 t.dy[age - length, :n] + burst.y, width, height)
+                if not visible.any():
+                    continue
+                if not visible.all():
+                    shown = np.flatnonzero(visible)
+            sparkle = self.rng.random(n) < self.sparkle_rate
+            x, y = x[shown], y[shown]
+            draw_particles(canvas, x, y, t.sizes[age, :n][shown], sparkle[shown],
+                           t.colors[age, :n][shown],
+                           t.dx[rows, :n][:, shown] + burst.x, t.dy[rows, :n][:, shown] + burst.y,
+                           t.colors[rows, :n][:, shown], np.full(len(x), length), range(length))
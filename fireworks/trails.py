@@ -0,0 +1,136 @@
+"""軌跡（尾を引く効果）の履歴を保持するリングバッファ
+
+list.append + list.pop(0) の代わりに、最大長さ分を事前に確保した
+循環バッファへフレームごとに書き込む。描画側は slot() で位置を引き、
+タプルなどを新たに作らずに読み出す。
+"""
+
+
+def ring_slots(head, length, capacity):
+    """古い順に並べたときの各要素のスロット位置を返す
+
+    head は次に書き込むスロット。全要素が同じフレームで書き込まれる
+    一括ストアでは、この並びを全パーティクルで共有できる。
+    """
+    start = head - length
+    return [(start + i) % capacity for i in range(length)]
+
+
+class TrailHistory:
+    """1つの花火・パーティクル用の軌跡履歴"""
+
+    __slots__ = ('capacity', 'xs', 'ys', 'colors', 'head', 'length')
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.xs = [0.0] * capacity
+        self.ys = [0.0] * capacity
+        self.colors = [None] * capacity
+        self.head = 0  # 次に書き込むスロット
+        self.length = 0
+
+    def push(self, x, y, color=None):
+        """位置を追加（満杯なら最も古いものを上書き）"""
+        head = self.head
+        self.xs[head] = x
+        self.ys[head] = y
+        self.colors[head] = color
+        self.head = (head + 1) % self.capacity
+        if self.length < self.capacity:
+            self.length += 1
+
+    def slot(self, i):
+        """古い方から i 番目の要素のスロット位置"""
+        return (self.head - self.length + i) % self.capacity
+
+    def clear(self):
+        """履歴を空にする"""
+        self.head = 0
+        self.length = 0
+
+    def load(self, points):
+        """(x, y) または (x, y, color) の並びから履歴を作り直す"""
+        self.clear()
+        for point in list(points)[-self.capacity:]:
+            self.push(*point)
+
+    def __len__(self):
+        return self.length
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += self.length
+        if not 0 <= i < self.length:
+            raise IndexError("trail index out of range")
+        j = self.slot(i)
+        if self.colors[j] is None:
+            return (self.xs[j], self.ys[j])
+        return (self.xs[j], self.ys[j], self.colors[j])
+
+    def __iter__(self):
+        for i in range(self.length):
+            yield self[i]
+
+
+class TrailBuffer:
+    """一括エンジン用の軌跡履歴（全パーティクル共通のフレーム番号で循環）
+
+    配列の形は (capacity, パーティクル数)。フレームごとに1行を書き込み、
+    各パーティクルは自分の有効長 lengths だけを参照する。
+    """
+
+    def __init__(self, capacity, size):
+        import numpy as np  # 一括エンジン使用時のみ必要
+        self._np = np
+        self.capacity = capacity
+        self.head = 0
+        self.xs = np.zeros((capacity, size), dtype=np.float64)
+        self.ys = np.zeros((capacity, size), dtype=np.float64)
+        self.colors = np.zeros((capacity, size), dtype=np.int8)
+        self.lengths = np.zeros(size, dtype=np.int8)
+
+    def resize(self, size, count):
+        """パーティクル数の上限を変更（先頭 count 個は引き継ぐ）"""
+        np = self._np
+        for name in ('xs', 'ys', 'colors'):
+            old = getattr(self, name)
+            arr = np.zeros((self.capacity, size), dtype=old.dtype)
+            arr[:, :count] = old[:, :count]
+            setattr(self, name, arr)
+        lengths = np.zeros(size, dtype=np.int8)
+        lengths[:count] = self.lengths[:count]
+        self.lengths = lengths
+
+    def reset(self, start, stop):
+        """新しく追加したパーティクルの履歴を空にする"""
+        self.lengths[start:stop] = 0
+
+    def push(self, count, xs, ys, colors):
+        """先頭 count 個のパーティクルの現在位置を1フレーム分書き込む"""
+        head = self.head
+        self.xs[head, :count] = xs
+        self.ys[head, :count] = ys
+        self.colors[head, :count] = colors
+        self.head = (head + 1) % self.capacity
+        lengths = self.lengths[:count]
+        lengths[lengths < self.capacity] += 1
+
+    def compact(self, count, keep):
+        """残すパーティクルを先頭に詰める"""
+        m = int(keep.sum())
+        for arr in (self.xs, self.ys, self.colors):
+            arr[:, :m] = arr[:, :count][:, keep]
+        self.lengths[:m] = self.lengths[:count][keep]
+
+    def slots(self, length):
+        """長さ length の履歴を古い順に並べたスロット位置"""
+        return ring_slots(self.head, length, self.capacity)
+
+    def oldest(self, count):
+        """先頭 count 個のパーティクルの最も古い点 (x, y, 履歴があるか)"""
+        np = self._np
+        order = np.array(self.slots(self.capacity))
+        lengths = self.lengths[:count].astype(np.int64)
+        rows = order[np.minimum(self.capacity - lengths, self.capacity - 1)]
+        columns = np.arange(count)
+        return self.xs[rows, columns], self.ys[rows, columns], lengths > 0
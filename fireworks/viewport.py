@@ -0,0 +1,106 @@
+"""論理座標からキャンバスの座標への変換
+
+物理演算と打ち上げ位置は常に CANVAS_WIDTH x CANVAS_HEIGHT の論理座標で行い
+（記録・同期・事前描画したショーが画面の大きさに左右されないようにする）、
+描画するときだけキャンバスの大きさに合わせて拡大・縮小する。
+画素数に比例して重くなるラスタ描画では、画素数が RASTER_PIXEL_BUDGET を
+超える場合に低い解像度で描いて整数倍に拡大する。
+"""
+import math
+
+RASTER_PIXEL_BUDGET = 1280 * 720  # ラスタ描画で1フレームに描く画素数の目安
+
+
+def fit(width, height, target_width, target_height):
+    """(width, height) を縦横比を保って (target_width, target_height) に収める (倍率, (x, y))"""
+    scale = min(target_width / width, target_height / height)
+    return scale, ((target_width - width * scale) / 2, (target_height - height * scale) / 2)
+
+
+def raster_zoom(width, height, budget=RASTER_PIXEL_BUDGET):
+    """width x height を描くときの拡大率（内部の解像度は 1/拡大率 になる）"""
+    return max(1, math.ceil(math.sqrt(width * height / budget)))
+
+
+class Layout:
+    """キャンバスの大きさに応じた表示の設定（大きさが変わったときだけ計算し直す）"""
+
+    def __init__(self, world, size, zoom=1):
+        self.world = world  # 論理座標の (幅, 高さ)
+        self.size = size  # キャンバスの (幅, 高さ)
+        self.zoom = zoom  # 描画器の解像度からキャンバスへの拡大率
+        self.scale, self.offset = fit(*world, *size)
+
+    @property
+    def render_size(self):
+        """描画器の解像度"""
+        return (math.ceil(self.size[0] / self.zoom), math.ceil(self.size[1] / self.zoom))
+
+    def to_world(self, x, y):
+        """キャンバスの座標を論理座標に変換（クリック位置など）"""
+        return ((x - self.offset[0]) / self.scale, (y - self.offset[1]) / self.scale)
+
+    def viewport(self, renderer):
+        """論理座標で描くと renderer の解像度に変換して渡す Viewport"""
+        zoom = self.zoom
+        return Viewport(renderer, self.scale / zoom,
+                        (self.offset[0] / zoom, self.offset[1] / zoom))
+
+
+class Viewport:
+    """create_oval / draw_points の座標と半径を拡大・縮小して描画器に渡す
+
+    描画器が draw_points を持たない場合、配列の点は楕円に変換して描く。
+    描画器が scale を持つ場合（SpriteRenderer）は倍率を設定する。
+    """
+
+    def __init__(self, renderer, scale=1.0, offset=(0.0, 0.0)):
+        self.renderer = renderer
+        self.scale = scale
+        self.offset = offset
+        self._fills = {}  # RGB -> 16進表記
+        if hasattr(renderer, 'scale'):
+            # 論理座標の長さ1が何画素になるか（きらめきの外周と本体の半径の差）
+            renderer.scale = scale
+
+    @property
+    def item_count(self):
+        return self.renderer.item_count
+
+    def begin_frame(self):
+        self.renderer.begin_frame()
+
+    def create_oval(self, x0, y0, x1, y1, fill='', outline='', tags=None):
+        s = self.scale
+        ox, oy = self.offset
+        return self.renderer.create_oval(x0 * s + ox, y0 * s + oy, x1 * s + ox, y1 * s + oy,
+                                         fill=fill, outline=outline, tags=tags)
+
+    def draw_points(self, x, y, radius, colors):
+        import numpy as np  # 配列で描くエンジンの使用時のみ必要
+
+        s = self.scale
+        ox, oy = self.offset
+        x = np.asarray(x) * s + ox
+        y = np.asarray(y) * s + oy
+        radius = np.asarray(radius) * s
+        draw_points = getattr(self.renderer, 'draw_points', None)
+        if draw_points is not None:
+            draw_points(x, y, radius, colors)
+            return
+        radius = np.broadcast_to(radius, x.shape)
+        colors = np.broadcast_to(colors, x.shape + (3,))
+        fills = self._fills
+        create_oval = self.renderer.create_oval
+        for px, py, r, color in zip(x.tolist(), y.tolist(), radius.tolist(),
+                                    map(tuple, colors.astype(int).tolist())):
+            fill = fills.get(color)
+            if fill is None:
+                fill = fills[color] = '#%02x%02x%02x' % color
+            create_oval(px - r, py - r, px + r, py + r, fill=fill, outline='', tags='firework')
+
+    def end_frame(self):
+        self.renderer.end_frame()
+
+    def clear(self):
+        self.renderer.clear()
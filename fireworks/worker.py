@@ -0,0 +1,310 @@
+"""別プロセスでの物理演算
+
+花火（打ち上げ・爆発・パーティクル）のシミュレーションと描画する点の計算を
+別プロセスで行い、結果の点（位置・大きさ・色）を共有メモリに書き込む。
+Tk のプロセスは最新の完成したフレームを読み出して描くだけになるので、
+物理演算と描画が別々のコアで並行して動く。
+
+共有メモリは2面のバッファで、書き込み側は使っていない面に書いてから
+世代番号を進める。各面には書き込み中は奇数になる通番（シーケンスロック）があり、
+読み出し側は読む前後で通番が変わっていないことを確かめる。
+打ち上げ・ステップ・クリアの指示はキューで送る。
+"""
+import multiprocessing
+import queue
+import random
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+
+if __package__:
+    from . import palette
+    from .quality import QualityLevel
+else:
+    import palette
+    from quality import QualityLevel
+
+MAX_POINTS = 65536  # 1フレームで共有できる点の数（超えた分は描かない）
+
+# ヘッダ（int64）: [世代番号, 面0の (通番, 点数, フレーム, 花火数, パーティクル数), 面1の ...]
+_SLOT_FIELDS = 5
+_HEADER_SIZE = 1 + 2 * _SLOT_FIELDS
+
+
+class FrameBuffer:
+    """描画する点を受け渡す2面の共有メモリ
+
+    create=True で新しく確保し、他方のプロセスでは name を指定して開く。
+    """
+
+    def __init__(self, capacity=MAX_POINTS, name=None, create=True):
+        self.capacity = capacity
+        point_bytes = 4 * 3 + 3  # x, y, 半径（float32）と RGB（uint8）
+        size = _HEADER_SIZE * 8 + 2 * capacity * point_bytes
+        self.shm = shared_memory.SharedMemory(name=name, create=create, size=size)
+        self.name = self.shm.name
+        # 破棄は確保した側が close で行う。spawn で起動した側は確保した側と同じ
+        # resource_tracker を使うので、開いた側の登録は同じ名前の重複で無害
+        self._owner = create
+        buf = self.shm.buf
+        self.header = np.ndarray(_HEADER_SIZE, dtype=np.int64, buffer=buf)
+        if create:
+            self.header[:] = 0
+        self.slots = []
+        offset = _HEADER_SIZE * 8
+        for _ in range(2):
+            arrays = {}
+            for field in ('x', 'y', 'radius'):
+                arrays[field] = np.ndarray(capacity, dtype=np.float32, buffer=buf, offset=offset)
+                offset += capacity * 4
+            arrays['rgb'] = np.ndarray((capacity, 3), dtype=np.uint8, buffer=buf, offset=offset)
+            offset += capacity * 3
+            self.slots.append(arrays)
+
+    def _meta(self, slot):
+        start = 1 + slot * _SLOT_FIELDS
+        return self.header[start:start + _SLOT_FIELDS]
+
+    def publish(self, frame, fireworks, particles, x, y, radius, rgb):
+        """1フレーム分の点を書き込んで公開する（書き込み側のプロセスのみ）"""
+        generation = int(self.header[0]) + 1
+        slot = generation % 2
+        meta = self._meta(slot)
+        arrays = self.slots[slot]
+        n = min(len(x), self.capacity)
+        meta[0] += 1  # 書き込み中（奇数）
+        arrays['x'][:n] = x[:n]
+        arrays['y'][:n] = y[:n]
+        arrays['radius'][:n] = radius[:n]
+        arrays['rgb'][:n] = rgb[:n]
+        meta[1:] = (n, frame, fireworks, particles)
+        meta[0] += 1  # 書き込み完了（偶数）
+        self.header[0] = generation
+
+    def read(self):
+        """最新の完成したフレーム (フレーム, 花火数, パーティクル数, x, y, 半径, RGB) の複製
+
+        まだ何も公開されていない場合は None を返す。
+        """
+        while True:
+            generation = int(self.header[0])
+            if generation == 0:
+                return None
+            slot = generation % 2
+            meta = self._meta(slot)
+            before = int(meta[0])
+            if before % 2:
+                continue  # 書き込み途中の面を読もうとした（すぐに次の世代が公開される）
+            n, frame, fireworks, particles = (int(v) for v in meta[1:])
+            arrays = self.slots[slot]
+            points = tuple(arrays[field][:n].copy() for field in ('x', 'y', 'radius', 'rgb'))
+            if int(meta[0]) == before:
+                return (frame, fireworks, particles) + points
+
+    def close(self):
+        """共有メモリを閉じる（確保した側では破棄も行う）"""
+        self.header = None
+        self.slots = []
+        self.shm.close()
+        if self._owner:
+            self.shm.unlink()
+
+
+class PointRecorder:
+    """create_oval / draw_points で描かれた点を配列に集めるキャンバスの代わり"""
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        self._ovals = []  # (x, y, 半径, R, G, B)
+        self._batches = []  # (x, y, 半径, RGB) の配列
+
+    def create_oval(self, x0, y0, x1, y1, fill='', outline='', tags=None):
+        r, g, b = palette.rgb(fill)
+        self._ovals.append(((x0 + x1) / 2, (y0 + y1) / 2, (x1 - x0) / 2, r, g, b))
+
+    def draw_points(self, x, y, radius, colors):
+        n = len(x)
+        self._batches.append((np.asarray(x), np.asarray(y),
+                              np.broadcast_to(np.asarray(radius, dtype=np.float32), (n,)),
+                              np.asarray(colors)))
+
+    def points(self):
+        """集めた点の (x, y, 半径, RGB) 配列"""
+        batches = list(self._batches)
+        if self._ovals:
+            ovals = np.array(self._ovals)
+            batches.insert(0, (ovals[:, 0], ovals[:, 1], ovals[:, 2], ovals[:, 3:]))
+        if not batches:
+            empty = np.zeros(0, dtype=np.float32)
+            return empty, empty, empty, np.zeros((0, 3), dtype=np.uint8)
+        return (np.concatenate([b[0] for b in batches]).astype(np.float32),
+                np.concatenate([b[1] for b in batches]).astype(np.float32),
+                np.concatenate([b[2] for b in batches]).astype(np.float32),
+                np.minimum(np.concatenate([b[3] for b in batches]), 255).astype(np.uint8))
+
+
+def _run(name, capacity, commands, bounds, budget, seed):
+    """物理演算プロセスの本体"""
+    if __package__:
+        from .fireworks import FireworkPool
+        from .particles import ParticleSystem
+    else:
+        from fireworks import FireworkPool
+        from particles import ParticleSystem
+
+    buffer = FrameBuffer(capacity, name=name, create=False)
+    system = ParticleSystem(bounds=bounds, budget=budget, seed=seed)
+    rng = random.Random(seed)  # 花火の色の乱数
+    recorder = PointRecorder()
+    fireworks = []
+    pool = FireworkPool()
+    level = None
+    frame = 0
+    running = True
+    try:
+        while running:
+            # 溜まっている指示をまとめて処理し、描画は1回だけ行う
+            pending = [commands.get()]
+            while True:
+                try:
+                    pending.append(commands.get_nowait())
+                except queue.Empty:
+                    break
+            steps = 0
+            for command in pending:
+                kind = command[0]
+                if kind == 'launch':
+                    _, x, start_y, target_y, pattern = command
+                    fireworks.append(pool.firework(x, start_y, target_y, system, level, bounds,
+                                                   rng, pattern=pattern))
+                elif kind == 'step':
+                    for _ in range(command[1]):
+                        system.update()
+                        pool.step(fireworks)
+                        frame += 1
+                    steps += command[1]
+                elif kind == 'level':
+                    level = QualityLevel(*command[1:], launch_interval=None)
+                    system.set_level(level)
+                elif kind == 'clear':
+                    for firework in fireworks:
+                        pool.release(firework)
+                    fireworks.clear()
+                    system.clear()
+                    steps += 1  # 空のフレームを公開する
+                elif kind == 'stop':
+                    running = False
+            if steps and running:
+                recorder.clear()
+                for firework in fireworks:
+                    firework.draw(recorder)
+                system.draw(recorder)
+                buffer.publish(frame, len(fireworks), system.count, *recorder.points())
+    finally:
+        buffer.close()
+
+
+class PhysicsWorker:
+    """物理演算プロセスを起動して指示を送り、最新のフレームを描画する
+
+    パーティクルエンジンと同じく count を持ち、draw(canvas) で描画できる。
+    """
+
+    def __init__(self, bounds, budget=None, capacity=MAX_POINTS, seed=None):
+        # Tk を初期化したプロセスを fork しないよう spawn で起動する
+        context = multiprocessing.get_context('spawn')
+        self.buffer = FrameBuffer(capacity)
+        self.commands = context.Queue()
+        self.process = context.Process(
+            target=_run, args=(self.buffer.name, capacity, self.commands, bounds, budget, seed),
+            daemon=True)
+        self.process.start()
+        self.frame = None  # 最後に読み出したフレーム
+        self.sent_steps = 0  # これまでに指示した物理ステップ数
+        self._fills = {}  # RGB -> 16進表記
+
+    @property
+    def frame_number(self):
+        """最後に読み出したフレームの番号（まだない場合は -1）"""
+        return -1 if self.frame is None else self.frame[0]
+
+    @property
+    def fireworks(self):
+        """最後に読み出したフレームの花火数"""
+        return 0 if self.frame is None else self.frame[1]
+
+    @property
+    def count(self):
+        """最後に読み出したフレームの生存パーティクル数"""
+        return 0 if self.frame is None else self.frame[2]
+
+    def launch(self, x, start_y, target_y, pattern='peony'):
+        """花火の打ち上げを指示"""
+        self.commands.put(('launch', x, start_y, target_y, pattern))
+
+    def step(self, steps=1):
+        """物理演算を進めるよう指示"""
+        self.commands.put(('step', steps))
+        self.sent_steps += steps
+
+    def set_level(self, level):
+        """品質設定（QualityLevel）を送る"""
+        self.commands.put(('level', level.trail_length, level.rings, level.sparkle_rate))
+
+    def clear(self):
+        """全ての花火を削除するよう指示"""
+        self.commands.put(('clear',))
+
+    def poll(self):
+        """最新の完成したフレームを読み出す（新しいフレームがなければ前のまま）"""
+        frame = self.buffer.read()
+        if frame is not None:
+            self.frame = frame
+        return self.frame
+
+    def sync(self, timeout=5.0):
+        """指示した全てのステップが公開されるまで待つ（計測・テスト用）
+
+        間に合えば True、timeout 秒を過ぎたら False を返す。
+        """
+        deadline = time.monotonic() + timeout
+        while self.poll() is None or self.frame_number < self.sent_steps:
+            if time.monotonic() > deadline:
+                return False
+            time.sleep(0.001)
+        return True
+
+    def draw(self, canvas):
+        """最新のフレームの点を描画"""
+        frame = self.poll()
+        if frame is None:
+            return
+        x, y, radius, rgb = frame[3:]
+        draw_points = getattr(canvas, 'draw_points', None)
+        if draw_points is not None:
+            draw_points(x, y, radius, rgb)
+            return
+        fills = self._fills
+        create_oval = canvas.create_oval
+        for px, py, r, color in zip(x.tolist(), y.tolist(), radius.tolist(),
+                                    map(tuple, rgb.tolist())):
+            fill = fills.get(color)
+            if fill is None:
+                fill = fills[color] = '#%02x%02x%02x' % color
+            create_oval(px - r, py - r, px + r, py + r, fill=fill, outline='', tags='firework')
+
+    def close(self):
+        """物理演算プロセスを終了して共有メモリを破棄"""
+        if self.process is None:
+            return
+        self.commands.put(('stop',))
+        self.process.join(timeout=2)
+        if self.process.is_alive():
+            self.process.terminate()
+            self.process.join()
+        self.process = None
+        self.commands.close()
+        self.buffer.close()
@@ -3,10 +3,47 @@ import tkinter as tk
 from unittest.mock import Mock, patch, MagicMock
 import sys
 import os
+import math
+import random
+import tempfile
+import time
+import io
+from argparse import ArgumentTypeError
 
 # fireworksモジュールをインポート
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
-from fireworks.fireworks import Firework, Particle, TimerDialog, CanvasAnimationApp
+from fireworks.fireworks import (SEED_LIMIT, CanvasAnimationApp, Firework, FireworkPool,
+                                 Particle, TimerDialog, main, parse_seed,
+                                 parse_size)
+from fireworks.render import CanvasItemPool, CommandBatch
+from fireworks.trails import TrailHistory, ring_slots
+from fireworks.palette import color_schedule, fade_color, resolve, stage_color
+from fireworks.metrics import FrameMetrics, MetricsLog
+from fireworks.scheduler import SIMULATION_STEP, FrameScheduler
+from fireworks.quality import QUALITY_LEVELS, QualityGovernor
+from fireworks.culling import cannot_return, on_screen
+from fireworks.recording import (EVENT_CLICK, EVENT_LAUNCH, EVENT_SIZE, EVENT_TIMER_START,
+                                 EventRecorder, HEADER_SIZE, Replay, encode_header,
+                                 load_recording)
+from fireworks.showcache import ShowCache, decode_frame, encode_frame, render_show
+from fireworks.sprites import GlowAtlas, SpriteRenderer, glow_pixels, png_rgba
+from fireworks.startup import STARTUP_BUDGET, StartupTrace
+from fireworks.mirror import FrameFanout, ScaledOutput
+from fireworks.viewport import Layout, Viewport, fit, raster_zoom
+from fireworks.patterns import (DEFAULT_PATTERN, PATTERNS, choose, compile_pattern, mix_weights,
+                                parse_weight)
+from fireworks.sync import SyncFollower, SyncServer
+from benchmarks.headless import HeadlessApp, RecordingCanvas
+from benchmarks.workloads import WORKLOADS, Workload, compare, percentile, run_workload
+
+try:
+    import numpy
+    from fireworks.particles import ParticleSystem, COLORS
+    from fireworks.templates import TemplateSystem, get_template
+    from fireworks.raster import RasterRenderer, dirty_rects
+    from fireworks.worker import FrameBuffer, PhysicsWorker, PointRecorder
+except ImportError:
+    numpy = None
 
 
 class TestFirework(unittest.TestCase):
@@ -721,7 +758,11 @@ class TestAnimationAndTimer(unittest.TestCase):
         # 自動花火発射が動作することを確認（next_firework_frameを調整）
         self.app.frame_count = 100
         self.app.next_firework_frame = 100
-        self.app.animate()
+        # 物理演算1ステップ分の時間を進める
+        scheduler = self.app.scheduler
+        with patch.object(scheduler, 'clock', return_value=scheduler.last + scheduler.step):
+            self.app.animate()
+        self.assertEqual(self.app.frame_count, 101)
         
         # 花火が追加されることを確認
         self.assertGreater(len(self.app.fireworks), initial_firework_count)
@@ -820,8 +861,12 @@ class TestAnimationAndTimer(unittest.TestCase):
             # アニメーションループを実行
             self.app.animate()
             
-            # 次のフレームがスケジュールされることを確認
-            mock_after.assert_called_once_with(50, self.app.animate)
+            # 次のフレームが予定時刻（20FPSで50ms後）に合わせてスケジュールされることを確認
+            mock_after.assert_called_once()
+            delay, callback = mock_after.call_args[0]
+            self.assertEqual(callback, self.app.animate)
+            self.assertGreaterEqual(delay, 1)
+            self.assertLessEqual(delay, 50)
     
     def test_update_timer_display_integration(self):
         """タイマー表示の統合テスト"""
@@ -1220,6 +1265,2207 @@ class TestGetCurrentTime(unittest.TestCase):
             self.assertEqual(result, "12:34")
 
 
+@unittest.skipIf(numpy is None, "NumPyがインストールされていません")
+class TestParticleSystem(unittest.TestCase):
+    """ParticleSystem（一括更新エンジン）のテスト"""
+    
+    def setUp(self):
+        """テスト前の準備"""
+        self.system = ParticleSystem(capacity=16)
+    
+    def test_burst_matches_explode(self):
+        """爆発時のパーティクルがFirework.explodeと一致するテスト"""
+        firework = Firework(100, 500, 200)
+        firework.explode()
+        self.system.burst(100, 500)
+        
+        self.assertEqual(self.system.count, len(firework.particles))
+        for i, particle in enumerate(firework.particles):
+            self.assertAlmostEqual(self.system.vx[i], particle.vx)
+            self.assertAlmostEqual(self.system.vy[i], particle.vy)
+            self.assertEqual(self.system.life[i], particle.life)
+            self.assertEqual(COLORS[self.system.color[i]], particle.initial_color)
+    
+    def test_update_matches_particle(self):
+        """物理挙動と色変化がParticle.updateと一致するテスト"""
+        firework = Firework(300, 400, 200)
+        firework.explode()
+        self.system.burst(300, 400)
+        
+        for _ in range(85):
+            firework.update()
+            self.system.update()
+            self.assertEqual(self.system.count, len(firework.particles))
+            for i, particle in enumerate(firework.particles):
+                self.assertAlmostEqual(self.system.x[i], particle.x)
+                self.assertAlmostEqual(self.system.y[i], particle.y)
+                self.assertEqual(self.system.life[i], particle.life)
+                self.assertEqual(resolve(COLORS[self.system.current[i]]), particle.current_color)
+                trail = self.system.trail
+                self.assertEqual(trail.lengths[i], len(particle.trail))
+                oldest = trail.slots(len(particle.trail))[0]
+                self.assertAlmostEqual(trail.xs[oldest, i], particle.trail[0][0])
+                self.assertEqual(resolve(COLORS[trail.colors[oldest, i]]), resolve(particle.trail[0][2]))
+    
+    def test_alive_counts_per_owner(self):
+        """所有者ごとの生存数と寿命による削除のテスト"""
+        first = self.system.burst(100, 300)
+        second = self.system.burst(500, 300)
+        self.assertEqual(self.system.alive(first), 96)
+        self.assertEqual(self.system.alive(second), 96)
+        
+        for _ in range(100):
+            self.system.update()
+        
+        self.assertEqual(self.system.count, 0)
+        self.assertEqual(self.system.alive(first), 0)
+        self.assertEqual(self.system.alive(second), 0)
+    
+    def test_firework_with_system(self):
+        """エンジンを使用した花火のライフサイクルテスト"""
+        firework = Firework(100, 500, 200, self.system)
+        firework.explode()
+        
+        # パーティクルはエンジン側で管理される
+        self.assertEqual(len(firework.particles), 0)
+        self.assertFalse(firework.is_finished())
+        
+        for _ in range(100):
+            self.system.update()
+            firework.update()
+        
+        self.assertTrue(firework.is_finished())
+    
+    def test_draw(self):
+        """一括描画のテスト"""
+        canvas = Mock(spec=['create_oval'])
+        self.system.burst(100, 300)
+        for _ in range(10):
+            self.system.update()
+        
+        self.system.draw(canvas)
+        
+        # 各パーティクルにつき少なくとも1つ描画される
+        self.assertGreaterEqual(canvas.create_oval.call_count, self.system.count)
+    
+    def test_clear(self):
+        """全パーティクル削除のテスト"""
+        self.system.burst(100, 300)
+        self.system.clear()
+        self.assertEqual(self.system.count, 0)
+
+
+class StackingCanvas:
+    """Tk のキャンバスと同じ規則で重なり順だけを再現するキャンバスの代わり"""
+    
+    def __init__(self):
+        self.stack = []  # アイテムID（奥から手前）
+        self.shapes = {}  # アイテムID -> (x0, 色)
+        self.state = {}
+        self.moves = 0
+    
+    def create_oval(self, x0, y0, x1, y1, fill='', outline='', tags=None):
+        item = len(self.shapes) + 1
+        self.stack.append(item)
+        self.shapes[item] = (x0, fill)
+        return item
+    
+    def coords(self, item, x0, y0, x1, y1):
+        self.shapes[item] = (x0, self.shapes[item][1])
+    
+    def itemconfigure(self, item, fill=None, state=None):
+        if fill is not None:
+            self.shapes[item] = (self.shapes[item][0], fill)
+        if state is not None:
+            self.state[item] = state
+    
+    def tag_raise(self, item, above):
+        self.moves += 1
+        self.stack.remove(item)
+        self.stack.insert(self.stack.index(above) + 1, item)
+    
+    def tag_lower(self, item, below):
+        self.moves += 1
+        self.stack.remove(item)
+        self.stack.insert(self.stack.index(below), item)
+    
+    def delete(self, *items):
+        for item in items:
+            self.stack.remove(item)
+
+
+class TestCanvasItemPool(unittest.TestCase):
+    """CanvasItemPool（アイテム再利用描画器）のテスト"""
+    
+    def setUp(self):
+        """テスト前の準備"""
+        self.canvas = Mock()
+        self.canvas.create_oval.side_effect = range(1, 100000)
+        self.pool = CanvasItemPool(self.canvas, shrink_interval=10, spare=2)
+    
+    def draw_frame(self, count, fill='red', offset=0):
+        """指定数の楕円を1フレーム分描画"""
+        self.pool.begin_frame()
+        for i in range(count):
+            x = i + offset
+            self.pool.create_oval(x, i, x + 2, i + 2, fill=fill, outline='', tags='firework')
+        self.pool.end_frame()
+    
+    def test_items_reused_between_frames(self):
+        """2フレーム目以降はアイテムが再利用されるテスト"""
+        self.draw_frame(5)
+        self.draw_frame(5, offset=1)
+        
+        # 作成は最初の5回だけで、以降はcoordsで移動
+        self.assertEqual(self.canvas.create_oval.call_count, 5)
+        self.assertEqual(self.canvas.coords.call_count, 5)
+        # 色が変わらなければitemconfigureは呼ばれない
+        self.canvas.itemconfigure.assert_not_called()
+        self.canvas.delete.assert_not_called()
+    
+    def test_unchanged_items_untouched(self):
+        """前フレームと同じ楕円のアイテムには触れないテスト"""
+        self.draw_frame(5)
+        self.draw_frame(5)
+        
+        self.canvas.coords.assert_not_called()
+        self.canvas.itemconfigure.assert_not_called()
+        self.assertEqual(self.pool.changed, 0)
+        
+        # 1つだけ動かした場合はそのアイテムだけを動かす
+        self.pool.begin_frame()
+        for i in range(4):
+            self.pool.create_oval(i, i, i + 2, i + 2, fill='red')
+        self.pool.create_oval(50, 50, 52, 52, fill='red')
+        self.pool.end_frame()
+        self.canvas.coords.assert_called_once_with(5, 50, 50, 52, 52)
+        self.assertEqual(self.pool.changed, 1)
+        self.assertEqual(self.pool.visible, 5)
+    
+    def test_fill_change_updates_item(self):
+        """色が変わった場合のみitemconfigureされるテスト"""
+        self.draw_frame(3, fill='red')
+        self.draw_frame(3, fill='blue')
+        
+        self.assertEqual(self.canvas.itemconfigure.call_count, 3)
+        self.canvas.itemconfigure.assert_called_with(3, fill='blue')
+    
+    def test_unused_items_hidden_and_shown(self):
+        """使わなかったアイテムは隠され、再利用時に表示されるテスト"""
+        self.draw_frame(5)
+        self.draw_frame(2)
+        
+        self.canvas.itemconfigure.assert_any_call(3, state='hidden')
+        self.canvas.itemconfigure.assert_any_call(5, state='hidden')
+        self.assertEqual(self.pool.visible, 2)
+        
+        self.canvas.itemconfigure.reset_mock()
+        self.draw_frame(3)
+        self.canvas.itemconfigure.assert_called_once_with(3, fill='red', state='normal')
+    
+    def test_pool_grows_and_shrinks(self):
+        """生存数に応じてプールが伸縮するテスト"""
+        self.draw_frame(50)
+        self.assertEqual(len(self.pool.items), 50)
+        
+        for _ in range(20):
+            self.draw_frame(3)
+        
+        # 最大使用数+予備まで縮小される
+        self.assertEqual(len(self.pool.items), 5)
+        self.canvas.delete.assert_called_once()
+    
+    def test_clear(self):
+        """全アイテム削除のテスト"""
+        self.draw_frame(5)
+        self.pool.clear()
+        
+        self.canvas.delete.assert_called_once_with('firework')
+        self.assertEqual(len(self.pool.items), 0)
+        
+        self.draw_frame(1)
+        self.assertEqual(self.canvas.create_oval.call_count, 6)
+    
+    def test_draw_order_kept(self):
+        """アイテムの重なり順が create_oval の呼び出し順になるテスト"""
+        canvas = StackingCanvas()
+        pool = CanvasItemPool(canvas)
+        
+        def frame(shapes):
+            pool.begin_frame()
+            for x, fill in shapes:
+                pool.create_oval(x, 0, x + 4, 4, fill=fill)
+            pool.end_frame()
+            items = [item for item in canvas.stack if canvas.state.get(item) != 'hidden']
+            self.assertEqual([canvas.shapes[item] for item in items],
+                             [(x, fill) for x, fill in shapes])
+        
+        frame([(10, 'red'), (20, 'red'), (30, 'red')])
+        # きらめき: 白い外周の後に本体を描く（本体に古いアイテムが割り当てられても隠れない）
+        frame([(20, 'red'), (30, 'red'), (40, 'white'), (40, 'blue')])
+        frame([(40, 'white'), (40, 'blue'), (10, 'red')])
+        
+        rng = random.Random(3)
+        shapes = [(x, fill) for x in range(0, 60, 5) for fill in ('red', 'white')]
+        for _ in range(40):
+            frame(rng.sample(shapes, rng.randint(1, 12)))
+        
+        # 並び順が変わらなければ重なり順を直す操作は送らない
+        canvas = StackingCanvas()
+        pool = CanvasItemPool(canvas)
+        frame([(5, 'red'), (10, 'red'), (15, 'red')])
+        frame([(5, 'red'), (10, 'red'), (15, 'red'), (20, 'white')])
+        frame([(10, 'red'), (15, 'red'), (20, 'white')])
+        self.assertEqual(canvas.moves, 0)
+
+
+class TestTrailHistory(unittest.TestCase):
+    """TrailHistory（軌跡のリングバッファ）のテスト"""
+    
+    def test_push_within_capacity(self):
+        """容量以内の追加テスト"""
+        trail = TrailHistory(4)
+        trail.push(1, 2, 'red')
+        trail.push(3, 4, 'blue')
+        
+        self.assertEqual(len(trail), 2)
+        self.assertEqual(list(trail), [(1, 2, 'red'), (3, 4, 'blue')])
+    
+    def test_push_overwrites_oldest(self):
+        """容量を超えると最も古い点が上書きされるテスト"""
+        trail = TrailHistory(3)
+        for i in range(5):
+            trail.push(i, i * 10)
+        
+        self.assertEqual(len(trail), 3)
+        self.assertEqual(list(trail), [(2, 20), (3, 30), (4, 40)])
+        self.assertEqual(trail[-1], (4, 40))
+        # 古い順のスロット位置で直接読み出せる
+        self.assertEqual([trail.xs[trail.slot(i)] for i in range(3)], [2, 3, 4])
+    
+    def test_load_and_clear(self):
+        """一覧からの読み込みとクリアのテスト"""
+        trail = TrailHistory(2)
+        trail.load([(1, 1, 'red'), (2, 2, 'gold'), (3, 3, 'blue')])
+        self.assertEqual(list(trail), [(2, 2, 'gold'), (3, 3, 'blue')])
+        
+        trail.clear()
+        self.assertEqual(len(trail), 0)
+        with self.assertRaises(IndexError):
+            trail[0]
+    
+    def test_ring_slots(self):
+        """共通スロット順のテスト"""
+        self.assertEqual(ring_slots(1, 3, 4), [2, 3, 0])
+        self.assertEqual(ring_slots(3, 3, 4), [0, 1, 2])
+    
+    def test_particle_trail_limited(self):
+        """パーティクルの軌跡が最大長さで頭打ちになるテスト"""
+        particle = Particle(100, 200, 0, 5, 'red', 1)
+        for _ in range(20):
+            particle.update()
+        
+        self.assertEqual(len(particle.trail), particle.max_trail_length)
+        # 最新の点が最後に並ぶ
+        self.assertLess(particle.trail[0][0], particle.trail[-1][0])
+
+
+@unittest.skipIf(numpy is None, "NumPyがインストールされていません")
+class TestExplosionTemplate(unittest.TestCase):
+    """爆発の軌道テンプレートのテスト"""
+    
+    def test_template_cached(self):
+        """同じ配置のテンプレートは1度だけ計算されるテスト"""
+        self.assertIs(get_template(32, 3, 80), get_template(32, 3, 80))
+        self.assertIsNot(get_template(32, 3, 80), get_template(16, 3, 80))
+    
+    def test_template_matches_particles(self):
+        """表引きの位置・色がParticle.updateと一致するテスト"""
+        system = TemplateSystem()
+        handle = system.burst(300, 400)
+        reference = ParticleSystem()
+        reference.burst(300, 400)
+        
+        for _ in range(95):
+            system.update()
+            reference.update()
+            self.assertEqual(system.alive(handle), reference.count)
+            burst = system.bursts[handle]
+            template = burst.template
+            n = reference.count
+            # 寿命の長い順に並んでいるので、座標の組で比較する
+            expected = sorted(zip(numpy.round(reference.x[:n], 6), numpy.round(reference.y[:n], 6),
+                                  reference.current[:n]))
+            actual = sorted(zip(numpy.round(template.dx[burst.age, :n] + 300, 6),
+                                numpy.round(template.dy[burst.age, :n] + 400, 6),
+                                template.colors[burst.age, :n]))
+            self.assertEqual(actual, expected)
+    
+    def test_firework_with_template_system(self):
+        """テンプレートエンジンを使用した花火のライフサイクルテスト"""
+        system = TemplateSystem()
+        firework = Firework(100, 500, 200, system)
+        firework.explode()
+        self.assertEqual(system.count, 96)
+        
+        for _ in range(100):
+            system.update()
+        
+        self.assertTrue(firework.is_finished())
+        self.assertEqual(system.count, 0)
+    
+    def test_draw(self):
+        """表引きによる描画のテスト"""
+        canvas = Mock(spec=['create_oval'])
+        system = TemplateSystem()
+        system.burst(100, 300)
+        for _ in range(10):
+            system.update()
+        
+        system.draw(canvas)
+        
+        self.assertGreaterEqual(canvas.create_oval.call_count, system.count)
+
+
+class TestPalette(unittest.TestCase):
+    """変化菊の色スケジュールのテスト"""
+    
+    def test_resolve(self):
+        """色名が16進表記に変換されるテスト"""
+        self.assertEqual(resolve('red'), '#ff0000')
+        self.assertEqual(resolve('#123456'), '#123456')
+    
+    def test_fade_color(self):
+        """軌跡用の暗めの色のテスト（色名・16進表記の両方から引ける）"""
+        self.assertEqual(fade_color('red'), resolve('darkred'))
+        self.assertEqual(fade_color(resolve('gold')), resolve('orange'))
+        self.assertEqual(fade_color('white'), resolve('white'))
+    
+    def test_schedule_stages(self):
+        """年齢ごとの色が3段階で変化するテスト"""
+        schedule = color_schedule('crimson', 90)
+        self.assertEqual(len(schedule), 91)
+        self.assertEqual(schedule[0], resolve('crimson'))
+        self.assertEqual(schedule[26], resolve('crimson'))  # 第1段階
+        self.assertEqual(schedule[30], resolve('yellow'))  # 第2段階の始まり
+        self.assertEqual(schedule[60], resolve('red'))  # 第3段階の始まり
+        self.assertEqual(schedule[89], resolve('white'))
+        # 同じ寿命・初期色の表は共有される
+        self.assertIs(schedule, color_schedule('crimson', 90))
+    
+    def test_schedule_matches_stage_color(self):
+        """表引きの色が逐次計算と一致するテスト"""
+        for lifetime in (80, 90, 100):
+            schedule = color_schedule('gold', lifetime)
+            for age in range(lifetime + 1):
+                expected = resolve(stage_color('gold', lifetime - age, lifetime))
+                self.assertEqual(schedule[age], expected)
+    
+    def test_particle_uses_schedule(self):
+        """Particle.updateが表引きで色を変えるテスト"""
+        particle = Particle(100, 200, 0, 5, 'purple', 2)
+        for _ in range(50):
+            particle.update()
+        
+        self.assertEqual(particle.current_color, particle.color_schedule[50])
+        self.assertFalse(hasattr(particle, 'color_sequence'))
+
+
+@unittest.skipIf(numpy is None, "NumPyがインストールされていません")
+class TestRasterRenderer(unittest.TestCase):
+    """RasterRenderer（フレームバッファ描画）のテスト"""
+    
+    def setUp(self):
+        """テスト前の準備"""
+        self.canvas = Mock()
+        self.photo = Mock()
+        self.renderer = RasterRenderer(self.canvas, 40, 30, photo=self.photo)
+    
+    def render(self, *ovals):
+        """楕円を1フレーム分描画してフレームバッファを返す"""
+        self.renderer.begin_frame()
+        for x, y, r, fill in ovals:
+            self.renderer.create_oval(x - r, y - r, x + r, y + r, fill=fill, outline='', tags='firework')
+        self.renderer.end_frame()
+        return self.renderer.pixels
+    
+    def test_dot_drawn_in_color(self):
+        """点が指定色で描かれるテスト"""
+        pixels = self.render((10, 12, 2, 'red'))
+        
+        self.assertEqual(tuple(pixels[12, 10]), (255, 0, 0))
+        # 離れた画素は黒のまま
+        self.assertEqual(tuple(pixels[0, 0]), (0, 0, 0))
+    
+    def test_additive_blending(self):
+        """重なった点が加算合成されるテスト"""
+        single = self.render((10, 10, 2, '#400000')).copy()
+        double = self.render((10, 10, 2, '#400000'), (10, 10, 2, '#004000'))
+        
+        self.assertEqual(tuple(single[10, 10]), (64, 0, 0))
+        self.assertEqual(tuple(double[10, 10]), (64, 64, 0))
+        # 明るさは255で飽和する
+        saturated = self.render(*[(10, 10, 2, '#900000')] * 3)
+        self.assertEqual(saturated[10, 10, 0], 255)
+    
+    def test_offscreen_dots_ignored(self):
+        """画面外・縁の点でもエラーにならないテスト"""
+        pixels = self.render((-100, -100, 3, 'white'), (0, 0, 3, 'white'), (39, 29, 16, 'white'))
+        
+        self.assertEqual(tuple(pixels[0, 0]), (255, 255, 255))
+        self.assertEqual(tuple(pixels[29, 39]), (255, 255, 255))
+    
+    def test_frame_blitted_as_single_image(self):
+        """1フレームにつき画像1枚として転送されるテスト"""
+        self.render((10, 10, 2, 'red'))
+        self.render((12, 10, 2, 'red'))
+        
+        # 画像アイテムは最初に1度だけ作られる
+        self.canvas.create_image.assert_called_once()
+        self.canvas.create_oval.assert_not_called()
+        self.assertEqual(self.photo.tk.call.call_count, 2)
+        data = self.photo.tk.call.call_args[0][2]
+        self.assertTrue(data.startswith(b'P6 40 30 255 '))
+        self.assertEqual(len(data), len(b'P6 40 30 255 ') + 40 * 30 * 3)
+    
+    def test_dirty_rects(self):
+        """変化したタイルが矩形にまとめられるテスト"""
+        tiles = numpy.array([[1, 1, 0],
+                             [1, 1, 0],
+                             [0, 0, 1]], dtype=bool)
+        rects = dirty_rects(tiles, 32, 90, 90)
+        self.assertEqual(sorted(rects), [(0, 0, 64, 64), (64, 64, 90, 90)])
+        self.assertEqual(dirty_rects(numpy.zeros((2, 2), dtype=bool), 32, 64, 64), [])
+    
+    def test_only_dirty_tiles_uploaded(self):
+        """変化したタイルだけが画像に転送されるテスト"""
+        renderer = RasterRenderer(self.canvas, 400, 300, photo=self.photo)
+        call = self.photo.tk.call
+        
+        def frame(*ovals):
+            call.reset_mock()
+            renderer.begin_frame()
+            for x, y in ovals:
+                renderer.create_oval(x - 2, y - 2, x + 2, y + 2, fill='red')
+            renderer.end_frame()
+        
+        # 最初のフレームは画像全体
+        frame((10, 10))
+        self.assertEqual(renderer.upload_area, 400 * 300)
+        # 点が動いたタイルだけを転送
+        frame((12, 10))
+        call.assert_called_once()
+        args = call.call_args[0]
+        self.assertTrue(args[2].startswith(b'P6 32 32 255 '))
+        self.assertEqual(args[-3:], ('-to', 0, 0))
+        # 点が消えたタイルは黒で上書き
+        frame()
+        call.assert_called_once()
+        self.assertEqual(renderer.pixels.max(), 0)
+        # 何も変化しなければ転送しない
+        frame()
+        call.assert_not_called()
+        self.assertEqual(renderer.upload_area, 0)
+        # クリア後は画像全体
+        renderer.clear()
+        frame((200, 150))
+        self.assertEqual(renderer.upload_area, 400 * 300)
+    
+    def test_clear(self):
+        """クリア時に画像アイテムが削除されるテスト"""
+        self.render((10, 10, 2, 'red'))
+        self.renderer.clear()
+        
+        self.canvas.delete.assert_called_once_with('firework')
+        self.assertEqual(self.renderer.pixels.max(), 0)
+        
+        self.render((10, 10, 2, 'red'))
+        self.assertEqual(self.canvas.create_image.call_count, 2)
+    
+    def test_particle_system_bulk_draw(self):
+        """一括エンジンの描画が配列のまま渡されるテスト"""
+        renderer = RasterRenderer(self.canvas, 400, 300, photo=self.photo)
+        system = ParticleSystem()
+        system.burst(200, 150)
+        for _ in range(10):
+            system.update()
+        
+        with patch.object(renderer, 'create_oval') as mock_create_oval:
+            renderer.begin_frame()
+            system.draw(renderer)
+            renderer.end_frame()
+            mock_create_oval.assert_not_called()
+        
+        self.assertGreater(renderer.pixels.max(), 0)
+
+
+class TestBenchmarks(unittest.TestCase):
+    """ベンチマーク（ウィンドウなしの計測）のテスト"""
+    
+    def test_headless_app_animate(self):
+        """ウィンドウなしでanimateが動作するテスト"""
+        app = HeadlessApp()
+        app.is_running = True
+        app.launch_firework(600, 600)
+        
+        for _ in range(20):
+            app.animate()
+        
+        self.assertEqual(app.frame_count, 20)
+        self.assertTrue(app.fireworks[0].exploded)
+        self.assertGreater(app.canvas.counts['create_oval'], 0)
+    
+    def test_run_workload(self):
+        """ワークロードの計測結果のテスト"""
+        workload = Workload('tiny', 30, launches=lambda frame: [(600, 600)] if frame == 0 else ())
+        result = run_workload(workload)
+        
+        self.assertEqual(result['frames'], 30)
+        self.assertGreater(result['peak_particles'], 0)
+        self.assertGreater(result['particles_per_sec'], 0)
+        self.assertLessEqual(result['frame_ms']['p50'], result['frame_ms']['p99'])
+        self.assertGreater(result['canvas_ops_per_frame']['mean'], 0)
+        self.assertEqual(result['upload_px_per_frame']['max'], 0)
+    
+    @unittest.skipIf(numpy is None, "NumPyがインストールされていません")
+    def test_raster_workload_counts_uploads(self):
+        """raster の画像への転送を操作数と転送量として数えるテスト"""
+        workload = Workload('tiny', 30, launches=lambda frame: [(600, 600)] if frame == 0 else ())
+        result = run_workload(workload, renderer='raster')
+        
+        self.assertGreater(result['canvas_ops_per_frame']['mean'], 0)
+        self.assertGreater(result['tcl_calls_per_frame']['mean'], 0)
+        # 最初のフレームは画像全体を転送する
+        self.assertEqual(result['upload_px_per_frame']['max'], 1200 * 700)
+    
+    def test_standard_workloads(self):
+        """標準ワークロードが揃っているテスト"""
+        self.assertEqual(set(WORKLOADS), {'single_shell', 'steady_break', 'finale_burst', 'stress'})
+    
+    def test_percentile(self):
+        """パーセンタイルのテスト"""
+        values = list(range(1, 101))
+        self.assertEqual(percentile(values, 50), 50)
+        self.assertEqual(percentile(values, 99), 99)
+        self.assertEqual(percentile([], 50), 0.0)
+    
+    def test_compare_detects_regression(self):
+        """ベースラインとの比較で悪化を検出するテスト"""
+        def result(p95, ops, rate):
+            return {'workloads': {'stress': {
+                'frame_ms': {'p95': p95, 'p99': p95},
+                'canvas_ops_per_frame': {'mean': ops},
+                'particles_per_sec': rate,
+            }}}
+        baseline = result(20.0, 1000, 50000)
+        
+        self.assertEqual(compare(baseline, result(21.0, 1000, 50000)), [])
+        self.assertEqual(len(compare(baseline, result(40.0, 1000, 50000))), 2)
+        self.assertEqual(len(compare(baseline, result(20.0, 2000, 20000))), 2)
+        # ごく短いフレーム時間の差は誤差として無視する
+        self.assertEqual(compare(result(0.5, 10, 100), result(0.9, 10, 100)), [])
+
+
+
+class TestFrameMetrics(unittest.TestCase):
+    """フレーム計測のテスト"""
+    
+    def test_summary(self):
+        """集計値のテスト"""
+        metrics = FrameMetrics(window=3)
+        self.assertEqual(metrics.summary()['fps'], 0.0)
+        
+        for i in range(4):
+            metrics.record(i * 0.05, 0.002, 0.004 * (i + 1), 0.001, 2, 100, 50)
+        summary = metrics.summary()
+        
+        # 古いフレームは窓から外れる
+        self.assertEqual(summary['frames'], 4)
+        self.assertAlmostEqual(summary['fps'], 20.0)
+        self.assertAlmostEqual(summary['update_ms'], 2.0)
+        self.assertAlmostEqual(summary['draw_ms'], 12.0)
+        self.assertAlmostEqual(summary['draw_max_ms'], 16.0)
+        self.assertEqual(summary['particles'], 100)
+        self.assertIn('FPS 20.0', metrics.overlay_text())
+    
+    def test_metrics_log(self):
+        """一定間隔でJSON Linesに追記されるテスト"""
+        import json
+        import tempfile
+        now = [0.0]
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'metrics.jsonl')
+            log = MetricsLog(path, interval=1.0, clock=lambda: now[0])
+            metrics = FrameMetrics()
+            metrics.record(0.0, 0.001, 0.002, 0.0, 1, 10, 5)
+            
+            self.assertFalse(log.maybe_write(metrics))
+            now[0] = 0.5
+            self.assertFalse(log.maybe_write(metrics))
+            now[0] = 1.0
+            self.assertTrue(log.maybe_write(metrics))
+            now[0] = 2.5
+            self.assertTrue(log.maybe_write(metrics))
+            
+            with open(path, encoding='utf-8') as f:
+                records = [json.loads(line) for line in f]
+        self.assertEqual(len(records), 2)
+        self.assertEqual(records[0]['items'], 5)
+    
+    def test_animate_records_metrics(self):
+        """animateがフレームごとに計測するテスト"""
+        app = HeadlessApp()
+        app.is_running = True
+        app.launch_firework(600, 600)
+        
+        for _ in range(10):
+            app.animate()
+        
+        summary = app.metrics.summary()
+        self.assertEqual(summary['frames'], 10)
+        self.assertEqual(summary['fireworks'], 1)
+        self.assertGreater(summary['particles'], 0)
+        self.assertEqual(summary['items'], app.renderer.item_count)
+        self.assertGreater(summary['items'], 0)
+    
+    def test_overlay_toggle(self):
+        """計測オーバーレイの表示切り替えテスト"""
+        app = HeadlessApp(metrics_overlay=True)
+        app.is_running = True
+        app.animate()
+        self.assertIsNotNone(app.metrics_item)
+        self.assertEqual(app.canvas.counts['create_text'], 1)
+        
+        app.toggle_metrics_overlay()
+        self.assertFalse(app.show_metrics)
+        self.assertIsNone(app.metrics_item)
+        for _ in range(20):
+            app.animate()
+        self.assertEqual(app.canvas.counts['create_text'], 1)
+
+
+
+class TestFrameScheduler(unittest.TestCase):
+    """固定ステップのフレームスケジューラのテスト"""
+    
+    def setUp(self):
+        self.now = 0.0
+        self.scheduler = FrameScheduler(fps=20, clock=lambda: self.now)
+    
+    def test_first_frame_runs_one_step(self):
+        """最初のフレームで1ステップ進むテスト"""
+        self.assertEqual(self.scheduler.begin_frame(), 1)
+        self.assertEqual(self.scheduler.end_frame(), 50)
+    
+    def test_steps_follow_elapsed_time(self):
+        """経過時間に応じたステップ数になるテスト"""
+        self.scheduler.begin_frame()
+        self.now = 0.12
+        self.assertEqual(self.scheduler.begin_frame(), 2)
+        self.assertAlmostEqual(self.scheduler.alpha, 0.4)
+        self.now = 0.13
+        self.assertEqual(self.scheduler.begin_frame(), 0)
+        self.now = 0.15
+        self.assertEqual(self.scheduler.begin_frame(), 1)
+    
+    def test_drops_steps_when_far_behind(self):
+        """大きく遅れた場合は追いつける分だけ実行するテスト"""
+        self.scheduler.begin_frame()
+        self.now = 2.0
+        self.assertEqual(self.scheduler.begin_frame(), self.scheduler.max_steps)
+        self.assertGreater(self.scheduler.dropped_steps, 0)
+        self.assertEqual(self.scheduler.alpha, 0.0)
+    
+    def test_delay_compensates_frame_time(self):
+        """フレームの処理時間を差し引いて次のフレームを予約するテスト"""
+        self.scheduler.begin_frame()
+        self.now = 0.02  # 20msかかったフレーム
+        self.assertEqual(self.scheduler.end_frame(), 30)
+        # 予定時刻を過ぎたフレームは飛ばし、遅れている分はすぐに実行する
+        self.now = 0.23
+        self.scheduler.begin_frame()
+        self.assertEqual(self.scheduler.end_frame(), 1)
+        self.assertEqual(self.scheduler.skipped_frames, 2)
+        self.assertAlmostEqual(self.scheduler.next_frame, 0.20)
+        # 次の予定時刻は周期どおり
+        self.now = 0.235
+        self.assertEqual(self.scheduler.end_frame(), 15)
+    
+    def test_higher_fps(self):
+        """60FPSでは描画3回につき物理演算が1ステップ進むテスト"""
+        scheduler = FrameScheduler(fps=60, clock=lambda: self.now)
+        steps = scheduler.begin_frame()
+        scheduler.end_frame()
+        for i in range(1, 7):
+            self.now = i / 60
+            steps += scheduler.begin_frame()
+            scheduler.end_frame()
+        self.assertEqual(steps, 3)
+    
+    def test_interpolated_render(self):
+        """補間時は速度に沿って描画位置がずれるテスト"""
+        particle = Particle(100, 100, 0, 4, 'gold')
+        canvas = Mock(spec=['create_oval'])
+        with patch('random.random', return_value=0.5):
+            particle.draw(canvas, 0.5)
+        x0, y0, x1, y1 = canvas.create_oval.call_args[0]
+        self.assertAlmostEqual((x0 + x1) / 2, 102)
+        self.assertAlmostEqual((y0 + y1) / 2, 100)
+    
+    def test_app_stops_scheduler(self):
+        """停止後の再開で計時をやり直すテスト"""
+        app = HeadlessApp(fps=60)
+        app.is_running = True
+        app.animate()
+        self.assertTrue(app.scheduler.running)
+        app.stop_animation()
+        self.assertFalse(app.scheduler.running)
+
+
+
+class TestDeadlineTimer(unittest.TestCase):
+    """終了予定時刻から残り時間を求めるタイマーのテスト"""
+    
+    def setUp(self):
+        self.app = HeadlessApp()
+        self.app.is_running = True
+        self.app.timer_seconds = 600
+        self.app.remaining_seconds = 600
+        self.app.timer_deadline = 100.0 + 600
+    
+    def update_at(self, now):
+        """指定した単調時計の時刻でタイマーを更新し、次の待ち時間を返す"""
+        with patch('time.monotonic', return_value=now):
+            with patch.object(self.app, 'after') as mock_after:
+                self.app.update_timer()
+        if not mock_after.called:
+            return None
+        delay, callback = mock_after.call_args[0]
+        self.assertEqual(callback, self.app.update_timer)
+        return delay
+    
+    def test_updates_on_second_boundaries(self):
+        """秒の境目に合わせて次の更新を予約するテスト"""
+        self.assertEqual(self.update_at(100.2), 800)
+        self.assertEqual(self.app.remaining_seconds, 600)
+        self.assertEqual(self.app.timer_var.get(), "残り時間: 10:00")
+        
+        self.assertEqual(self.update_at(101.0), 1000)
+        self.assertEqual(self.app.remaining_seconds, 599)
+    
+    def test_catches_up_after_stall(self):
+        """処理が止まっていても残り時間がすぐに追いつくテスト"""
+        self.assertEqual(self.update_at(107.5), 500)
+        self.assertEqual(self.app.remaining_seconds, 593)
+        self.assertEqual(self.app.timer_var.get(), "残り時間: 09:53")
+    
+    def test_finishes_at_deadline(self):
+        """終了予定時刻を過ぎたらタイマーが終了するテスト"""
+        self.assertIsNone(self.update_at(700.3))
+        self.assertEqual(self.app.remaining_seconds, 0)
+        self.assertFalse(self.app.is_running)
+    
+    def test_show_timer_dialog_sets_deadline(self):
+        """タイマー設定時に終了予定時刻が記録されるテスト"""
+        import datetime
+        with patch('fireworks.fireworks.TimerDialog') as mock_dialog_class:
+            mock_dialog_class.return_value = Mock(result=300)
+            with patch.object(self.app, 'wait_window'), \
+                 patch.object(self.app, 'start_animation'), \
+                 patch('time.monotonic', return_value=50.0):
+                self.app.show_timer_dialog()
+        
+        self.assertEqual(self.app.timer_deadline, 350.0)
+        self.assertEqual(self.app.end_time - self.app.start_time, datetime.timedelta(seconds=300))
+        
+        self.app.reset_animation()
+        self.assertIsNone(self.app.timer_deadline)
+    
+    def test_next_break_after_expiry(self):
+        """時間切れで終わった休憩の後、次の休憩が止まっていた間を追いかけないテスト"""
+        app = HeadlessApp(seed=1)
+        with patch('time.monotonic', return_value=100.0):
+            app.start_break(60)
+        for _ in range(10):
+            app.animate()
+        dropped = app.scheduler.dropped_steps
+        with patch('time.monotonic', return_value=160.5), patch.object(app, 'after'):
+            app.update_timer()
+        self.assertFalse(app.is_running)
+        self.assertFalse(app.scheduler.running)
+        
+        # 2分後に次の休憩を始める
+        app.headless_time += 120
+        with patch('time.monotonic', return_value=280.5):
+            app.start_break(60)
+        self.assertEqual(app.scheduler.dropped_steps, dropped)
+        self.assertLess(app.metrics.frames[-1][3], app.scheduler.interval)
+
+
+
+class TestQualityGovernor(unittest.TestCase):
+    """品質の自動調整のテスト"""
+    
+    def setUp(self):
+        self.governor = QualityGovernor(0.05, window=5, recover_frames=10)
+    
+    def feed(self, seconds, frames):
+        """同じ処理時間のフレームを続けて記録し、段階が変わった回数を返す"""
+        return sum(self.governor.observe(seconds) for _ in range(frames))
+    
+    def test_steps_down_when_over_budget(self):
+        """予算を超えるフレームが続くと品質が下がるテスト"""
+        self.assertEqual(self.feed(0.045, 4), 0)
+        self.assertEqual(self.feed(0.045, 1), 1)
+        self.assertEqual(self.governor.level, 1)
+        # 段階を変えた直後は計測をやり直す
+        self.assertEqual(self.feed(0.045, 4), 0)
+        self.assertEqual(self.governor.level, 1)
+    
+    def test_hysteresis(self):
+        """上げ下げのしきい値の間では段階が変わらないテスト"""
+        self.feed(0.06, 5)
+        self.assertEqual(self.governor.level, 1)
+        self.assertEqual(self.feed(0.03, 100), 0)
+        self.assertEqual(self.governor.level, 1)
+        # 余裕のあるフレームが続くと1段階戻す
+        self.assertEqual(self.feed(0.01, 10), 1)
+        self.assertEqual(self.governor.level, 0)
+    
+    def test_level_limits(self):
+        """最低品質より下・最高品質より上には変わらないテスト"""
+        self.feed(1.0, 100)
+        self.assertEqual(self.governor.level, len(QUALITY_LEVELS) - 1)
+        self.feed(0.0, 1000)
+        self.assertEqual(self.governor.level, 0)
+    
+    def test_fixed_level(self):
+        """段階を固定した場合は自動調整しないテスト"""
+        governor = QualityGovernor(0.05, fixed=2)
+        self.assertFalse(any(governor.observe(1.0) for _ in range(100)))
+        self.assertEqual(governor.level, 2)
+        self.assertIs(governor.settings, QUALITY_LEVELS[2])
+        with self.assertRaises(ValueError):
+            QualityGovernor(0.05, fixed=len(QUALITY_LEVELS))
+    
+    def test_levels_applied_to_fireworks(self):
+        """品質設定が爆発と描画に反映されるテスト"""
+        level = QUALITY_LEVELS[-1]
+        firework = Firework(100, 200, 300, level=level)
+        firework.explode()
+        self.assertEqual(len(firework.particles), 32 * level.rings)
+        particle = firework.particles[0]
+        self.assertEqual(particle.trail.capacity, level.trail_length)
+        self.assertEqual(particle.sparkle_rate, level.sparkle_rate)
+    
+    def test_app_quality_level(self):
+        """アプリから現在の品質の段階を参照できるテスト"""
+        app = HeadlessApp(quality_level=3)
+        self.assertEqual(app.quality_level, 3)
+        app.is_running = True
+        app.frame_count = app.next_firework_frame
+        app.animate()
+        self.assertGreaterEqual(app.next_firework_frame - app.frame_count,
+                                QUALITY_LEVELS[3].launch_interval[0] - 1)
+        self.assertEqual(app.metrics.summary()['quality'], 3)
+    
+    @unittest.skipIf(numpy is None, "NumPyがインストールされていません")
+    def test_engine_levels(self):
+        """一括エンジンにも品質設定が反映されるテスト"""
+        level = QUALITY_LEVELS[2]
+        for system in (ParticleSystem(), TemplateSystem()):
+            system.set_level(level)
+            owner = system.burst(100, 100)
+            self.assertEqual(system.alive(owner), 32 * level.rings)
+            self.assertEqual(system.trail_length, level.trail_length)
+
+
+
+class TestParticleCulling(unittest.TestCase):
+    """画面外のパーティクルの間引きとパーティクル数の上限のテスト"""
+    
+    def test_on_screen(self):
+        """画面内判定のテスト（縁にかかる点を含む）"""
+        self.assertTrue(on_screen(600, 350, 1200, 700))
+        self.assertTrue(on_screen(-4, 703, 1200, 700))
+        self.assertFalse(on_screen(600, 720, 1200, 700))
+        self.assertFalse(on_screen(1230, 350, 1200, 700))
+    
+    def test_cannot_return(self):
+        """二度と画面に戻らない判定のテスト"""
+        # 下端より下を落下中（軌跡も画面外）
+        self.assertTrue(cannot_return(600, 800, 0, 5, 1200, 700, 8))
+        # 本体は画面外でも軌跡がまだ画面内
+        self.assertFalse(cannot_return(600, 720, 0, 5, 1200, 700, 8))
+        # 上へ飛び出したものは重力で戻ってくる
+        self.assertFalse(cannot_return(600, -100, 0, -3, 1200, 700, 8))
+        # 左右の端の外へ出ていくもの
+        self.assertTrue(cannot_return(-100, 300, -2, 0, 1200, 700, 8))
+        self.assertFalse(cannot_return(-100, 300, 2, 0, 1200, 700, 8))
+    
+    def test_firework_retires_fallen_particles(self):
+        """画面の下へ落ちたパーティクルが寿命前に削除されるテスト"""
+        culled = Firework(600, 650, 0, bounds=(1200, 700))
+        kept = Firework(600, 650, 0)
+        culled.explode()
+        kept.explode()
+        for _ in range(60):
+            culled.update()
+            kept.update()
+        self.assertEqual(len(kept.particles), 96)
+        self.assertLess(len(culled.particles), 96)
+        self.assertTrue(all(not p.cannot_return(1200, 700) for p in culled.particles))
+    
+    def test_firework_skips_off_screen_particles(self):
+        """画面外のパーティクルを描画しないテスト"""
+        firework = Firework(-500, -500, 0, bounds=(1200, 700))
+        firework.explode()
+        canvas = Mock(spec=['create_oval'])
+        firework.draw(canvas)
+        canvas.create_oval.assert_not_called()
+    
+    def test_app_particle_budget(self):
+        """上限を超えたら色あせたパーティクルから削除されるテスト"""
+        app = HeadlessApp(particle_budget=150)
+        app.is_running = True
+        app.next_firework_frame = 10 ** 6
+        first = Firework(300, 300, 0)
+        first.explode()
+        app.fireworks.append(first)
+        for _ in range(10):
+            app.animate()
+        second = Firework(900, 300, 0)
+        second.explode()
+        app.fireworks.append(second)
+        app.animate()
+        
+        self.assertEqual(app.live_particle_count(), 150)
+        # 新しい爆発のパーティクルは残る
+        self.assertEqual(len(second.particles), 96)
+        self.assertEqual(len(first.particles), 54)
+    
+    @unittest.skipIf(numpy is None, "NumPyがインストールされていません")
+    def test_particle_system_budget(self):
+        """一括エンジンでも上限を超えないテスト"""
+        system = ParticleSystem(budget=150)
+        first = system.burst(300, 300)
+        for _ in range(10):
+            system.update()
+        second = system.burst(900, 300)
+        self.assertEqual(system.count, 150)
+        self.assertEqual(system.alive(second), 96)
+        self.assertEqual(system.alive(first), 54)
+        # 寿命の短い内側の輪（最も色あせている）から削除される
+        survivors = system.ring[:system.count][system.owner[:system.count] == first]
+        self.assertNotIn(0, survivors.tolist())
+    
+    @unittest.skipIf(numpy is None, "NumPyがインストールされていません")
+    def test_particle_system_culling(self):
+        """一括エンジンで画面外のパーティクルを描かず、落ちたものを削除するテスト"""
+        system = ParticleSystem(bounds=(1200, 700))
+        system.burst(-500, -500)
+        system.update()
+        canvas = Mock(spec=['create_oval'])
+        system.draw(canvas)
+        canvas.create_oval.assert_not_called()
+        
+        system.clear()
+        system.burst(600, 650)
+        for _ in range(60):
+            system.update()
+        self.assertLess(system.count, 96)
+    
+    @unittest.skipIf(numpy is None, "NumPyがインストールされていません")
+    def test_template_system_budget_and_culling(self):
+        """テンプレートエンジンは爆発単位で削除するテスト"""
+        system = TemplateSystem(budget=150)
+        first = system.burst(300, 300)
+        second = system.burst(900, 300)
+        self.assertEqual(system.alive(first), 0)
+        self.assertEqual(system.alive(second), 96)
+        
+        system = TemplateSystem(bounds=(1200, 700))
+        system.burst(600, 3000)
+        canvas = Mock(spec=['create_oval'])
+        system.draw(canvas)
+        canvas.create_oval.assert_not_called()
+        # 上向きに飛んだパーティクルも落下し始めれば削除される（寿命は100）
+        for _ in range(95):
+            system.update()
+        self.assertEqual(system.count, 0)
+
+
+@unittest.skipIf(numpy is None, "NumPyがインストールされていません")
+class TestPhysicsWorker(unittest.TestCase):
+    """別プロセスでの物理演算のテスト"""
+    
+    def test_frame_buffer_round_trip(self):
+        """共有メモリに公開したフレームを別の接続から読み出せるテスト"""
+        writer = FrameBuffer(capacity=16)
+        reader = FrameBuffer(capacity=16, name=writer.name, create=False)
+        try:
+            self.assertIsNone(reader.read())
+            rgb = numpy.array([[255, 0, 0], [0, 128, 255]], dtype=numpy.uint8)
+            writer.publish(3, 1, 2, numpy.array([1.0, 2.0]), numpy.array([3.0, 4.0]),
+                           numpy.array([1.5, 2.5]), rgb)
+            writer.publish(4, 0, 1, numpy.array([5.0]), numpy.array([6.0]),
+                           numpy.array([1.0]), rgb[:1])
+            frame, fireworks, particles, x, y, radius, colors = reader.read()
+            # 最新の世代が読み出される
+            self.assertEqual((frame, fireworks, particles), (4, 0, 1))
+            self.assertEqual(x.tolist(), [5.0])
+            self.assertEqual(colors.tolist(), [[255, 0, 0]])
+        finally:
+            reader.close()
+            writer.close()
+    
+    def test_point_recorder(self):
+        """create_oval と draw_points の点が1つの配列にまとまるテスト"""
+        recorder = PointRecorder()
+        recorder.create_oval(8, 18, 12, 22, fill='#ff0000', outline='', tags='firework')
+        recorder.draw_points(numpy.array([100.0]), numpy.array([200.0]), 2,
+                             numpy.array([[0, 255, 0]]))
+        x, y, radius, rgb = recorder.points()
+        self.assertEqual(x.tolist(), [10.0, 100.0])
+        self.assertEqual(y.tolist(), [20.0, 200.0])
+        self.assertEqual(radius.tolist(), [2.0, 2.0])
+        self.assertEqual(rgb.tolist(), [[255, 0, 0], [0, 255, 0]])
+        recorder.clear()
+        self.assertEqual(len(recorder.points()[0]), 0)
+    
+    def test_worker_process(self):
+        """打ち上げた花火が別プロセスで爆発し、描画できるテスト"""
+        worker = PhysicsWorker((1200, 700), capacity=4096)
+        try:
+            worker.set_level(QUALITY_LEVELS[0])
+            worker.launch(600, 680, 600)  # 10ステップで爆発
+            worker.step(20)
+            self.assertTrue(worker.sync(timeout=30))
+            self.assertEqual(worker.fireworks, 1)
+            self.assertEqual(worker.count, 96)
+            canvas = Mock(spec=['create_oval'])
+            worker.draw(canvas)
+            self.assertGreaterEqual(canvas.create_oval.call_count, 96)
+            
+            worker.clear()
+            worker.step()
+            self.assertTrue(worker.sync(timeout=30))
+            self.assertEqual(worker.count, 0)
+        finally:
+            worker.close()
+
+
+class TestRecording(unittest.TestCase):
+    """乱数の種と操作の記録・再生のテスト"""
+    
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, 'break.fwrec')
+    
+    def tearDown(self):
+        self.tmpdir.cleanup()
+    
+    def test_recorder_round_trip(self):
+        """記録したイベントを読み戻せるテスト"""
+        recorder = EventRecorder(self.path, seed=42, quality=None, fps=60, particle_budget=3000)
+        recorder.record(0, EVENT_TIMER_START, 300)
+        recorder.record(15, EVENT_CLICK, 640, 200)
+        recorder.close(90)
+        # 1件13バイトの固定長（爆発パターンの重みは記録していない）
+        self.assertEqual(os.path.getsize(self.path), HEADER_SIZE + 3 * 13)
+        
+        recorded = load_recording(self.path)
+        self.assertEqual((recorded.seed, recorded.quality, recorded.fps, recorded.particle_budget),
+                         (42, None, 60, 3000))
+        self.assertIsNone(recorded.pattern_weights)
+        self.assertEqual(recorded.ticks, 90)
+        self.assertEqual(recorded.count(EVENT_CLICK), 1)
+        
+        replay = Replay(recorded)
+        self.assertEqual(list(replay.due(10)), [(EVENT_TIMER_START, 300, 0)])
+        self.assertEqual(list(replay.due(15)), [(EVENT_CLICK, 640, 200)])
+        self.assertFalse(replay.finished)
+        list(replay.due(90))
+        self.assertTrue(replay.finished)
+    
+    def test_rejects_other_files(self):
+        """記録ファイルでないものは読み込まないテスト"""
+        with open(self.path, 'wb') as f:
+            f.write(b'not a recording at all')
+        with self.assertRaises(ValueError):
+            load_recording(self.path)
+    
+    def test_same_seed_same_launches(self):
+        """同じ種なら打ち上げの位置・間隔・色が同じになるテスト"""
+        def launches(seed):
+            app = HeadlessApp(seed=seed, quality_level=0)
+            app.is_running = True
+            shells = []
+            for _ in range(400):
+                count = len(app.fireworks)
+                app.animate()
+                shells += [(app.tick, f.x, f.target_y, f.color) for f in app.fireworks[count:]]
+            return shells
+        
+        first = launches(7)
+        self.assertGreater(len(first), 1)
+        self.assertEqual(first, launches(7))
+        self.assertNotEqual(first, launches(8))
+    
+    def test_replay_reproduces_session(self):
+        """記録した休憩（タイマー・クリック・リセット）を再生すると同じ経過になるテスト"""
+        app = HeadlessApp(seed=3, record=self.path)
+        trace = []
+        app.start_break(60)
+        for frame in range(300):
+            if frame == 40:
+                app.on_canvas_click(Mock(x=300, y=250))
+            if frame == 200:
+                app.reset_animation()
+                app.start_break(30)
+            app.animate()
+            trace.append((app.tick, len(app.fireworks), app.live_particle_count()))
+        app.finish_break()
+        app.recorder.close(app.tick)
+        
+        recorded = load_recording(self.path)
+        self.assertEqual(recorded.seed, 3)
+        self.assertEqual(recorded.count(EVENT_TIMER_START), 2)
+        self.assertGreater(recorded.count(EVENT_LAUNCH), 0)
+        
+        replayed = HeadlessApp(replay=self.path)
+        replay_trace = []
+        while len(replay_trace) < len(trace):
+            if not replayed.is_running:
+                replayed.replay_events()
+                continue
+            replayed.animate()
+            replay_trace.append((replayed.tick, len(replayed.fireworks),
+                                 replayed.live_particle_count()))
+        self.assertEqual(replay_trace, trace)
+        # 記録の最後のタイマー終了で止まる
+        replayed.replay_events()
+        self.assertFalse(replayed.is_running)
+        self.assertTrue(replayed.replay.finished)
+    
+    def test_replay_uses_recorded_patterns(self):
+        """記録時の爆発パターンの重みで再生し、再生側の指定は使わないテスト"""
+        app = HeadlessApp(seed=5, record=self.path, pattern_weights=mix_weights())
+        app.start_break(60)
+        shells = []
+        for _ in range(300):
+            count = len(app.fireworks)
+            app.animate()
+            shells += [(app.tick, f.x, f.target_y, f.pattern) for f in app.fireworks[count:]]
+        app.finish_break()
+        app.recorder.close(app.tick)
+        self.assertGreater(len({pattern for *_, pattern in shells}), 1)
+        
+        recorded = load_recording(self.path)
+        self.assertEqual(recorded.pattern_weights, mix_weights())
+        
+        replayed = HeadlessApp(replay=self.path)
+        self.assertEqual(replayed.pattern_weights, mix_weights())
+        replay_shells = []
+        while len(replay_shells) < len(shells):
+            if not replayed.is_running:
+                replayed.replay_events()
+                continue
+            count = len(replayed.fireworks)
+            replayed.animate()
+            replay_shells += [(replayed.tick, f.x, f.target_y, f.pattern)
+                              for f in replayed.fireworks[count:]]
+        self.assertEqual(replay_shells, shells)
+    
+    def test_rejects_unknown_patterns(self):
+        """記録に知らない爆発パターンがあれば再生しないテスト"""
+        EventRecorder(self.path, seed=3, pattern_weights={'comet': 1}).close(0)
+        self.assertEqual(load_recording(self.path).pattern_weights, {'comet': 1.0})
+        with self.assertRaises(ValueError):
+            HeadlessApp(replay=self.path)
+    
+    def test_recording_as_workload(self):
+        """記録をベンチマークのワークロードとして再生できるテスト"""
+        app = HeadlessApp(seed=11, record=self.path)
+        app.start_break(60)
+        app.on_canvas_click(Mock(x=600, y=600))
+        for _ in range(60):
+            app.animate()
+        app.finish_break()
+        app.recorder.close(app.tick)
+        
+        workload = Workload.from_recording(self.path)
+        self.assertEqual(workload.name, 'break')
+        first = run_workload(workload)
+        second = run_workload(workload)
+        self.assertGreater(first['peak_particles'], 0)
+        self.assertEqual(first['peak_particles'], second['peak_particles'])
+    
+    def test_replay_disables_controls(self):
+        """再生中はタイマー設定・リセットのボタンが押せないテスト"""
+        EventRecorder(self.path, seed=3).close(0)
+        app = CanvasAnimationApp(replay=self.path)
+        self.addCleanup(app.destroy)
+        self.assertEqual(str(app.start_button['state']), tk.DISABLED)
+        self.assertEqual(str(app.reset_button['state']), tk.DISABLED)
+        
+        app = CanvasAnimationApp()
+        self.addCleanup(app.destroy)
+        self.assertEqual(str(app.start_button['state']), tk.NORMAL)
+        self.assertEqual(str(app.reset_button['state']), tk.NORMAL)
+    
+    def test_seed_range(self):
+        """記録できない乱数の種はコマンドラインで拒否するテスト"""
+        self.assertEqual(parse_seed('0'), 0)
+        self.assertEqual(parse_seed(str(SEED_LIMIT - 1)), SEED_LIMIT - 1)
+        for text in ('-1', str(SEED_LIMIT), 'abc'):
+            with self.assertRaises(ArgumentTypeError):
+                parse_seed(text)
+        
+        # 上限ぎりぎりの種も記録して読み戻せる
+        recorder = EventRecorder(self.path, seed=SEED_LIMIT - 1)
+        recorder.close(0)
+        self.assertEqual(load_recording(self.path).seed, SEED_LIMIT - 1)
+        
+        # アプリを作る前に引数の誤りとして理由を表示して終了する
+        with patch('sys.stderr', new_callable=io.StringIO) as stderr, \
+                patch('fireworks.fireworks.CanvasAnimationApp') as app:
+            with self.assertRaises(SystemExit):
+                main(['--seed', '-1', '--record', self.path])
+        app.assert_not_called()
+        self.assertIn("乱数の種は 0 以上 2**64 未満で指定してください: -1", stderr.getvalue())
+
+
+class TestShowCache(unittest.TestCase):
+    """事前に描画したショーのキャッシュのテスト"""
+    
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, 'break.fwshow')
+    
+    def tearDown(self):
+        self.tmpdir.cleanup()
+    
+    def test_frame_round_trip(self):
+        """円の一覧を圧縮して元に戻せるテスト"""
+        circles = [(100, 200, 3, '#ffd700'), (-5, 710, 1, 'white'), (640, 0, 12, '#102030')]
+        decoded = decode_frame(encode_frame(circles))
+        self.assertEqual(decoded, [(100, 200, 3, '#ffd700'), (-5, 710, 1, '#ffffff'),
+                                   (640, 0, 12, '#102030')])
+        self.assertEqual(decode_frame(encode_frame([])), [])
+    
+    def test_render_and_play(self):
+        """保存したショーを読み飛ばし・繰り返しを含めて再生できるテスト"""
+        frames = render_show(self.path, 10, seed=4)
+        self.assertEqual(frames, 200)
+        # 同じ種なら同じショーになる
+        again = os.path.join(self.tmpdir.name, 'again.fwshow')
+        render_show(again, 10, seed=4)
+        with open(self.path, 'rb') as a, open(again, 'rb') as b:
+            self.assertEqual(a.read(), b.read())
+        
+        show = ShowCache(self.path)
+        try:
+            self.assertEqual(show.duration, 10)
+            canvas = Mock(spec=['create_oval'])
+            show.step(150)  # 最初の花火は60〜120ステップで打ち上がる
+            show.draw(canvas)
+            self.assertEqual(show.position, 150)
+            self.assertGreater(canvas.create_oval.call_count, 0)
+            self.assertEqual(canvas.create_oval.call_count, show.points)
+            
+            show.step(60)  # 最後まで再生したら先頭に戻る
+            show.draw(canvas)
+            self.assertEqual((show.position, show.loops), (10, 1))
+        finally:
+            show.close()
+    
+    def test_app_playback(self):
+        """再生モードでは物理演算をせずにキャッシュの円を描くテスト"""
+        render_show(self.path, 10, seed=4)
+        app = HeadlessApp(playback=self.path)
+        try:
+            app.is_running = True
+            app.on_canvas_click(Mock(x=300, y=300))
+            for _ in range(150):
+                app.animate()
+            self.assertEqual(app.fireworks, [])
+            self.assertEqual(app.show.position, 150)
+            self.assertGreater(app.live_particle_count(), 0)
+            self.assertGreater(app.canvas.counts['create_oval'], 0)
+            
+            app.reset_animation()
+            self.assertEqual(app.show.position, 0)
+        finally:
+            app.show.close()
+
+
+class TestSpriteRenderer(unittest.TestCase):
+    """光の粒のスプライトによる描画のテスト"""
+    
+    def setUp(self):
+        self.canvas = Mock()
+        self.canvas.create_image.side_effect = range(1, 100000)
+        self.factory = Mock(side_effect=lambda data: object())
+        self.atlas = GlowAtlas(factory=self.factory)
+        self.renderer = SpriteRenderer(self.canvas, atlas=self.atlas)
+    
+    def test_glow_png(self):
+        """スプライトの画像が正しい大きさの RGBA の PNG になるテスト"""
+        size, rows = glow_pixels((255, 215, 0), 3, False)
+        self.assertEqual(len(rows), size)
+        self.assertEqual(len(rows[0]), size * 4)
+        center = rows[size // 2][size // 2 * 4:size // 2 * 4 + 4]
+        self.assertEqual(tuple(center), (255, 215, 0, 255))
+        # 角は透明
+        self.assertEqual(rows[0][3], 0)
+        
+        data = png_rgba(size, size, rows)
+        self.assertEqual(data[:8], b'\x89PNG\r\n\x1a\n')
+        self.assertEqual(data[16:24], bytes([0, 0, 0, size, 0, 0, 0, size]))
+    
+    def test_atlas_creates_each_sprite_once(self):
+        """同じ組み合わせのスプライトは1度だけ作られるテスト"""
+        first = self.atlas.image('#ffd700', 3)
+        self.assertIs(self.atlas.image('#ffd700', 3), first)
+        self.assertIsNot(self.atlas.image('#ffd700', 3, True), first)
+        self.assertEqual(self.factory.call_count, 2)
+    
+    def test_sparkle_drawn_as_one_sprite(self):
+        """きらめくパーティクルは1つの画像アイテムで描かれるテスト"""
+        particle = Particle(100, 200, 0, 5, 'gold', 1)
+        self.renderer.begin_frame()
+        with patch('random.random', return_value=0.05):  # きらめき発生
+            particle.draw(self.renderer)
+        self.renderer.end_frame()
+        
+        self.assertEqual(self.canvas.create_image.call_count, 1)
+        self.canvas.create_oval.assert_not_called()
+        # 本体の半径（寿命いっぱいで4、きらめきで+1）のきらめき付きスプライト
+        self.assertEqual(list(self.atlas.images), [(particle.current_color, 5, True)])
+    
+    def test_sparkle_merged_when_scaled(self):
+        """全画面表示などで拡大・縮小してもきらめきが1つの画像にまとまるテスト"""
+        for scale in (1.6, 0.55, 2.0):
+            self.atlas.images.clear()
+            self.canvas.create_image.reset_mock()
+            view = Viewport(self.renderer, scale, (13.7, 4.1))
+            particle = Particle(100.3, 200.9, 0, 5, 'gold', 1)
+            view.begin_frame()
+            with patch('random.random', return_value=0.05):  # きらめき発生
+                particle.draw(view)
+            view.end_frame()
+            
+            self.assertEqual(self.canvas.create_image.call_count, 1)
+            self.assertEqual([key[2] for key in self.atlas.images], [True])
+            self.renderer.clear()
+    
+    def test_lone_white_oval(self):
+        """きらめきでない白い円もそのまま描かれるテスト"""
+        self.renderer.begin_frame()
+        self.renderer.create_oval(8, 8, 12, 12, fill='#ffffff')
+        self.renderer.create_oval(48, 48, 52, 52, fill='#ffffff')
+        self.renderer.end_frame()
+        
+        self.assertEqual(self.canvas.create_image.call_count, 2)
+        self.assertEqual(set(self.atlas.images), {('#ffffff', 2, False)})
+    
+    def test_sprites_reused_between_frames(self):
+        """画像アイテムは coords で動かして使い回すテスト"""
+        for offset in (0, 0, 5):
+            self.renderer.begin_frame()
+            for i in range(3):
+                x = 10 * i + offset
+                self.renderer.create_oval(x, 0, x + 4, 4, fill='#ff0000')
+            self.renderer.end_frame()
+        
+        self.assertEqual(self.canvas.create_image.call_count, 3)
+        # 2フレーム目は変化なし、3フレーム目は移動だけ
+        self.assertEqual(self.canvas.coords.call_count, 3)
+        self.canvas.itemconfigure.assert_not_called()
+        self.assertEqual(self.renderer.item_count, 3)
+
+
+class TestCommandBatch(unittest.TestCase):
+    """キャンバス操作を Tcl のスクリプトにまとめて送るテスト"""
+    
+    def setUp(self):
+        # 表示なしで使える Tcl インタプリタに、呼ばれたコマンドを記録するキャンバスの代わりを作る
+        self.tcl = tk.Tcl()
+        self.tcl.eval("""
+            set log {}
+            set next 0
+            proc .c {command args} {
+                lappend ::log [concat $command $args]
+                if {$command eq "create"} { return [incr ::next] }
+            }
+        """)
+        self.canvas = Mock()
+        self.canvas.tk = self.tcl
+        self.canvas._w = '.c'
+        self.canvas.create_oval.side_effect = range(100, 100000)
+        self.pool = CanvasItemPool(self.canvas, batch=True)
+        self.addCleanup(self.release_tcl)
+    
+    def release_tcl(self):
+        """インタプリタをこのスレッドで解放する
+        
+        Mock は循環参照なので、持たせたままだと GC が後で解放する。それが別のスレッド
+        （TestSync の受信側を接続するスレッド）だと Tcl が異常終了する。
+        """
+        del self.canvas.tk
+        del self.tcl
+    
+    def log(self):
+        """Tcl 側で実行されたコマンドの一覧（実行後に消す）"""
+        commands = [self.tcl.splitlist(c) for c in self.tcl.splitlist(self.tcl.eval('set log'))]
+        self.tcl.eval('set log {}')
+        return commands
+    
+    def draw_frame(self, count, offset=0, fill='red'):
+        self.pool.begin_frame()
+        for i in range(count):
+            self.pool.create_oval(i + offset, i, i + offset + 2, i + 2, fill=fill)
+        self.pool.end_frame()
+    
+    def test_frame_sent_as_one_script(self):
+        """1フレーム分の操作がまとめて実行され、作成したIDが割り当てられるテスト"""
+        self.draw_frame(3)
+        
+        log = self.log()
+        self.assertEqual(log[0], ('create', 'oval', '0.0', '0.0', '2.0', '2.0',
+                                  '-fill', 'red', '-outline', '', '-tags', 'firework'))
+        self.assertEqual(len(log), 3)
+        self.assertEqual(self.pool.items, [1, 2, 3])
+        self.assertEqual(self.pool.calls, 1)
+        self.canvas.create_oval.assert_not_called()
+        
+        # 移動・色変更・非表示もまとめて送られる
+        self.draw_frame(2, offset=1, fill='blue')
+        log = self.log()
+        self.assertIn(('coords', '1', '1.0', '0.0', '3.0', '2.0'), log)
+        self.assertIn(('itemconfigure', '1', '-fill', 'blue'), log)
+        self.assertIn(('itemconfigure', '3', '-state', 'hidden'), log)
+        self.assertEqual(self.pool.calls, 1)
+        self.canvas.coords.assert_not_called()
+    
+    def test_stacking_sent_after_create(self):
+        """重なり順を直す操作も送られ、作成したアイテムは作成後に移されるテスト"""
+        # raise / lower で重なり順（奥から手前）を実際に入れ替える
+        self.tcl.eval("""
+            set stack {}
+            proc .c {command args} {
+                lappend ::log [concat $command $args]
+                switch -- $command {
+                    create { set id [incr ::next]; lappend ::stack $id; return $id }
+                    raise - lower {
+                        lassign $args item other
+                        set ::stack [lsearch -all -inline -not -exact $::stack $item]
+                        set at [lsearch -exact $::stack $other]
+                        if {$command eq "raise"} { incr at }
+                        set ::stack [linsert $::stack $at $item]
+                    }
+                }
+            }
+        """)
+        
+        def frame(*xs):
+            self.pool.begin_frame()
+            for x in xs:
+                self.pool.create_oval(x, 0, x + 2, 2, fill='red')
+            self.pool.end_frame()
+            return [int(item) for item in self.tcl.splitlist(self.tcl.eval('set stack'))]
+        
+        self.assertEqual(frame(0, 10), [1, 2])
+        # 10 は使い続け、20 には奥にあった 1 を使うので 2 の上へ移す
+        self.assertEqual(frame(10, 20, 30), [2, 1, 3])
+        self.assertIn(('raise', '1', '2'), self.log())
+        # 先頭に新しく作った 4 は最前面に作られるので、次の eval で 2 の下へ移す
+        self.assertEqual(frame(5, 10, 20, 30), [4, 2, 1, 3])
+        log = self.log()
+        self.assertEqual(log[-1], ('lower', '4', '2'))
+        self.assertEqual(self.pool.calls, 2)
+    
+    def test_large_frame_split(self):
+        """コマンドが多い場合は数回に分けて送るテスト"""
+        batch = CommandBatch(self.canvas, limit=2)
+        for i in range(5):
+            batch.create('oval', (i, i, i + 1, i + 1), {'fill': 'light blue'})
+        self.assertEqual(batch.flush(), [1, 2, 3, 4, 5])
+        self.assertEqual(batch.calls, 3)
+        self.assertEqual(self.log()[0][-1], 'light blue')
+        self.assertEqual(len(batch), 0)
+    
+    def test_fallback_to_per_call(self):
+        """スクリプトが失敗したら1つずつ呼ぶ方式で描き直すテスト"""
+        self.tcl.eval('proc .c args { error "broken canvas" }')
+        self.draw_frame(3)
+        
+        self.assertIsNone(self.pool.batch)
+        self.assertEqual(self.canvas.create_oval.call_count, 3)
+        self.assertEqual(self.pool.items, [100, 101, 102])
+        self.assertEqual(self.pool.visible, 3)
+    
+    def test_not_batched_for_other_canvases(self):
+        """Tk のキャンバス以外では既定で1つずつ呼ぶテスト"""
+        self.assertIsNone(CanvasItemPool(Mock()).batch)
+    
+    def test_benchmark_reports_calls(self):
+        """ベンチマークが Tcl の呼び出し回数を報告するテスト"""
+        workload = Workload('tiny', 20, launches=lambda frame: [(600, 600)] if frame == 0 else ())
+        batched = run_workload(workload, batch=True)
+        per_call = run_workload(workload, batch=False)
+        
+        self.assertEqual(batched['canvas_ops_per_frame'], per_call['canvas_ops_per_frame'])
+        self.assertLess(batched['tcl_calls_per_frame']['mean'],
+                        per_call['tcl_calls_per_frame']['mean'])
+        self.assertGreater(batched['canvas_ops_per_sec'], 0)
+
+
+class TestStartup(unittest.TestCase):
+    """起動時間の計測と目安のテスト"""
+    
+    def test_import_within_budget(self):
+        """読み込みが目安の時間内で、任意の依存は読み込まないテスト"""
+        import ast
+        import subprocess
+        code = ("import time\n"
+                "started = time.perf_counter()\n"
+                "import fireworks.fireworks as app\n"
+                "elapsed = time.perf_counter() - started\n"
+                "print(repr((elapsed, app.startup.loaded_lazy_modules())))\n")
+        root = os.path.dirname(os.path.abspath(__file__))
+        output = subprocess.run([sys.executable, '-c', code], cwd=root, check=True,
+                                capture_output=True, text=True).stdout
+        elapsed, lazy = ast.literal_eval(output)
+        
+        self.assertEqual(lazy, [])
+        self.assertLess(elapsed, STARTUP_BUDGET['import'])
+    
+    def test_headless_startup_within_budget(self):
+        """ウィジェット作成から最初のフレームまでが目安の時間内のテスト"""
+        trace = StartupTrace()
+        app = HeadlessApp(trace=trace)
+        self.assertIn('<Expose>', app.canvas.bindings)
+        app.is_running = True
+        app.launch_firework(600, 600)
+        app.animate()
+        with patch('sys.stderr'):
+            app.first_frame_painted()
+        
+        self.assertEqual(set(trace.times), {'tk_init', 'create_widgets', 'first_frame'})
+        self.assertEqual(trace.over_budget(), [])
+    
+    def test_over_budget_reported(self):
+        """目安を超えた区間が報告されるテスト"""
+        now = [10.0]
+        trace = StartupTrace(clock=lambda: now[0], budget={'create_widgets': 0.25})
+        with trace.phase('create_widgets'):
+            now[0] += 0.4
+        now[0] += 1.0
+        trace.mark('first_frame')
+        
+        self.assertAlmostEqual(trace.times['first_frame'], 1.4)
+        self.assertEqual([name for name, _, _ in trace.over_budget()], ['create_widgets'])
+        self.assertIn('超過', trace.report())
+
+
+class TestMirror(unittest.TestCase):
+    """1つのシミュレーションを複数のキャンバスに映すテスト"""
+    
+    def test_fit(self):
+        """縦横比を保って収める倍率と位置のテスト"""
+        self.assertEqual(fit(1200, 700, 600, 350), (0.5, (0.0, 0.0)))
+        scale, (x, y) = fit(1200, 700, 1920, 1080)
+        self.assertAlmostEqual(scale, 1.54285714, places=5)
+        self.assertAlmostEqual(x, (1920 - 1200 * scale) / 2)
+        self.assertEqual(y, 0.0)
+    
+    def test_mirror_draws_same_frame_scaled(self):
+        """ミラーが同じフレームを縮小して描き、物理演算は1回だけのテスト"""
+        app = HeadlessApp()
+        fanout = app.share_frames()
+        self.assertIs(app.share_frames(), fanout)
+        mirror = ScaledOutput(CanvasItemPool(RecordingCanvas()), 600, 350)
+        fanout.add(mirror)
+        app.is_running = True
+        app.launch_firework(600, 600)
+        
+        with patch.object(Firework, 'update', autospec=True,
+                          side_effect=Firework.update) as update:
+            for _ in range(30):
+                app.animate()
+        
+        self.assertEqual(update.call_count, 30)
+        self.assertGreater(mirror.renderer.used, 0)
+        self.assertEqual(mirror.renderer.used, fanout.primary.used)
+        x0, y0, x1, y1, fill = fanout.shapes[0]
+        self.assertIn((x0 / 2, y0 / 2, x1 / 2, y1 / 2, fill), mirror.renderer.shapes.values())
+        
+        app.reset_animation()
+        self.assertEqual(mirror.renderer.used, 0)
+        fanout.remove(mirror)
+        self.assertEqual(fanout.mirrors, [])
+    
+    def test_parse_size(self):
+        """コマンドラインの「幅x高さ」の解釈のテスト"""
+        self.assertEqual(parse_size('1920x1080'), (1920, 1080))
+        self.assertEqual(parse_size('800X450'), (800, 450))
+        for text in ('800', '800x', '0x450'):
+            with self.assertRaises(ArgumentTypeError):
+                parse_size(text)
+    
+    @unittest.skipIf(numpy is None, "NumPyがインストールされていません")
+    def test_points_scaled_for_item_renderer(self):
+        """配列で描かれた点がミラーでは楕円として描かれるテスト"""
+        primary = Mock(spec=['begin_frame', 'create_oval', 'draw_points', 'end_frame',
+                             'clear', 'item_count'])
+        fanout = FrameFanout(primary, 1200, 700)
+        renderer = Mock(spec=['begin_frame', 'create_oval', 'end_frame', 'clear'])
+        fanout.add(ScaledOutput(renderer, 2400, 1400))
+        
+        fanout.begin_frame()
+        fanout.draw_points(numpy.array([10.0]), numpy.array([20.0]), 2,
+                           numpy.array([[255, 0, 0]], dtype=numpy.uint8))
+        fanout.end_frame()
+        
+        primary.draw_points.assert_called_once()
+        renderer.create_oval.assert_called_once_with(16.0, 36.0, 24.0, 44.0, fill='#ff0000',
+                                                     outline='', tags='firework')
+
+
+
+class TestViewport(unittest.TestCase):
+    """論理座標からキャンバスの座標への変換（全画面表示）のテスト"""
+    
+    def test_raster_zoom(self):
+        """画素数が目安を超える場合だけ整数倍に拡大するテスト"""
+        self.assertEqual(raster_zoom(1200, 700), 1)
+        self.assertEqual(raster_zoom(1920, 1080), 2)
+        self.assertEqual(raster_zoom(3840, 2160), 3)
+        
+        layout = Layout((1200, 700), (3840, 2160), raster_zoom(3840, 2160))
+        self.assertEqual(layout.render_size, (1280, 720))
+    
+    def test_layout_round_trip(self):
+        """論理座標を描いた位置が論理座標に戻るテスト"""
+        layout = Layout((1200, 700), (3840, 2160))
+        view = layout.viewport(CanvasItemPool(RecordingCanvas()))
+        view.begin_frame()
+        view.create_oval(590, 340, 610, 360, fill='red')
+        view.end_frame()
+        
+        x0, y0, x1, y1, _ = view.renderer.shapes[next(iter(view.renderer.shapes))]
+        self.assertAlmostEqual(x1 - x0, 20 * layout.scale)
+        center = layout.to_world((x0 + x1) / 2, (y0 + y1) / 2)
+        self.assertAlmostEqual(center[0], 600)
+        self.assertAlmostEqual(center[1], 350)
+    
+    def test_resize_keeps_simulation_in_world(self):
+        """キャンバスの大きさが変わっても物理演算は論理座標のままのテスト"""
+        app = HeadlessApp(seed=3)
+        reference = HeadlessApp(seed=3)
+        app.resize_canvas(3840, 2160)
+        self.assertIsInstance(app.renderer, Viewport)
+        layout = app.layout
+        app.resize_canvas(3840, 2160)
+        self.assertIs(app.layout, layout)
+        for target in (app, reference):
+            target.is_running = True
+            target.launch_firework()
+            for _ in range(20):
+                target.animate()
+        
+        self.assertEqual(sync_digest(app), sync_digest(reference))
+        self.assertEqual(app.canvas_renderer.used, reference.renderer.used)
+        
+        # クリック位置は論理座標に戻して打ち上げる
+        x, y = layout.offset[0] + 600 * layout.scale, 200 * layout.scale
+        app.on_canvas_click(Mock(x=x, y=y))
+        self.assertEqual((app.fireworks[-1].x, app.fireworks[-1].target_y), (600, 200))
+    
+    def test_resize_moves_mirror_primary(self):
+        """ミラーの表示中に大きさが変わると元の描画器だけが差し替わるテスト"""
+        app = HeadlessApp()
+        fanout = app.share_frames()
+        app.resize_canvas(1920, 1080)
+        self.assertIs(app.renderer, fanout)
+        self.assertIsInstance(fanout.primary, Viewport)
+        self.assertIs(fanout.primary.renderer, app.canvas_renderer)
+    
+    @unittest.skipIf(numpy is None, "NumPyがインストールされていません")
+    def test_raster_zoom_copies_dirty_rects(self):
+        """低い解像度で描いた領域を拡大して表示用の画像にコピーするテスト"""
+        photo, display = Mock(), Mock()
+        photo.name, display.name = 'small', 'large'
+        renderer = RasterRenderer(RecordingCanvas(), 64, 64, photo=photo, zoom=2,
+                                  display=display)
+        renderer.begin_frame()
+        renderer.end_frame()
+        display.tk.call.assert_called_once_with('large', 'copy', 'small', '-from', 0, 0, 64, 64,
+                                                '-to', 0, 0, '-zoom', 2)
+        
+        display.tk.call.reset_mock()
+        renderer.begin_frame()
+        renderer.create_oval(38, 38, 42, 42, fill='red')
+        renderer.end_frame()
+        display.tk.call.assert_called_once_with('large', 'copy', 'small', '-from', 32, 32, 64, 64,
+                                                '-to', 64, 64, '-zoom', 2)
+
+
+class TestPatterns(unittest.TestCase):
+    """爆発パターンの登録・コンパイル・選択のテスト"""
+    
+    def test_peony_matches_original_layout(self):
+        """変化菊が元の配置（32本の光線・3つの輪）と同じになるテスト"""
+        compiled = compile_pattern('peony', 3)
+        self.assertEqual(len(compiled), 96)
+        base_colors = ['gold', 'orange', 'red', 'crimson', 'purple']
+        for n, (vx, vy, life, color, ring) in enumerate(compiled.particles):
+            i, expected_ring = divmod(n, 3)
+            angle = (2 * math.pi * i) / 32
+            self.assertEqual(ring, expected_ring)
+            self.assertEqual((vx, vy), (math.cos(angle) * (3 + ring * 2),
+                                        math.sin(angle) * (3 + ring * 2)))
+            self.assertEqual(life, 80 + ring * 10)
+            self.assertEqual(color, base_colors[(ring + i // 4) % 5])
+    
+    def test_compiled_once_per_rings(self):
+        """(パターン, 輪の数) ごとに1度だけコンパイルされるテスト"""
+        self.assertIs(compile_pattern('willow', 2), compile_pattern('willow', 2))
+        self.assertEqual(len(compile_pattern('willow', 2)), 60)
+        # 輪が1つのパターンは品質の輪の数に関係なく1つ
+        self.assertEqual(len(compile_pattern('ring', 3)), 48)
+        with self.assertRaises(ValueError):
+            compile_pattern('unknown')
+    
+    def test_explode_without_trig(self):
+        """爆発時に三角関数を使わずに全パターンのパーティクルを作るテスト"""
+        for name in PATTERNS:
+            compile_pattern(name, 3)
+        with patch('math.cos', side_effect=AssertionError), \
+                patch('math.sin', side_effect=AssertionError):
+            for name in PATTERNS:
+                firework = Firework(600, 300, 0, pattern=name)
+                firework.explode()
+                self.assertEqual(len(firework.particles), len(compile_pattern(name, 3)))
+        particle = firework.particles[-1]
+        self.assertEqual(particle.max_life, compile_pattern('crossette', 3).by_life[-1][2])
+    
+    def test_choose(self):
+        """重みに従って選び、1種類だけなら乱数を使わないテスト"""
+        rng = random.Random(1)
+        state = rng.getstate()
+        self.assertEqual(choose(rng, {'palm': 1}), 'palm')
+        self.assertEqual(rng.getstate(), state)
+        
+        picks = [choose(rng, {'peony': 3, 'ring': 1}) for _ in range(2000)]
+        self.assertAlmostEqual(picks.count('peony') / len(picks), 0.75, delta=0.05)
+    
+    def test_parse_weight(self):
+        """コマンドラインの「名前=重み」の解釈のテスト"""
+        self.assertEqual(parse_weight('willow'), ('willow', 1.0))
+        self.assertEqual(parse_weight('palm=2.5'), ('palm', 2.5))
+        for text in ('sparkler', 'palm=x', 'palm=0'):
+            with self.assertRaises(ArgumentTypeError):
+                parse_weight(text)
+        
+        # コマンドラインでは理由をそのまま表示する
+        with patch('sys.stderr', new_callable=io.StringIO) as stderr, \
+                patch('fireworks.fireworks.CanvasAnimationApp') as app:
+            with self.assertRaises(SystemExit):
+                main(['--pattern', 'palm=0'])
+        app.assert_not_called()
+        self.assertIn("重みは正の数で指定してください: palm=0", stderr.getvalue())
+    
+    def test_app_launch_patterns(self):
+        """アプリが名前または重みでパターンを選ぶテスト"""
+        app = HeadlessApp(pattern_weights={'ring': 1}, seed=5)
+        app.launch_firework(300, 200)
+        app.launch_firework(500, 200, pattern='crossette')
+        self.assertEqual([fw.pattern for fw in app.fireworks], ['ring', 'crossette'])
+        
+        # 指定がなければ元々の変化菊だけ（パターンを選ぶのに乱数を使わない）
+        default = HeadlessApp(seed=5)
+        for _ in range(40):
+            default.launch_firework()
+        self.assertEqual({fw.pattern for fw in default.fireworks}, {DEFAULT_PATTERN})
+        
+        mixed = HeadlessApp(seed=5, pattern_weights=mix_weights())
+        for _ in range(40):
+            mixed.launch_firework()
+        self.assertEqual({fw.pattern for fw in mixed.fireworks}, set(PATTERNS))
+    
+    def test_pattern_options(self):
+        """--pattern-mix で全パターンを混ぜ、--pattern の指定を優先するテスト"""
+        for argv, weights in (([], None),
+                              (['--pattern-mix'], mix_weights()),
+                              (['--pattern-mix', '--pattern', 'ring'], {'ring': 1.0})):
+            with patch('fireworks.fireworks.CanvasAnimationApp') as app:
+                main(argv)
+            self.assertEqual(app.call_args.kwargs['pattern_weights'], weights)
+    
+    @unittest.skipIf(numpy is None, "NumPyがインストールされていません")
+    def test_engines_use_patterns(self):
+        """一括エンジンとテンプレートが同じパターンで同じ動きになるテスト"""
+        for name in PATTERNS:
+            system = ParticleSystem()
+            owner = system.burst(300, 300, name)
+            self.assertEqual(system.alive(owner), len(compile_pattern(name, 3)))
+            templates = TemplateSystem()
+            handle = templates.burst(300, 300, name)
+            for _ in range(30):
+                system.update()
+                templates.update()
+            burst = templates.bursts[handle]
+            n = system.count
+            self.assertEqual(templates.alive(handle), n)
+            expected = sorted(zip(numpy.round(system.x[:n], 6), numpy.round(system.y[:n], 6)))
+            actual = sorted(zip(numpy.round(burst.template.dx[30, :n] + 300, 6),
+                                numpy.round(burst.template.dy[30, :n] + 300, 6)))
+            self.assertEqual(actual, expected)
+
+
+class TestFireworkPool(unittest.TestCase):
+    """花火とパーティクルを使い回すプールのテスト"""
+    
+    def test_slots(self):
+        """Particle と Firework が属性の辞書を持たないテスト"""
+        firework = Firework(100, 500, 200)
+        firework.explode()
+        for record in (firework, firework.particles[0]):
+            self.assertFalse(hasattr(record, '__dict__'))
+            with self.assertRaises(AttributeError):
+                record.unknown = 1
+    
+    def test_particles_recycled(self):
+        """消えたパーティクルと終わった花火がプールから使い回されるテスト"""
+        pool = FireworkPool()
+        firework = pool.firework(100, 500, 500)
+        firework.update()
+        particles = list(firework.particles)
+        while not firework.is_finished():
+            firework.update()
+        self.assertEqual(len(pool.free_particles), 96)
+        pool.release(firework)
+        
+        again = pool.firework(300, 500, 500, pattern='ring')
+        self.assertIs(again, firework)
+        self.assertEqual((again.x, again.exploded, len(again.trail)), (300, False, 0))
+        again.update()
+        self.assertEqual(len(again.particles), 48)
+        self.assertTrue(all(p in particles for p in again.particles))
+        self.assertEqual((pool.created_fireworks, pool.created_particles), (1, 96))
+        # 使い回したパーティクルの軌跡も初期化されている
+        particle = again.particles[0]
+        self.assertEqual(len(particle.trail), 0)
+        particle.trail = [(1, 2), (3, 4)]
+        self.assertEqual(particle.trail[-1], (3, 4))
+    
+    def test_recycled_matches_fresh(self):
+        """使い回したオブジェクトでも新しく作った場合と同じ動きになるテスト"""
+        warm = HeadlessApp(seed=9, quality_level=0)
+        fresh = HeadlessApp(seed=9, quality_level=0)
+        # 品質を変えて軌跡の長さの違うパーティクルをプールに残す
+        junk = warm.pool.firework(600, 300, 300, level=QUALITY_LEVELS[3])
+        junk.update()
+        warm.pool.release(junk)
+        for app in (warm, fresh):
+            app.is_running = True
+            for frame in range(200):
+                if frame % 40 == 0:
+                    app.launch_firework()
+                app.animate()
+        self.assertEqual(sync_digest(warm), sync_digest(fresh))
+    
+    def test_steady_state_allocates_nothing(self):
+        """十分に打ち上げた後は花火もパーティクルも新しく作らないテスト"""
+        app = HeadlessApp(seed=4, quality_level=0, pattern_weights={'peony': 1})
+        app.is_running = True
+        app.next_firework_frame = 10 ** 9
+        
+        def cycle():
+            for frame in range(400):
+                if frame % 50 == 0:
+                    app.launch_firework(200 + frame, 250)
+                app.animate()
+        
+        cycle()
+        created = (app.pool.created_fireworks, app.pool.created_particles)
+        for _ in range(3):
+            cycle()
+        self.assertEqual((app.pool.created_fireworks, app.pool.created_particles), created)
+        self.assertGreater(len(app.pool.free_particles), 0)
+
+
+class TestExpiry(unittest.TestCase):
+    """寿命の順に並べたパーティクルの削除と、入れ替え削除のテスト"""
+    
+    def assert_sorted(self, firework):
+        """パーティクルが寿命の長い順に並んでいることを確認"""
+        lives = [p.max_life for p in firework.particles]
+        self.assertEqual(lives, sorted(lives, reverse=True))
+    
+    def test_cohorts_expire_together(self):
+        """寿命の同じ輪がまとめて消え、プールに戻るテスト"""
+        pool = FireworkPool()
+        firework = pool.firework(600, 300, 300)
+        firework.update()
+        self.assertEqual(compile_pattern('peony', 3).cohort_ends, (32, 64, 96))
+        self.assert_sorted(firework)
+        counts = {}
+        for frame in range(1, 101):
+            firework.update()
+            counts[frame] = len(firework.particles)
+        self.assertEqual((counts[79], counts[80], counts[89], counts[90], counts[100]),
+                         (96, 64, 64, 32, 0))
+        self.assertTrue(firework.is_finished())
+        self.assertEqual(len(pool.free_particles), 96)
+    
+    def test_discard_keeps_order(self):
+        """途中のパーティクルを削除しても寿命の順が崩れず、輪ごとに消えるテスト"""
+        firework = Firework(600, 300, 300)
+        firework.explode()
+        removed = [firework.particles[i] for i in (95, 40, 31, 3)]
+        firework.discard([95, 40, 31, 3])
+        self.assertEqual(len(firework.particles), 92)
+        self.assertFalse(any(p in firework.particles for p in removed))
+        self.assert_sorted(firework)
+        # 最も短い寿命（80）の輪の残り31粒がまとめて消える
+        for _ in range(80):
+            firework.update()
+        lives = [p.max_life for p in firework.particles]
+        self.assertEqual((lives.count(100), lives.count(90), len(lives)), (30, 31, 61))
+        self.assertTrue(all(p.life > 0 for p in firework.particles))
+    
+    def test_culling_matches_filter(self):
+        """画面外の間引きが全パーティクルを確かめた場合と同じ結果になるテスト"""
+        firework = Firework(1150, 120, 100, bounds=(1200, 700))
+        firework.explode()
+        for _ in range(120):
+            before = list(firework.particles)
+            firework.update()
+            kept = {id(p) for p in firework.particles}
+            for p in before:
+                self.assertEqual(id(p) in kept, p.life > 0 and not p.cannot_return(1200, 700))
+            self.assert_sorted(firework)
+        self.assertTrue(firework.is_finished())
+    
+    def test_step_swap_removes(self):
+        """終わった花火を一覧を作り直さずに外してプールに戻すテスト"""
+        pool = FireworkPool()
+        fireworks = [pool.firework(100 * i, 500, 500 if i == 1 else 100) for i in range(4)]
+        original = list(fireworks)
+        fireworks[1].exploded = True  # パーティクルの残っていない爆発済みの花火
+        same = fireworks
+        pool.step(fireworks)
+        self.assertIs(fireworks, same)
+        self.assertEqual(fireworks, [original[0], original[3], original[2]])
+        self.assertEqual(pool.free_fireworks, [original[1]])
+        # 移した花火も同じステップで1回だけ更新されている
+        self.assertEqual([fw.y for fw in fireworks], [492, 492, 492])
+    
+    def test_budget_discards_faded(self):
+        """上限を超えた分が色あせたものから入れ替え削除で消えるテスト"""
+        app = HeadlessApp(seed=3, particle_budget=150, pattern_weights={'peony': 1})
+        app.launch_firework(300, 650)
+        for _ in range(30):
+            app.step()
+        app.launch_firework(700, 650)
+        for _ in range(6):
+            app.step()
+        self.assertLessEqual(app.live_particle_count(), 150)
+        for firework in app.fireworks:
+            self.assert_sorted(firework)
+        # 先に爆発した（色あせた）花火から削られる
+        first, second = sorted(app.fireworks, key=lambda fw: fw.x)
+        self.assertLess(len(first.particles), len(second.particles))
+
+def sync_digest(app):
+    """同期の比較用に花火とパーティクルの状態をまとめる"""
+    return [(round(fw.x, 6), round(fw.y, 6), fw.exploded,
+             [(round(p.x, 6), round(p.y, 6)) for p in fw.particles]) for fw in app.fireworks]
+
+
+class TestSync(unittest.TestCase):
+    """複数の画面で同じ花火を表示する同期モードのテスト"""
+    
+    def setUp(self):
+        self.authority = HeadlessApp(sync_serve=0, seed=7, quality_level=0)
+        self.addCleanup(self.authority.destroy)
+    
+    def follow(self):
+        """同じプロセスの受信側を接続（送信元の受け入れを回しながら待つ）"""
+        import threading
+        result = []
+        port = self.authority.sync_server.port
+        thread = threading.Thread(
+            target=lambda: result.append(HeadlessApp(sync_follow=('127.0.0.1', port))))
+        thread.start()
+        while thread.is_alive():
+            self.authority.sync_server.flush()
+            thread.join(0.01)
+        self.addCleanup(result[0].destroy)
+        return result[0]
+    
+    def test_server_and_follower(self):
+        """送信元と受信側の間でヘッダ・イベント・進んだステップが届くテスト"""
+        import threading
+        server = SyncServer(42, quality=2, fps=30, particle_budget=500, port=0,
+                            pattern_weights=mix_weights())
+        self.addCleanup(server.close)
+        result = []
+        thread = threading.Thread(
+            target=lambda: result.append(SyncFollower('127.0.0.1', server.port)))
+        thread.start()
+        while thread.is_alive():
+            server.flush()
+            thread.join(0.01)
+        follower = result[0]
+        self.addCleanup(follower.close)
+        recorded = follower.recording
+        self.assertEqual((recorded.seed, recorded.quality, recorded.fps, recorded.particle_budget),
+                         (42, 2, 30, 500))
+        self.assertEqual(recorded.pattern_weights, mix_weights())
+        
+        server.send(3, EVENT_CLICK, 640, 200)
+        server.flush(10)
+        deadline = time.monotonic() + 5
+        while follower.horizon < 10 and time.monotonic() < deadline:
+            follower.receive()
+        # 進んだステップ（EVENT_TICK）はイベントの一覧には入らない
+        self.assertEqual(recorded.events, [(3, EVENT_CLICK, 640, 200)])
+        self.assertEqual(follower.horizon, 10)
+        self.assertEqual(follower.steps(4, 1), 3)
+        self.assertEqual(follower.steps(10, 1), 0)
+        self.assertAlmostEqual(follower.lag(8), 2 * SIMULATION_STEP)
+        
+        # 送信元が切断したら False を返す
+        server.close()
+        deadline = time.monotonic() + 5
+        while follower.receive() and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertFalse(follower.connected)
+    
+    def test_followers_replay_authority(self):
+        """受信側が送信元と同じ花火・同じタイマーを再現するテスト"""
+        followers = [self.follow(), self.follow()]
+        self.assertEqual(followers[0].seed, 7)
+        authority = self.authority
+        authority.start_break(60)
+        for frame in range(80):
+            if frame == 10:
+                authority.launch_firework(500, 250)
+            authority.animate()
+            for follower in followers:
+                follower.poll_sync()
+                follower.animate()
+        # 遅れている分を進めて追いつかせる
+        for follower in followers:
+            for _ in range(20):
+                follower.animate()
+        
+        self.assertGreater(len(authority.fireworks), 1)
+        for follower in followers:
+            self.assertEqual(follower.tick, authority.tick)
+            self.assertEqual(sync_digest(follower), sync_digest(authority))
+            self.assertAlmostEqual(follower.timer_deadline, authority.timer_deadline, delta=0.5)
+    
+    def test_late_follower_catches_up(self):
+        """途中から参加した受信側が早送りで追いつくテスト"""
+        authority = self.authority
+        authority.start_break(60)
+        for _ in range(100):
+            authority.animate()
+        follower = self.follow()
+        joined = time.monotonic()
+        follower.poll_sync()
+        self.assertTrue(follower.is_running)
+        # 送信元がタイマーを開始した時刻（送信元のステップ数の分だけ前）に合わせる
+        remaining = follower.timer_deadline - joined
+        self.assertAlmostEqual(remaining, 60 - authority.tick * SIMULATION_STEP, delta=0.5)
+        for _ in range(10):
+            follower.animate()
+        
+        self.assertEqual(follower.tick, authority.tick)
+        self.assertEqual(sync_digest(follower), sync_digest(authority))
+    
+    def test_follower_ignores_local_input(self):
+        """受信側ではクリック・タイマー設定の操作で状態がずれないテスト"""
+        follower = self.follow()
+        self.assertFalse(follower.local_input)
+        self.assertTrue(self.authority.local_input)
+        authority = self.authority
+        authority.start_break(60)
+        for frame in range(40):
+            authority.animate()
+            follower.poll_sync()
+            if frame == 20:
+                state = follower.rng.getstate()
+                follower.on_canvas_click(Mock(x=600, y=300))
+                with patch('fireworks.fireworks.TimerDialog') as dialog:
+                    follower.show_timer_dialog()
+                dialog.assert_not_called()
+                self.assertEqual(follower.rng.getstate(), state)
+            follower.animate()
+        for _ in range(10):
+            follower.animate()
+        
+        self.assertEqual(follower.tick, authority.tick)
+        self.assertEqual(sync_digest(follower), sync_digest(authority))
+    
+    def test_bandwidth_per_follower(self):
+        """受信側1つあたりの送信量が1フレーム1イベント程度に収まるテスト"""
+        followers = [self.follow() for _ in range(3)]
+        authority = self.authority
+        authority.start_break(60)
+        for _ in range(200):
+            authority.animate()
+        per_follower = authority.sync_server.sent_bytes / len(followers)
+        for follower in followers:
+            deadline = time.monotonic() + 5
+            while follower.follower.received_bytes < per_follower and time.monotonic() < deadline:
+                follower.follower.receive()
+        
+        events = len(followers[0].replay.recording.events)
+        # ヘッダ + イベント + 1フレームに1つのステップ番号（start_break の最初のフレームを含む）
+        header = encode_header(7, pattern_weights=authority.pattern_weights)
+        self.assertLessEqual(per_follower, len(header) + EVENT_SIZE * (events + 201))
+        self.assertEqual(followers[0].follower.received_bytes, per_follower)
+    
+    def test_follower_processes(self):
+        """別プロセスの受信側が送信元と同じ状態になるテスト"""
+        import subprocess
+        authority = self.authority
+        root = os.path.dirname(os.path.abspath(__file__))
+        code = ("import sys\n"
+                "from benchmarks.headless import HeadlessApp\n"
+                "from test_fireworks import sync_digest\n"
+                "app = HeadlessApp(sync_follow=('127.0.0.1', int(sys.argv[1])))\n"
+                "target = int(sys.argv[2])\n"
+                "while app.tick < target:\n"
+                "    app.poll_sync()\n"
+                "    app.animate()\n"
+                "print(repr(sync_digest(app)))\n")
+        target = 120
+        followers = [subprocess.Popen([sys.executable, '-c', code, str(authority.sync_server.port),
+                                       str(target)], cwd=root, stdout=subprocess.PIPE, text=True)
+                     for _ in range(2)]
+        authority.start_break(60)
+        authority.launch_firework(400, 200)
+        while authority.tick < target:
+            authority.animate()
+        # 受信側が終わるまで送信を続ける
+        while any(follower.poll() is None for follower in followers):
+            authority.sync_server.flush(authority.tick)
+            time.sleep(0.01)
+        
+        expected = repr(sync_digest(authority))
+        for follower in followers:
+            self.assertEqual(follower.stdout.read().strip(), expected)
+            follower.stdout.close()
+
+
 if __name__ == '__main__':
     # カバレージ測定の設定
     try:
@@ -1245,7 +3491,31 @@ if __name__ == '__main__':
         TestIntegration,
         TestGUIEventHandlers,
         TestTimerDialogCenterWindow, # 新しいテストクラスを追加
-        TestGetCurrentTime # 新しいテストクラスを追加
+        TestGetCurrentTime, # 新しいテストクラスを追加
+        TestParticleSystem,
+        TestCanvasItemPool,
+        TestTrailHistory,
+        TestExplosionTemplate,
+        TestPalette,
+        TestRasterRenderer,
+        TestBenchmarks,
+        TestFrameMetrics,
+        TestFrameScheduler,
+        TestDeadlineTimer,
+        TestQualityGovernor,
+        TestParticleCulling,
+        TestPhysicsWorker,
+        TestRecording,
+        TestShowCache,
+        TestSpriteRenderer,
+        TestCommandBatch,
+        TestStartup,
+        TestMirror,
+        TestViewport,
+        TestPatterns,
+        TestFireworkPool,
+        TestExpiry,
+        TestSync,
     ]
     
     for test_class in test_classes: